@@ -46,6 +46,10 @@ setup(
     include_package_data=True,
     install_requires=['portalocker==0.5.7', 'pyzmq', 'raet', 'ioflo==1.5.4',
                       'ujson', 'psutil'],
+    extras_require={
+        'msgpack': ['msgpack'],
+        'orjson': ['orjson'],
+    },
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
     scripts=[],
@@ -26,6 +26,108 @@ def getlogger(name: object = None) -> object:
     return Logger().getlogger(name)
 
 
+class LazyMessage:
+    """
+    Message formatted with `str.format` only when a handler emits it, with
+    arguments longer than `maxLen` characters truncated
+    """
+    __slots__ = ('fmt', 'args', 'maxLen', '_text')
+
+    def __init__(self, fmt: str, args: tuple, maxLen: int = None):
+        self.fmt = fmt
+        self.args = args
+        self.maxLen = maxLen
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            args = self.args
+            if self.maxLen:
+                args = [self.truncate(a, self.maxLen) for a in args]
+            self._text = self.fmt.format(*args)
+        return self._text
+
+    @staticmethod
+    def truncate(arg, maxLen: int):
+        text = str(arg)
+        if len(text) <= maxLen:
+            return text
+        return '{}...({} more chars)'.format(text[:maxLen],
+                                             len(text) - maxLen)
+
+
+def reachedPowerOfTen(count: int, previous: int = None) -> bool:
+    """
+    Whether `count`, up from `previous`, `count - 1` if None, reached 1, 10,
+    100... Warnings repeated for every event, like dropped messages, are
+    logged only then to keep the log readable under sustained load.
+    """
+    if previous is None:
+        previous = count - 1
+    return count > 0 and previous < 10 ** (len(str(count)) - 1)
+
+
+class HotPathLogger:
+    """
+    Logger for code run for every message, like sending and receiving in
+    stacks. Messages are given as a `str.format` format string and its
+    arguments, nothing is formatted unless the level is enabled and a handler
+    emits the record.
+
+    Arguments longer than `maxLen` characters are truncated and only one of
+    every `sampleEvery` messages logged with the same format string is
+    logged. Both default to `HOT_PATH_LOG_MAX_LEN` and
+    `HOT_PATH_LOG_SAMPLE_EVERY` of config.
+    """
+
+    def __init__(self, logger: logging.Logger, maxLen: int = None,
+                 sampleEvery: int = None, config=None):
+        config = config or getConfig()
+        self.logger = logger
+        self.maxLen = maxLen if maxLen is not None else \
+            config.HOT_PATH_LOG_MAX_LEN
+        self.sampleEvery = sampleEvery if sampleEvery is not None else \
+            config.HOT_PATH_LOG_SAMPLE_EVERY
+        # Number of messages seen by format string, kept only when sampling
+        self._seen = {}
+
+    def isEnabledFor(self, level) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def trace(self, fmt, *args):
+        if self.logger.isEnabledFor(TRACE_LOG_LEVEL):
+            self._log(TRACE_LOG_LEVEL, fmt, args)
+
+    def debug(self, fmt, *args):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, fmt, args)
+
+    def info(self, fmt, *args):
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, fmt, args)
+
+    def _log(self, level, fmt, args):
+        if self.sampleEvery > 1:
+            seen = self._seen.get(fmt, 0)
+            self._seen[fmt] = seen + 1
+            if seen % self.sampleEvery:
+                return
+        # Records point at the caller of `trace`, `debug` or `info`, not at
+        # this module
+        caller = sys._getframe(2)
+        code = caller.f_code
+        record = self.logger.makeRecord(
+            self.logger.name, level, code.co_filename, caller.f_lineno,
+            LazyMessage(fmt, args, self.maxLen), (), None, code.co_name)
+        self.logger.handle(record)
+
+
+def getHotPathLogger(name: str = None, **kwargs) -> HotPathLogger:
+    if not name:
+        name = inspect.getmodule(inspect.currentframe().f_back).__name__
+    return HotPathLogger(Logger().getlogger(name), **kwargs)
+
+
 class Logger(metaclass=Singleton):
     def __init__(self, config=None):
 
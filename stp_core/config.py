@@ -16,6 +16,11 @@ logFormatStyle='{'
 
 logLevel = logging.NOTSET
 enableStdOutLogging = True
+# Logging done for every message sent or received: arguments longer than
+# this many characters are truncated, None for no limit
+HOT_PATH_LOG_MAX_LEN = None
+# Only one of this many such messages of the same kind is logged
+HOT_PATH_LOG_SAMPLE_EVERY = 1
 
 
 RETRY_TIMEOUT_NOT_RESTRICTED = 6
@@ -31,9 +36,145 @@ RAETLogFilePathCli = None
 RAETMessageTimeout = 60
 
 
+# How long Loopers wait for work after prodding their prodables did nothing,
+# the wait is cut short when a prodable wakes the Looper up: 'fixed' to wait
+# LOOPER_IDLE_TIMEOUT seconds, 'backoff' to wait LOOPER_IDLE_BACKOFF_START
+# seconds first and exponentially longer while idle, up to
+# LOOPER_IDLE_BACKOFF_PEAK seconds after LOOPER_IDLE_BACKOFF_STEPS rounds.
+# Work of prodables not waking the Looper up may wait for as long
+LOOPER_IDLE_POLICY = 'fixed'
+LOOPER_IDLE_TIMEOUT = 0.01
+LOOPER_IDLE_BACKOFF_START = 0.001
+LOOPER_IDLE_BACKOFF_PEAK = 0.1
+LOOPER_IDLE_BACKOFF_STEPS = 8
+# Most messages each prodable of a Looper is asked to process when prodded,
+# None for all it has, and the seconds after which a prodable is reported as
+# taking too long to be prodded, None to never report. Budgets of single
+# prodables are set with `Looper.setBudget`
+LOOPER_PROD_LIMIT = None
+LOOPER_PROD_TIME_BUDGET = 0.5
+# Whether Loopers profile how long prodables and ticks, rounds of prodding
+# all prodables, take, and how long a tick must take for it to be kept among
+# the last LOOPER_SLOW_TICKS_KEPT slow ones. The profile is had with
+# `looper.profiler.snapshot()`
+LOOPER_PROFILE = True
+LOOPER_SLOW_TICK = 0.5
+LOOPER_SLOW_TICKS_KEPT = 20
+# Backend of the event loops Loopers create when not given one: 'asyncio',
+# or 'uvloop' when installed, see `stp_core.loop.event_loops`
+LOOPER_LOOP_BACKEND = 'asyncio'
+
+# Number of received messages stacks keep till they are processed, None for
+# no limit
+RX_QUEUE_SIZE = None
+# What stacks do when that many received messages wait: 'backpressure' to
+# stop receiving and let the transport push back on senders, 'drop_oldest'
+# to drop the oldest message, 'drop_by_share' to drop the oldest message of
+# the sender having the most messages waiting
+RX_QUEUE_POLICY = 'backpressure'
+
+
 # Zeromq configuration
 DEFAULT_LISTENER_QUOTA = 100
 DEFAULT_SENDER_QUOTA = 100
+# Receive only from sockets reported readable by a `zmq.Poller` instead of
+# trying each remote's socket on every service
+ZMQ_USE_POLLER = False
+# Receive messages as `zmq.Frame`s without copying them and parse them
+# straight from the frame's buffer; pays off for large messages
+ZMQ_ZERO_COPY_RECEIVE = False
+# Serializer for messages sent by stacks, one of the names registered in
+# `stp_zmq.serializers`: json, and orjson or msgpack when installed
+ZMQ_SERIALIZER = 'json'
+# Advertise the serializers a stack can read in its pings and pongs so peers
+# can send it messages in a binary format. Peers of older versions which do
+# not answer such pings are sent JSON
+ZMQ_NEGOTIATE_SERIALIZER = False
+# Share receiving between the listener and remotes with a scheduler instead
+# of fixed quotas in a fixed order: 'wrr' for weighted round robin or 'drr'
+# for deficit round robin. The quotas above are then the quanta of sources
+ZMQ_RX_SCHEDULER = None
+# Number of received but unprocessed messages at which the scheduler receives
+# the least from sockets, None to always use full quanta
+ZMQ_RX_BACKLOG_LIMIT = None
+# Queue messages sent to remotes and send them in batches, one for each
+# remote, when stacks are serviced. With ZMQ_NEGOTIATE_SERIALIZER set only
+# peers advertising they read batches are sent them
+ZMQ_BATCH_OUTBOUND = False
+# Size in bytes of the messages queued for a remote at which they are sent
+# without waiting for the stack to be serviced
+ZMQ_BATCH_MAX_BYTES = 256 * 1024
+# Number of messages kept for each remote, or peer replied to through the
+# listener, when its socket is full so they are sent later in order instead
+# of being dropped, 0 to drop them right away
+ZMQ_TX_QUEUE_SIZE = 1000
+# Seconds after which messages still waiting to be sent are dropped, None to
+# keep them till they are sent
+ZMQ_TX_QUEUE_MAX_AGE = 60
+# Queue replies through the listener to peers whose queues are full too,
+# setting ROUTER_MANDATORY on listeners so full peers are told apart. Replies
+# to peers not connected are then reported as not sent
+ZMQ_LISTENER_TX_QUEUE = False
+# Sign every message sent by stacks with their signing key and verify
+# signatures of received messages, dropping those not signed by the remote
+# they come from. All peers need it set and to know each other's
+# verification keys. Signatures received in a service are verified together.
+# Stacks which are not restricted accept messages of senders whose
+# verification keys they do not know, like clients, without verifying them
+ZMQ_SIGN_MESSAGES = False
+# Where stacks keep keys: 'directory' for a ZMQ certificate file per key in
+# directories of the stack's home directory, 'sqlite' for a single indexed
+# file there, better with many peers. Stacks having a SQLite file, like
+# after migrating with `python -m stp_zmq.keystore migrate`, always use it
+ZMQ_KEY_STORE = 'directory'
+# Number of socket monitor events kept by each remote for diagnostics
+ZMQ_REMOTE_EVENT_HISTORY = 100
+# Options set on the listener and remote sockets of stacks by name of the zmq
+# option, None to leave libzmq's default. ROUTER_MANDATORY is only set on
+# listeners and IMMEDIATE only on sockets of remotes
+ZMQ_SOCKET_PROFILE = {
+    'SNDHWM': None,
+    'RCVHWM': None,
+    'SNDBUF': None,
+    'RCVBUF': None,
+    'LINGER': None,
+    'IMMEDIATE': None,
+    # Replies through the listener to peers whose queues are full, or which
+    # are not connected, raise instead of being silently dropped. Set on
+    # listeners anyway with ZMQ_LISTENER_TX_QUEUE
+    'ROUTER_MANDATORY': None,
+}
+# Number of IO threads of the zmq context shared by stacks of a process,
+# 'auto' for one less than the number of cores. Connections are spread over
+# IO threads so CURVE encryption for many peers can use several cores
+ZMQ_IO_THREADS = 1
+# Number of listener sockets of a stack, the first one bound to the stack's
+# port and the others to the stack's `listenerShardPorts`, by default the
+# stack's port plus multiples of ZMQ_LISTENER_SHARD_PORT_STEP. Peers may
+# connect to any of them to spread connections further, messages received
+# through all of them are processed alike
+ZMQ_LISTENER_SHARDS = 1
+# Distance between the ports of listener shards of a stack, large enough for
+# stacks on adjacent ports, like the node and client stacks of a node, not to
+# take each other's ports
+ZMQ_LISTENER_SHARD_PORT_STEP = 100
+# Number of peers received from last whose listener shard is remembered,
+# replies to other peers look for the shard they are connected to.
+# ROUTER_MANDATORY is always set on listeners of stacks having shards
+ZMQ_LISTENER_SHARD_PEERS = 10000
+# Decode and deserialize received messages, and verify their signatures with
+# ZMQ_SIGN_MESSAGES, on a pool of workers instead of the event loop:
+# 'thread' or 'process', None to do it on the event loop.
+# Threads only help when deserializing releases the GIL, processes always
+# do but messages are copied to them
+ZMQ_DECODE_POOL = None
+# Number of workers of the pool, None for the number of cores
+ZMQ_DECODE_WORKERS = None
+# Most messages decoded by a worker at a time
+ZMQ_DECODE_BATCH_SIZE = 256
+# Most messages of a stack being decoded at a time, the others wait in the
+# stack's queue of received messages
+ZMQ_DECODE_MAX_PENDING = 10000
 KEEPALIVE_INTVL = 1     # seconds
 KEEPALIVE_IDLE = 20     # seconds
 KEEPALIVE_CNT = 10
@@ -205,7 +205,8 @@ class Signer:
         '''
         Return only the signature string resulting from signing the message
         '''
-        return self.key.sign(msg).signature
+        # Detached signing does not copy the message into the result
+        return libnacl.crypto_sign_detached(msg, self.key._signing_key)
 
 
 class Verifier:
@@ -234,7 +235,7 @@ class Verifier:
         if not self.key:
             return False
         try:
-            self.key.verify(signature + msg)
+            libnacl.crypto_sign_verify_detached(signature, msg, self.keyraw)
         except ValueError:
             return False
         return True
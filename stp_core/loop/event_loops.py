@@ -0,0 +1,33 @@
+import asyncio
+from typing import List
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def loopBackends() -> List[str]:
+    """
+    Names of the event loop backends available, `uvloop` only when it is
+    installed
+    """
+    return ['asyncio'] + (['uvloop'] if uvloop is not None else [])
+
+
+def newEventLoop(backend: str = 'asyncio') -> asyncio.AbstractEventLoop:
+    """
+    A new event loop of the backend named `backend`
+    """
+    if backend == 'asyncio':
+        return asyncio.new_event_loop()
+    if backend == 'uvloop' and uvloop is not None:
+        return uvloop.new_event_loop()
+    raise ValueError('Unknown or unavailable event loop backend {}, '
+                     'available ones are {}'.format(backend, loopBackends()))
+
+
+def isOfBackend(loop: asyncio.AbstractEventLoop, backend: str) -> bool:
+    if backend == 'uvloop':
+        return uvloop is not None and isinstance(loop, uvloop.Loop)
+    return uvloop is None or not isinstance(loop, uvloop.Loop)
@@ -0,0 +1,136 @@
+from stp_core.ratchet import Ratchet
+
+
+class IdleStats:
+    """
+    Decisions of an idle policy: how often a Looper found work, how long it
+    decided to wait for work and how long it actually waited
+    """
+
+    def __init__(self):
+        # Rounds of prodding all prodables, and those doing some work
+        self.rounds = 0
+        self.busyRounds = 0
+        # Waits for work, and those cut short by a prodable waking the
+        # Looper up
+        self.waits = 0
+        self.wokenUp = 0
+        # Seconds of waiting decided and actually waited
+        self.decided = 0.0
+        self.waited = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def recordRound(self, busy: bool, wait: float):
+        self.rounds += 1
+        if busy:
+            self.busyRounds += 1
+        if wait > 0:
+            self.waits += 1
+            self.decided += wait
+            self.last = wait
+            if wait > self.max:
+                self.max = wait
+
+    def recordWait(self, waited: float, wokenUp: bool):
+        self.waited += waited
+        if wokenUp:
+            self.wokenUp += 1
+
+    def __repr__(self):
+        return 'IdleStats(rounds={}, busyRounds={}, waits={}, wokenUp={}, ' \
+               'decided={:.6f}, waited={:.6f}, max={:.6f})'.\
+            format(self.rounds, self.busyRounds, self.waits, self.wokenUp,
+                   self.decided, self.waited, self.max)
+
+
+class IdlePolicy:
+    """
+    Decides how long a Looper waits for work after a round of prodding its
+    prodables. Waits are cut short whenever a prodable wakes the Looper up.
+    """
+
+    def __init__(self):
+        self.stats = IdleStats()
+
+    def afterRound(self, processed: int) -> float:
+        """
+        Seconds to wait for work after a round which did `processed` events,
+        0 to prod again right away
+        """
+        wait = self.waitAfter(processed)
+        self.stats.recordRound(processed > 0, wait)
+        return wait
+
+    def afterWait(self, waited: float, wokenUp: bool):
+        self.stats.recordWait(waited, wokenUp)
+
+    def waitAfter(self, processed: int) -> float:
+        raise NotImplementedError
+
+
+class FixedIdlePolicy(IdlePolicy):
+    """
+    Waits `timeout` seconds after every round which did nothing
+    """
+
+    def __init__(self, timeout: float = 0.01):
+        super().__init__()
+        self.timeout = timeout
+
+    def waitAfter(self, processed):
+        return 0 if processed else self.timeout
+
+
+class BackoffIdlePolicy(IdlePolicy):
+    """
+    Stays hot while work keeps coming: waits `start` seconds after the first
+    round doing nothing, then exponentially longer for each following one,
+    reaching `peak` seconds after `steps` rounds, right away when `steps` is
+    1. Work done, or a prodable waking the Looper up, starts over.
+    """
+
+    def __init__(self, start: float = 0.001, peak: float = 0.1,
+                 steps: int = 8):
+        super().__init__()
+        if start <= 0 or peak < start:
+            raise ValueError('Backoff needs 0 < start <= peak, got start {} '
+                             'and peak {}'.format(start, peak))
+        if steps < 1:
+            raise ValueError('Backoff needs at least 1 step, got {}'.
+                             format(steps))
+        self.ratchet = Ratchet.fromGoals(start, peak, steps) if steps > 1 \
+            else Ratchet(a=peak, b=0)
+        self.ratchet.peak = peak
+        self.idleRounds = 0
+
+    def waitAfter(self, processed):
+        if processed:
+            self.idleRounds = 0
+            return 0
+        wait = self.ratchet.get(self.idleRounds)
+        self.idleRounds += 1
+        return wait
+
+    def afterWait(self, waited, wokenUp):
+        super().afterWait(waited, wokenUp)
+        if wokenUp:
+            self.idleRounds = 0
+
+
+idlePolicies = {
+    'fixed': FixedIdlePolicy,
+    'backoff': BackoffIdlePolicy,
+}
+
+
+def idlePolicyFromConfig(config) -> IdlePolicy:
+    name = config.LOOPER_IDLE_POLICY
+    if name == 'fixed':
+        return FixedIdlePolicy(config.LOOPER_IDLE_TIMEOUT)
+    if name == 'backoff':
+        return BackoffIdlePolicy(config.LOOPER_IDLE_BACKOFF_START,
+                                 config.LOOPER_IDLE_BACKOFF_PEAK,
+                                 config.LOOPER_IDLE_BACKOFF_STEPS)
+    raise ValueError('Unknown idle policy {}, available ones are {}'.
+                     format(name, list(idlePolicies)))
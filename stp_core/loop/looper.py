@@ -7,10 +7,15 @@ from asyncio import Task
 from asyncio.coroutines import CoroWrapper
 from typing import List, Optional
 
-# import uvloop
+from stp_core.common.config.util import getConfig
 from stp_core.common.log import getlogger
 from stp_core.common.util import lxor
+from stp_core.loop.event_loops import isOfBackend, newEventLoop
 from stp_core.loop.exceptions import ProdableAlreadyAdded
+from stp_core.loop.idle_policy import IdlePolicy, IdleStats, \
+    idlePolicyFromConfig
+from stp_core.loop.prod_scheduler import ProdBudget, ProdScheduler
+from stp_core.loop.profiler import LooperProfiler, profilerFromConfig
 from stp_core.loop.startable import Status
 
 logger = getlogger()
@@ -59,6 +64,17 @@ class Prodable:
         raise NotImplementedError("subclass {} should implement this method"
                                   .format(self))
 
+    def set_wakeup(self, loop, wakeup):
+        """
+        Called by the Looper with a callable which wakes the Looper up when
+        it is waiting for work. Prodables which can tell when they have new
+        work, like stacks watching their sockets, should call it then.
+
+        :param loop: the event loop the Looper runs on
+        :param wakeup: the callable, None when the Prodable is removed
+        """
+        pass
+
 
 class Looper:
     """
@@ -69,7 +85,11 @@ class Looper:
                  prodables: List[Prodable]=None,
                  loop=None,
                  debug=False,
-                 autoStart=True):
+                 autoStart=True,
+                 idlePolicy: IdlePolicy=None,
+                 prodScheduler: ProdScheduler=None,
+                 profiler: LooperProfiler=None,
+                 loopBackend: str=None):
         """
         Initialize looper with an event loop.
 
@@ -77,16 +97,24 @@ class Looper:
         :param loop: the event loop to use
         :param debug: set_debug on event loop will be set to this value
         :param autoStart: start immediately?
+        :param idlePolicy: decides how long to wait for work when prodables
+        did nothing, the one of `LOOPER_IDLE_POLICY` if None
+        :param prodScheduler: decides in which order prodables are prodded
+        and how much they may do, with the budget of `LOOPER_PROD_LIMIT` and
+        `LOOPER_PROD_TIME_BUDGET` if None
+        :param profiler: records how long prodables and ticks take, one
+        from the config if None, which is None if `LOOPER_PROFILE` is False
+        :param loopBackend: backend of the event loop created when `loop` is
+        None, `LOOPER_LOOP_BACKEND` if None
         """
         self.prodables = list(prodables) if prodables is not None \
             else []  # type: List[Prodable]
-
-        # if sys.platform == 'linux':
-        #     asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        config = getConfig()
 
         if loop:
             self.loop = loop
         else:
+            backend = loopBackend or config.LOOPER_LOOP_BACKEND
             try:
                 #if sys.platform == 'win32':
                 #    loop = asyncio.ProactorEventLoop()
@@ -94,14 +122,26 @@ class Looper:
                 l = asyncio.get_event_loop()
                 if l.is_closed():
                     raise RuntimeError("event loop was closed")
+                if not isOfBackend(l, backend):
+                    raise RuntimeError("event loop is not of backend {}".
+                                       format(backend))
             except Exception as ex:
                 logger.warning("Looper could not get default event loop; "
                                "creating a new one: {}".format(ex))
-                # Trying out uvloop for linux
-                l = asyncio.new_event_loop()
+                l = newEventLoop(backend)
             asyncio.set_event_loop(l)
             self.loop = l
 
+        # Set by prodables through `wakeup` when they get new work
+        self._hasWork = asyncio.Event(loop=self.loop)
+        self.idlePolicy = idlePolicy or idlePolicyFromConfig(config)
+        self.prodScheduler = prodScheduler or ProdScheduler(
+            ProdBudget(config.LOOPER_PROD_LIMIT,
+                       config.LOOPER_PROD_TIME_BUDGET))
+        self.profiler = profiler or profilerFromConfig(config)
+        for prodable in self.prodables:
+            self._setWakeup(prodable, self.wakeup)
+
         self.runFut = self.loop.create_task(self.runForever())  # type: Task
         self.running = True  # type: bool
         self.loop.set_debug(debug)
@@ -130,23 +170,40 @@ class Looper:
         if self.autoStart:
             self.startall()
 
-    # @staticmethod
-    # def new_event_loop():
-    #     eventLib = asyncio if sys.platform == 'win32' else uvloop
-    #     return eventLib.new_event_loop()
-
     async def prodAllOnce(self):
         """
-        Call `prod` once for each Prodable in this Looper
+        Call `prod` once for each Prodable in this Looper, in the order and
+        with the limits the prod scheduler decides
 
-        :return: the sum of the number of events executed successfully
+        :return: the sum of the number of events executed successfully, stacks
+        do not count pings and pongs so the Looper idles when getting only them
         """
-        limit = None
+        scheduler = self.prodScheduler
+        profiler = self.profiler
         s = 0
-        for n in self.prodables:
-            s += await n.prod(limit)
+        for n in scheduler.order(self.prodables):
+            budget = scheduler.budgetOf(n)
+            start = time.perf_counter()
+            processed = await n.prod(budget.limit)
+            elapsed = time.perf_counter() - start
+            s += processed
+            scheduler.record(n, budget, elapsed)
+            if profiler is not None:
+                profiler.recordProd(n, elapsed, processed)
         return s
 
+    def setBudget(self, prodable: Prodable, limit: int = None,
+                  timeBudget: float = None, priority: int = 0):
+        """
+        Set how much `prodable` may do each time it is prodded
+
+        :param limit: most messages it is asked to process, None for all
+        :param timeBudget: seconds after which it is reported as taking too
+        long
+        :param priority: prodables of higher priority are prodded first
+        """
+        self.prodScheduler.setBudget(prodable, limit, timeBudget, priority)
+
     def add(self, prodable: Prodable) -> None:
         """
         Add one Prodable object to this Looper's list of Prodables
@@ -157,6 +214,7 @@ class Looper:
             raise ProdableAlreadyAdded("Prodable {} already added.".
                                        format(prodable.name))
         self.prodables.append(prodable)
+        self._setWakeup(prodable, self.wakeup)
         if self.autoStart:
             prodable.start(self.loop)
 
@@ -168,6 +226,8 @@ class Looper:
         """
         if prodable:
             self.prodables.remove(prodable)
+            self._setWakeup(prodable, None)
+            self.prodScheduler.forget(prodable)
             return prodable
         elif name:
             for p in self.prodables:
@@ -176,6 +236,8 @@ class Looper:
                     break
             if prodable:
                 self.prodables.remove(prodable)
+                self._setWakeup(prodable, None)
+                self.prodScheduler.forget(prodable)
                 return prodable
             else:
                 logger.warning("Trying to remove a prodable {} which is not present"
@@ -193,15 +255,55 @@ class Looper:
 
         return False
 
+    def wakeup(self):
+        """
+        Stop waiting for work, if waiting, and prod all Prodables again.
+        Needs to be called from the thread running the event loop.
+        """
+        self._hasWork.set()
+
+    def _setWakeup(self, prodable, wakeup):
+        setWakeup = getattr(prodable, 'set_wakeup', None)
+        if setWakeup is not None:
+            setWakeup(self.loop if wakeup else None, wakeup)
+
+    @property
+    def idleStats(self) -> IdleStats:
+        return self.idlePolicy.stats
+
+    async def _waitForWork(self, timeout) -> bool:
+        """
+        :return: whether a Prodable woke the Looper up before the timeout
+        """
+        if self._hasWork.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self._hasWork.wait(), timeout,
+                                   loop=self.loop)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
     async def runOnceNicely(self):
         """
-        Execute `runOnce` with a small tolerance of 0.01 seconds so that the Prodables
-        can complete their other asynchronous tasks not running on the event-loop.
+        Execute `runOnce` and, if the Prodables did nothing, wait for as long
+        as the idle policy decides so that the Prodables can complete their
+        other asynchronous tasks not running on the event-loop.
+        The wait is cut short when any Prodable wakes the Looper up.
         """
         start = time.perf_counter()
+        self._hasWork.clear()
         msgsProcessed = await self.prodAllOnce()
-        if msgsProcessed == 0:
-            await asyncio.sleep(0.01, loop=self.loop)  # if no let other stuff run
+        if self.profiler is not None:
+            self.profiler.recordTick(time.perf_counter() - start,
+                                     msgsProcessed)
+        wait = self.idlePolicy.afterRound(msgsProcessed)
+        if wait > 0:
+            # if no let other stuff run
+            waitStart = time.perf_counter()
+            wokenUp = await self._waitForWork(wait)
+            self.idlePolicy.afterWait(time.perf_counter() - waitStart,
+                                      wokenUp)
         dur = time.perf_counter() - start
         if dur >= 0.5:
             logger.info("it took {:.3f} seconds to run once nicely".
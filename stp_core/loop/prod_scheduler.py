@@ -0,0 +1,96 @@
+from collections import Counter
+from typing import Dict, List, Optional
+
+from stp_core.common.log import getlogger, reachedPowerOfTen
+
+logger = getlogger()
+
+
+class ProdBudget:
+    """
+    How much a prodable may do each time it is prodded: `limit` is the most
+    messages it is asked to process, None for all, and `time` the seconds
+    after which it is reported as overrunning, None to never report it
+    """
+
+    def __init__(self, limit: int = None, time: float = None,
+                 priority: int = 0):
+        self.limit = limit
+        self.time = time
+        # Prodables of higher priority are prodded first
+        self.priority = priority
+
+    def __repr__(self):
+        return 'ProdBudget(limit={}, time={}, priority={})'.\
+            format(self.limit, self.time, self.priority)
+
+
+class ProdScheduler:
+    """
+    Decides in which order a Looper prods its prodables and how much each
+    may do.
+
+    Prodables are prodded by decreasing priority, the order of those of the
+    same priority rotates on each round so none is always prodded first.
+    Prodables taking longer than the time of their budget are counted in
+    `overruns` and logged.
+    """
+
+    def __init__(self, defaultBudget: ProdBudget = None):
+        self.defaultBudget = defaultBudget or ProdBudget()
+        self._budgets = {}  # type: Dict[object, ProdBudget]
+        self.overruns = Counter()
+        # Longest time each prodable took when overrunning, by its name
+        self.longestOverrun = {}  # type: Dict[str, float]
+        self._turn = 0
+
+    def setBudget(self, prodable, limit: Optional[int] = None,
+                  timeBudget: Optional[float] = None, priority: int = 0):
+        self._budgets[prodable] = ProdBudget(limit, timeBudget, priority)
+
+    def budgetOf(self, prodable) -> ProdBudget:
+        return self._budgets.get(prodable, self.defaultBudget)
+
+    def forget(self, prodable):
+        self._budgets.pop(prodable, None)
+
+    def order(self, prodables: List) -> List:
+        """
+        The order in which to prod `prodables` in this round
+        """
+        count = len(prodables)
+        if count < 2:
+            return prodables
+        turn = self._turn
+        self._turn += 1
+        if not self._budgets:
+            k = turn % count
+            return prodables[k:] + prodables[:k]
+        byPriority = {}
+        for prodable in prodables:
+            byPriority.setdefault(self.budgetOf(prodable).priority,
+                                  []).append(prodable)
+        ordered = []
+        for priority in sorted(byPriority, reverse=True):
+            group = byPriority[priority]
+            k = turn % len(group)
+            ordered.extend(group[k:])
+            ordered.extend(group[:k])
+        return ordered
+
+    def record(self, prodable, budget: ProdBudget, elapsed: float):
+        """
+        Note that `prodable` took `elapsed` seconds to be prodded
+        """
+        if budget.time is None or elapsed <= budget.time:
+            return
+        name = getattr(prodable, 'name', prodable)
+        self.overruns[name] += 1
+        if elapsed > self.longestOverrun.get(name, 0):
+            self.longestOverrun[name] = elapsed
+        count = self.overruns[name]
+        if reachedPowerOfTen(count):
+            logger.warning('{} took {:.3f} seconds to be prodded, over its '
+                           'budget of {:.3f} seconds, {} times so far'.
+                           format(name, elapsed, budget.time, count),
+                           extra={"cli": False})
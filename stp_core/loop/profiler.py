@@ -0,0 +1,230 @@
+import json
+import sys
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from typing import Dict, Optional
+
+from stp_core.common.log import getlogger
+
+logger = getlogger()
+
+# A tick slower than the profiler's threshold: when it ended, how long it
+# took, how many events its prodables processed and which prodable took
+# longest and how long
+SlowTick = namedtuple('SlowTick', ['at', 'duration', 'processed',
+                                   'prodable', 'prodDuration'])
+
+
+class Log2Histogram:
+    """
+    Counts of non negative integers in buckets of powers of 2, bucket `i`
+    holding values below 2 ** i and at least 2 ** (i - 1), so adding a value
+    is cheap enough to do on every prod
+    """
+
+    buckets = 40
+
+    def __init__(self):
+        self.counts = [0] * self.buckets
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value: int):
+        self.counts[min(value.bit_length(), self.buckets - 1)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> int:
+        """
+        Upper bound of the bucket holding the `q` percentile of values
+        """
+        if not self.count:
+            return 0
+        rank = self.count * q / 100
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= rank:
+                return min(1 << i, self.max) if i else 0
+        return self.max
+
+    def asDict(self) -> Dict:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            # Upper bound of each bucket with values, and their count
+            'buckets': {1 << i if i else 0: c
+                        for i, c in enumerate(self.counts) if c},
+        }
+
+    def __repr__(self):
+        return 'Log2Histogram(count={}, max={}, p50={}, p99={})'.\
+            format(self.count, self.max, self.percentile(50),
+                   self.percentile(99))
+
+
+class ProdProfile:
+    """
+    Durations of `prod` of a prodable, in microseconds, and events it
+    processed each time
+    """
+
+    def __init__(self):
+        self.durations = Log2Histogram()
+        self.processed = Log2Histogram()
+
+    def asDict(self) -> Dict:
+        return {'durations': self.durations.asDict(),
+                'processed': self.processed.asDict()}
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of a thread every `interval` seconds from a thread of
+    its own, counting how often each stack is seen. The counts are dumped in
+    the collapsed format of flame graph tools, one stack per line.
+    """
+
+    def __init__(self, threadId: int, interval: float = 0.005,
+                 depth: int = 64):
+        self.threadId = threadId
+        self.interval = interval
+        self.depth = depth
+        self.stacks = Counter()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='looper-sampler')
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while self._running:
+            frame = sys._current_frames().get(self.threadId)
+            if frame is not None:
+                self.stacks[self._stackOf(frame)] += 1
+            del frame
+            time.sleep(self.interval)
+
+    def _stackOf(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < self.depth:
+            code = frame.f_code
+            names.append('{}:{}'.format(code.co_filename, code.co_name))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def dump(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+
+class LooperProfiler:
+    """
+    Profile of a Looper: a histogram of how long `prod` of each prodable
+    takes and of the events it processes, histograms of how long each tick,
+    a round of prodding all prodables, takes and of the events processed in
+    it, and the last `slowTicksKept` ticks taking `slowTick` seconds or more
+    with the prodable taking longest in them.
+
+    Durations are kept in microseconds. Profiling costs a few dictionary
+    and list updates per prod so it can be left on.
+    """
+
+    def __init__(self, slowTick: float = 0.5, slowTicksKept: int = 20):
+        self.slowTick = slowTick
+        self.prods = {}  # type: Dict[str, ProdProfile]
+        self.ticks = Log2Histogram()
+        self.processedPerTick = Log2Histogram()
+        self.slowTicks = deque(maxlen=slowTicksKept)
+        self.sampler = None  # type: Optional[SamplingProfiler]
+        # The prodable taking longest in the current tick
+        self._slowest = None
+        self._slowestDuration = 0.0
+
+    def recordProd(self, prodable, duration: float, processed: int):
+        name = prodable.name
+        profile = self.prods.get(name)
+        if profile is None:
+            profile = self.prods[name] = ProdProfile()
+        profile.durations.add(int(duration * 1000000))
+        profile.processed.add(processed)
+        if duration > self._slowestDuration:
+            self._slowest = name
+            self._slowestDuration = duration
+
+    def recordTick(self, duration: float, processed: int):
+        self.ticks.add(int(duration * 1000000))
+        self.processedPerTick.add(processed)
+        if duration >= self.slowTick:
+            self.slowTicks.append(SlowTick(time.time(), duration, processed,
+                                           self._slowest,
+                                           self._slowestDuration))
+        self._slowest = None
+        self._slowestDuration = 0.0
+
+    def startSampling(self, interval: float = 0.005, threadId: int = None):
+        """
+        Start sampling the stack of the thread with id `threadId`, the
+        calling thread if None, which should be the one running the Looper
+        """
+        if self.sampler is None:
+            self.sampler = SamplingProfiler(
+                threadId if threadId is not None else threading.get_ident(),
+                interval)
+        self.sampler.start()
+
+    def stopSampling(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def dumpSamples(self, path: str):
+        """
+        Write the sampled stacks to `path` in the collapsed format of flame
+        graph tools
+        """
+        if self.sampler is None:
+            raise RuntimeError('{} did not sample any stacks'.format(self))
+        self.sampler.dump(path)
+
+    def snapshot(self) -> Dict:
+        return {
+            'prods': {name: p.asDict() for name, p in self.prods.items()},
+            'ticks': self.ticks.asDict(),
+            'processedPerTick': self.processedPerTick.asDict(),
+            'slowTicks': [t._asdict() for t in self.slowTicks],
+        }
+
+    def toJson(self) -> str:
+        return json.dumps(self.snapshot(), sort_keys=True)
+
+    def reset(self):
+        self.prods.clear()
+        self.ticks = Log2Histogram()
+        self.processedPerTick = Log2Histogram()
+        self.slowTicks.clear()
+
+
+def profilerFromConfig(config) -> Optional[LooperProfiler]:
+    if not config.LOOPER_PROFILE:
+        return None
+    return LooperProfiler(config.LOOPER_SLOW_TICK,
+                          config.LOOPER_SLOW_TICKS_KEPT)
@@ -0,0 +1,238 @@
+import asyncio
+import concurrent.futures
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+from stp_core.common.config.util import getConfig
+from stp_core.common.log import getlogger
+from stp_core.loop.event_loops import newEventLoop
+from stp_core.loop.exceptions import ProdableAlreadyAdded
+from stp_core.loop.looper import Looper, Prodable
+from stp_core.loop.startable import Status
+
+logger = getlogger()
+
+
+class LooperShard:
+    """
+    A Looper running on its own event loop, of the backend of the config,
+    in a thread of its own.
+
+    Prodables of the shard are started, prodded and stopped on its thread,
+    other threads reach them through `call` or a `HandoffQueue`.
+    """
+
+    def __init__(self, index: int, debug=False, timeout: float = 10, **kwargs):
+        """
+        :param index: number of the shard, used to name its thread
+        :param timeout: seconds to wait for calls on the shard's thread
+        :param kwargs: passed to the shard's Looper
+        """
+        self.index = index
+        self.timeout = timeout
+        self.loop = None  # type: asyncio.AbstractEventLoop
+        self.looper = None  # type: Looper
+        self._debug = debug
+        self._kwargs = kwargs
+        self._started = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True,
+                                       name='looper-shard-{}'.format(index))
+        self.thread.start()
+        if not self._started.wait(timeout):
+            raise RuntimeError('Looper shard {} failed to start'.
+                               format(index))
+
+    def __repr__(self):
+        return 'LooperShard({})'.format(self.index)
+
+    def _run(self):
+        self.loop = newEventLoop(getConfig().LOOPER_LOOP_BACKEND)
+        asyncio.set_event_loop(self.loop)
+        self.looper = Looper(loop=self.loop, debug=self._debug,
+                             **self._kwargs)
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    @property
+    def alive(self) -> bool:
+        return self.thread.is_alive()
+
+    def call(self, fn: Callable, *args):
+        """
+        Call `fn` on the shard's thread and return its result
+        """
+        if threading.current_thread() is self.thread:
+            return fn(*args)
+        future = concurrent.futures.Future()
+
+        def run():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as ex:
+                future.set_exception(ex)
+
+        self.loop.call_soon_threadsafe(run)
+        return future.result(self.timeout)
+
+    def stop(self):
+        """
+        Shut down the shard's Looper and wait for its thread to end
+        """
+        if not self.alive:
+            return
+        asyncio.run_coroutine_threadsafe(self.looper.shutdown(),
+                                         self.loop).result(self.timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(self.timeout)
+
+
+class ShardedLooper(Looper):
+    """
+    A Looper which can place prodables on shards, Loopers running on event
+    loops of their own in other threads, so independent prodables like the
+    node and client stacks do not wait for each other.
+
+    Shard 0 is this Looper itself, prodables are added to it unless another
+    shard is given. Prodables are found, removed and shut down on whichever
+    shard they are and `run` runs coroutines on shard 0 as with a Looper.
+    Shards only run in parallel while the GIL is released, like in libzmq's
+    and libsodium's calls.
+    """
+
+    def __init__(self, prodables: List[Prodable]=None, loop=None,
+                 debug=False, autoStart=True, shards: int = 1, **kwargs):
+        """
+        :param shards: number of shards running in other threads, each with
+        the idle policy and prod scheduler of the config
+        :param kwargs: passed to the Looper of shard 0
+        """
+        super().__init__(prodables, loop=loop, debug=debug,
+                         autoStart=autoStart, **kwargs)
+        self.shards = [LooperShard(i, debug=debug)
+                       for i in range(1, shards + 1)]
+
+    def _shard(self, shard: int) -> LooperShard:
+        if not 0 < shard <= len(self.shards):
+            raise ValueError('{} has no shard {}'.format(self, shard))
+        return self.shards[shard - 1]
+
+    def add(self, prodable: Prodable, shard: int = 0) -> None:
+        """
+        Add a Prodable to shard `shard` of this Looper
+        """
+        if shard == 0:
+            if self._shardOf(name=prodable.name) is not None:
+                raise ProdableAlreadyAdded("Prodable {} already added.".
+                                           format(prodable.name))
+            return super().add(prodable)
+        if self.hasProdable(name=prodable.name):
+            raise ProdableAlreadyAdded("Prodable {} already added.".
+                                       format(prodable.name))
+        target = self._shard(shard)
+        target.call(target.looper.add, prodable)
+
+    def _shardOf(self, prodable: Prodable=None,
+                 name: str=None) -> Optional[LooperShard]:
+        for s in self.shards:
+            if s.alive and s.call(s.looper.hasProdable, prodable, name):
+                return s
+        return None
+
+    def shardOf(self, prodable: Prodable) -> Optional[int]:
+        """
+        Number of the shard `prodable` is on, None if not on any
+        """
+        if Looper.hasProdable(self, prodable=prodable):
+            return 0
+        s = self._shardOf(prodable=prodable)
+        return s.index if s is not None else None
+
+    @property
+    def allProdables(self) -> List[Prodable]:
+        prodables = list(self.prodables)
+        for s in self.shards:
+            if s.alive:
+                prodables.extend(s.call(list, s.looper.prodables))
+        return prodables
+
+    def hasProdable(self, prodable: Prodable=None, name: str=None) -> bool:
+        return super().hasProdable(prodable, name) or \
+            self._shardOf(prodable, name) is not None
+
+    def removeProdable(self, prodable: Prodable=None,
+                       name: str=None) -> Optional[Prodable]:
+        s = None
+        if not Looper.hasProdable(self, prodable, name):
+            s = self._shardOf(prodable, name)
+        if s is None:
+            return super().removeProdable(prodable, name)
+        return s.call(s.looper.removeProdable, prodable, name)
+
+    async def shutdown(self):
+        """
+        Shut down the shards and then this Looper
+        """
+        for s in self.shards:
+            await self.loop.run_in_executor(None, s.stop)
+        await super().shutdown()
+
+
+class HandoffQueue(Prodable):
+    """
+    Passes items put on any thread to `handler`, called by the Looper, or
+    shard, the queue is added to. Items are handled in the order they were
+    put, the Looper is woken up when items are put while it is idle.
+    """
+
+    def __init__(self, name: str, handler: Callable):
+        self._name = name
+        self.handler = handler
+        # Appending and popping from a deque needs no lock
+        self._items = deque()
+        self._loop = None
+        self._wakeup = None
+        # Whether the Looper was woken up and has not started handling
+        # items yet, so it is not woken up for every item
+        self._signalled = False
+
+    @property
+    def name(self):
+        return self._name
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        self._items.append(item)
+        if not self._signalled:
+            loop, wakeup = self._loop, self._wakeup
+            if wakeup is not None:
+                self._signalled = True
+                loop.call_soon_threadsafe(wakeup)
+
+    async def prod(self, limit) -> int:
+        # Cleared before handling so items put meanwhile wake the Looper up
+        self._signalled = False
+        items = self._items
+        handled = 0
+        while items and (limit is None or handled < limit):
+            self.handler(items.popleft())
+            handled += 1
+        return handled
+
+    def start(self, loop):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_status(self) -> Status:
+        return Status.started
+
+    def set_wakeup(self, loop, wakeup):
+        self._loop = loop
+        self._wakeup = wakeup
@@ -0,0 +1,135 @@
+from collections import deque, Counter
+from enum import Enum, unique
+from typing import Union
+
+from stp_core.common.log import getlogger, reachedPowerOfTen
+
+logger = getlogger()
+
+
+@unique
+class ShedPolicy(Enum):
+    # Nothing is dropped, stacks stop receiving from sockets while the queue
+    # is full so the transport pushes back on senders
+    BACKPRESSURE = 'backpressure'
+
+    # The oldest message is dropped to make room for a new one
+    DROP_OLDEST = 'drop_oldest'
+
+    # The oldest message of the sender having the most messages in the queue
+    # is dropped to make room for a new one
+    DROP_BY_SHARE = 'drop_by_share'
+
+
+class BoundedRxQueue(deque):
+    """
+    Queue of received messages, `(msg, sender)` tuples, waiting to be
+    processed by a stack, holding at most `maxSize` of them.
+
+    With the backpressure policy the bound is kept by stacks asking how many
+    messages the queue `admits` before receiving. Messages appended while it
+    is full anyway, like the rest of a batch received in one frame, wait in
+    `overflow` and none are admitted till they have moved into the queue.
+    With the other policies messages are shed to keep the bound and counted
+    by sender in `shed`.
+    """
+
+    def __init__(self, maxSize: int = None,
+                 policy: Union[ShedPolicy, str] = ShedPolicy.BACKPRESSURE,
+                 name=None):
+        super().__init__()
+        self.maxSize = maxSize
+        self.policy = ShedPolicy(policy)
+        # Name of the stack, used for logging
+        self.name = name
+        self.shed = Counter()
+        # Number of queued messages by sender, kept only when shedding by
+        # share
+        self._queued = Counter() \
+            if maxSize and self.policy == ShedPolicy.DROP_BY_SHARE else None
+        # Messages waiting for room in the queue with the backpressure policy
+        self.overflow = deque()
+
+    @property
+    def shedTotal(self) -> int:
+        return sum(self.shed.values())
+
+    def admits(self, count: int) -> int:
+        """
+        How many of `count` messages can be received without going over the
+        bound when pushing back on senders
+        """
+        if not self.maxSize or self.policy != ShedPolicy.BACKPRESSURE:
+            return count
+        if self.overflow:
+            return 0
+        return max(0, min(count, self.maxSize - len(self)))
+
+    @property
+    def isFull(self) -> bool:
+        return bool(self.maxSize) and len(self) >= self.maxSize
+
+    def append(self, item):
+        if not self.maxSize or len(self) < self.maxSize:
+            super().append(item)
+            if self._queued is not None:
+                self._queued[item[1]] += 1
+            return
+        if self.policy == ShedPolicy.BACKPRESSURE:
+            self.overflow.append(item)
+            return
+        if self.policy == ShedPolicy.DROP_OLDEST:
+            self._shed(super().popleft())
+            super().append(item)
+            return
+
+        sender = item[1]
+        heaviest, count = self._queued.most_common(1)[0]
+        if self._queued[sender] + 1 >= count:
+            # The sender of the new message has the largest share already
+            self._shed(item)
+            return
+        for i, queued in enumerate(self):
+            if queued[1] == heaviest:
+                del self[i]
+                break
+        self._queued[heaviest] -= 1
+        self._shed(queued)
+        super().append(item)
+        self._queued[sender] += 1
+
+    def popleft(self):
+        item = super().popleft()
+        if self._queued is not None:
+            sender = item[1]
+            self._queued[sender] -= 1
+            if not self._queued[sender]:
+                del self._queued[sender]
+        if self.overflow:
+            super().append(self.overflow.popleft())
+        return item
+
+    def clear(self):
+        super().clear()
+        self.overflow.clear()
+        if self._queued is not None:
+            self._queued.clear()
+
+    def _shed(self, item):
+        sender = item[1]
+        self.shed[sender] += 1
+        count = self.shed[sender]
+        if reachedPowerOfTen(count):
+            logger.warning('{} dropped {} messages from {} since its queue of '
+                           'received messages is full ({} messages, policy '
+                           '{})'.format(self.name, count, sender, self.maxSize,
+                                        self.policy.value))
+
+    def report(self) -> dict:
+        return {
+            'size': len(self),
+            'maxSize': self.maxSize,
+            'overflow': len(self.overflow),
+            'policy': self.policy.value,
+            'shed': dict(self.shed),
+        }
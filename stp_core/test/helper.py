@@ -71,6 +71,14 @@ class SMotor(Motor):
     def stop(self):
         self.stack.stop()
 
+    def set_wakeup(self, loop, wakeup):
+        if not hasattr(self.stack, 'attach_to_loop'):
+            return
+        if wakeup:
+            self.stack.attach_to_loop(loop, wakeup)
+        else:
+            self.stack.detach_from_loop()
+
 
 def prepStacks(looper, *stacks, connect=True, useKeys=True):
     motors = []
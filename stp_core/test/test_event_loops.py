@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from stp_core.loop.event_loops import isOfBackend, loopBackends, newEventLoop
+from stp_core.loop.looper import Looper
+
+
+@pytest.fixture()
+def noDefaultLoop():
+    """
+    No default event loop during the test, the one before is restored after
+    """
+    before = asyncio.get_event_loop()
+    asyncio.set_event_loop(None)
+    yield
+    asyncio.set_event_loop(before)
+
+
+def test_looper_creates_loop_of_backend(noDefaultLoop):
+    for backend in loopBackends():
+        with Looper(loopBackend=backend) as looper:
+            assert isOfBackend(looper.loop, backend)
+            looper.runFor(0.05)
+        looper.loop.close()
+    with pytest.raises(ValueError):
+        newEventLoop('tokio')
@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from stp_core.loop.idle_policy import BackoffIdlePolicy, FixedIdlePolicy, \
+    idlePolicyFromConfig
+from stp_core.loop.looper import Looper, Prodable
+from stp_core.loop.startable import Status
+
+
+class Worker(Prodable):
+    """
+    Does the work given to it when prodded, waking the Looper up when given
+    work
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.doneAt = []
+        self._wakeup = None
+
+    @property
+    def name(self):
+        return 'Worker'
+
+    async def prod(self, limit):
+        done = len(self.pending)
+        now = time.perf_counter()
+        self.doneAt.extend(now - givenAt for givenAt in self.pending)
+        self.pending.clear()
+        return done
+
+    def start(self, loop):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_status(self):
+        return Status.started
+
+    def set_wakeup(self, loop, wakeup):
+        self._wakeup = wakeup
+
+    def give(self):
+        self.pending.append(time.perf_counter())
+        self._wakeup()
+
+
+def test_backoff_grows_while_idle():
+    policy = BackoffIdlePolicy(start=0.001, peak=0.1, steps=5)
+    waits = [policy.afterRound(0) for _ in range(7)]
+    assert waits[0] == pytest.approx(0.001)
+    assert waits == sorted(waits)
+    assert waits[4:] == [pytest.approx(0.1)] * 3
+
+    assert policy.afterRound(3) == 0
+    assert policy.afterRound(0) == pytest.approx(0.001)
+    policy.afterRound(0)
+    policy.afterWait(0.0001, wokenUp=True)
+    assert policy.afterRound(0) == pytest.approx(0.001)
+
+    stats = policy.stats
+    assert (stats.rounds, stats.busyRounds, stats.waits, stats.wokenUp) == \
+        (11, 1, 10, 1)
+    assert stats.max == pytest.approx(0.1)
+
+
+def test_backoff_bounds_checked():
+    policy = BackoffIdlePolicy(start=0.001, peak=0.1, steps=1)
+    assert [policy.afterRound(0) for _ in range(3)] == \
+        [pytest.approx(0.1)] * 3
+    for start, peak, steps in ((0, 0.1, 8), (-0.001, 0.1, 8),
+                               (0.1, 0.001, 8), (0.001, 0.1, 0)):
+        with pytest.raises(ValueError):
+            BackoffIdlePolicy(start=start, peak=peak, steps=steps)
+
+
+def test_idle_policy_from_config(monkeypatch):
+    from stp_core.common.config.util import getConfig
+    config = getConfig()
+    assert isinstance(idlePolicyFromConfig(config), FixedIdlePolicy)
+    monkeypatch.setattr(config, 'LOOPER_IDLE_POLICY', 'backoff')
+    policy = idlePolicyFromConfig(config)
+    assert isinstance(policy, BackoffIdlePolicy)
+    assert policy.ratchet.peak == config.LOOPER_IDLE_BACKOFF_PEAK
+    monkeypatch.setattr(config, 'LOOPER_IDLE_BACKOFF_STEPS', 1)
+    assert idlePolicyFromConfig(config).afterRound(0) == \
+        pytest.approx(config.LOOPER_IDLE_BACKOFF_PEAK)
+    monkeypatch.setattr(config, 'LOOPER_IDLE_POLICY', 'spin')
+    with pytest.raises(ValueError):
+        idlePolicyFromConfig(config)
+
+
+def test_idle_looper_backs_off_and_wakes_up_for_work():
+    """
+    An idle Looper with the backoff policy wakes up rarely but still does
+    work given to a prodable right away
+    """
+    worker = Worker()
+    policy = BackoffIdlePolicy(start=0.001, peak=0.2, steps=4)
+    with Looper([worker], idlePolicy=policy) as looper:
+        looper.runFor(1)
+        stats = looper.idleStats
+        # A Looper waiting 10 milliseconds each time has about 100 rounds
+        assert stats.rounds < 15
+        assert stats.max == pytest.approx(0.2)
+        assert stats.wokenUp == 0
+
+        for i in range(5):
+            looper.loop.call_later(0.1 + i * 0.3, worker.give)
+        looper.runFor(1.6)
+        assert len(worker.doneAt) == 5
+        assert max(worker.doneAt) < 0.05
+        assert looper.idleStats.wokenUp >= 5
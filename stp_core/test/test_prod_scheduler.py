@@ -0,0 +1,76 @@
+import time
+
+from stp_core.loop.looper import Looper, Prodable
+from stp_core.loop.prod_scheduler import ProdScheduler
+from stp_core.loop.startable import Status
+
+
+class Backlog(Prodable):
+    """
+    Processes up to `limit` of its messages when prodded, taking `cost`
+    seconds for each
+    """
+
+    def __init__(self, name, size, cost=0.0):
+        self._name = name
+        self.size = size
+        self.cost = cost
+        self.limits = []
+
+    @property
+    def name(self):
+        return self._name
+
+    async def prod(self, limit):
+        self.limits.append(limit)
+        done = min(limit or self.size, self.size)
+        self.size -= done
+        if done and self.cost:
+            time.sleep(done * self.cost)
+        return done
+
+    def start(self, loop):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_status(self):
+        return Status.started
+
+
+def test_order_rotates_by_priority():
+    scheduler = ProdScheduler()
+    a, b, c, d = 'a', 'b', 'c', 'd'
+    assert [scheduler.order([a, b, c]) for _ in range(4)] == \
+        [[a, b, c], [b, c, a], [c, a, b], [a, b, c]]
+
+    scheduler.setBudget(d, priority=1)
+    scheduler.setBudget(c, priority=1)
+    orders = [scheduler.order([a, b, c, d]) for _ in range(2)]
+    assert [o[:2] for o in orders] == [[c, d], [d, c]]
+    assert sorted(o[2:] for o in orders) == [[a, b], [b, a]]
+    scheduler.forget(c)
+    assert scheduler.budgetOf(c) is scheduler.defaultBudget
+
+
+def test_prodables_kept_to_budgets():
+    """
+    A prodable with a large backlog processes it in parts so others are
+    prodded meanwhile, prodables taking too long are reported
+    """
+    big = Backlog('Big', 1000, cost=0.0001)
+    small = Backlog('Small', 0)
+    with Looper([big, small]) as looper:
+        looper.setBudget(big, limit=100, timeBudget=0.005)
+        looper.setBudget(small, priority=1)
+        looper.runFor(0.5)
+    assert big.size == 0
+    assert set(big.limits) == {100}
+    assert len(small.limits) >= 10
+    assert set(small.limits) == {None}
+
+    overruns = looper.prodScheduler.overruns
+    assert overruns['Big'] == 10
+    assert 'Small' not in overruns
+    assert looper.prodScheduler.longestOverrun['Big'] >= 0.005
@@ -0,0 +1,102 @@
+import json
+import time
+
+from stp_core.loop.looper import Looper, Prodable
+from stp_core.loop.profiler import Log2Histogram, LooperProfiler
+from stp_core.loop.startable import Status
+
+
+class Sleeper(Prodable):
+    """
+    Processes `batch` events every other time it is prodded, so the Looper
+    idles in between, taking `cost` seconds each time and `slowCost` seconds
+    every `slowEvery` times
+    """
+
+    def __init__(self, name, batch, cost, slowEvery=None, slowCost=0.0):
+        self._name = name
+        self.batch = batch
+        self.cost = cost
+        self.slowEvery = slowEvery
+        self.slowCost = slowCost
+        self.prods = 0
+
+    @property
+    def name(self):
+        return self._name
+
+    async def prod(self, limit):
+        self.prods += 1
+        if self.slowEvery and self.prods % self.slowEvery == 0:
+            time.sleep(self.slowCost)
+        else:
+            time.sleep(self.cost)
+        return self.batch if self.prods % 2 else 0
+
+    def start(self, loop):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_status(self):
+        return Status.started
+
+
+def test_log2_histogram():
+    h = Log2Histogram()
+    for v in [0, 1, 5, 6, 7, 100, 1000]:
+        h.add(v)
+    assert h.counts[:4] == [1, 1, 0, 3]
+    assert (h.count, h.total, h.max) == (7, 1119, 1000)
+    assert h.percentile(50) == 8
+    assert h.percentile(99) == 1000
+    assert h.asDict()['buckets'] == {0: 1, 2: 1, 8: 3, 128: 1, 1024: 1}
+
+
+def test_looper_profiled():
+    """
+    A Looper records how long prodables and ticks take and keeps the slow
+    ticks with the prodable responsible
+    """
+    quick = Sleeper('Quick', 2, 0)
+    slow = Sleeper('Slow', 1, 0.001, slowEvery=10, slowCost=0.05)
+    profiler = LooperProfiler(slowTick=0.03, slowTicksKept=3)
+    with Looper([quick, slow], profiler=profiler) as looper:
+        looper.runFor(1)
+
+    prods = profiler.prods
+    assert prods['Quick'].durations.count == quick.prods
+    assert prods['Slow'].durations.count == slow.prods
+    assert prods['Quick'].processed.total == 2 * ((quick.prods + 1) // 2)
+    assert prods['Slow'].durations.max >= 50000
+    assert prods['Quick'].durations.percentile(99) < 1000
+
+    assert profiler.ticks.count == slow.prods
+    assert profiler.processedPerTick.max == 3
+    slowTicks = list(profiler.slowTicks)
+    assert len(slowTicks) == 3
+    assert {t.prodable for t in slowTicks} == {'Slow'}
+    assert all(t.duration >= t.prodDuration >= 0.05 for t in slowTicks)
+
+    snapshot = json.loads(profiler.toJson())
+    assert set(snapshot['prods']) == {'Quick', 'Slow'}
+    assert len(snapshot['slowTicks']) == 3
+    assert snapshot['slowTicks'][0]['prodable'] == 'Slow'
+
+
+def test_looper_stacks_sampled(tmpdir):
+    slow = Sleeper('Slow', 0, 0.01)
+    with Looper([slow]) as looper:
+        looper.profiler.startSampling(interval=0.002)
+        looper.runFor(0.5)
+        looper.profiler.stopSampling()
+    path = str(tmpdir.join('stacks.txt'))
+    looper.profiler.dumpSamples(path)
+    with open(path) as f:
+        lines = f.read().splitlines()
+    samples = [line.rsplit(' ', 1) for line in lines]
+    # The Looper's thread spends about half its time sleeping in `prod`
+    inProd = sum(int(count) for stack, count in samples
+                 if stack.endswith('test_profiler.py:prod'))
+    assert inProd > 10
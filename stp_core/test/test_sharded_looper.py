@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from stp_core.loop.eventually import eventually
+from stp_core.loop.exceptions import ProdableAlreadyAdded
+from stp_core.loop.looper import Prodable
+from stp_core.loop.sharded_looper import HandoffQueue, ShardedLooper
+from stp_core.loop.startable import Status
+
+
+class Counter(Prodable):
+    """
+    Counts how often it was prodded and notes on which threads
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self.prods = 0
+        self.threads = set()
+        self.status = Status.stopped
+
+    @property
+    def name(self):
+        return self._name
+
+    async def prod(self, limit):
+        self.prods += 1
+        self.threads.add(threading.current_thread())
+        return 0
+
+    def start(self, loop):
+        self.status = Status.started
+
+    def stop(self):
+        self.status = Status.stopped
+
+    def get_status(self):
+        return self.status
+
+
+def test_prodables_prodded_on_their_shards():
+    a, b, c = Counter('a'), Counter('b'), Counter('c')
+    with ShardedLooper(shards=2) as looper:
+        looper.add(a)
+        looper.add(b, shard=1)
+        looper.add(c, shard=2)
+        with pytest.raises(ProdableAlreadyAdded):
+            looper.add(Counter('b'))
+        with pytest.raises(ValueError):
+            looper.add(Counter('d'), shard=3)
+        assert [looper.shardOf(p) for p in (a, b, c)] == [0, 1, 2]
+        assert looper.hasProdable(name='c')
+        assert {p.name for p in looper.allProdables} == {'a', 'b', 'c'}
+
+        looper.runFor(0.2)
+        assert all(p.prods > 0 for p in (a, b, c))
+        assert a.threads == {threading.current_thread()}
+        threads = a.threads | b.threads | c.threads
+        assert len(threads) == 3
+
+        assert looper.removeProdable(name='c') is c
+        assert not looper.hasProdable(c)
+        prods = c.prods
+        looper.runFor(0.1)
+        assert c.prods == prods
+        shards = looper.shards
+    assert not any(s.alive for s in shards)
+    assert a.status == b.status == Status.stopped
+
+
+def test_handoff_between_shards():
+    """
+    Items handed off to a queue on a shard are handled there, in order, and
+    handed back to a queue on shard 0
+    """
+    received = []
+    back = HandoffQueue('back', received.append)
+    there = HandoffQueue('there', lambda item: back.put((
+        item, threading.current_thread().name)))
+    with ShardedLooper(shards=1) as looper:
+        looper.add(back)
+        looper.add(there, shard=1)
+        for i in range(100):
+            there.put(i)
+
+        def chk():
+            assert len(received) == 100
+
+        looper.run(eventually(chk, retryWait=0.05, timeout=3))
+    assert [i for i, _ in received] == list(range(100))
+    assert {t for _, t in received} == {'looper-shard-1'}
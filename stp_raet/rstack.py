@@ -11,8 +11,9 @@ from raet.road.estating import RemoteEstate
 from raet.road.keeping import RoadKeep
 from raet.road.stacking import RoadStack
 from raet.road.transacting import Joiner, Allower, Messenger
+from stp_core.common.config.util import getConfig
 from stp_core.common.error import error
-from stp_core.common.log import getlogger
+from stp_core.common.log import getlogger, getHotPathLogger
 from stp_core.crypto.nacl_wrappers import Signer
 
 from stp_core.crypto.util import ed25519SkToCurve25519, \
@@ -20,11 +21,13 @@ from stp_core.crypto.util import ed25519SkToCurve25519, \
 from stp_core.network.auth_mode import AuthMode
 from stp_core.network.keep_in_touch import KITNetworkInterface
 from stp_core.network.network_interface import NetworkInterface
+from stp_core.network.rx_queue import BoundedRxQueue
 from stp_core.network.util import checkPortAvailable, distributedConnectionMap
 from stp_core.types import HA
 from stp_raet.util import getLocalKeep, getLocalEstateData
 
 logger = getlogger()
+hotLogger = getHotPathLogger()
 
 # this overrides the defaults
 Joiner.RedoTimeoutMin = 1.0
@@ -64,6 +67,11 @@ class RStack(NetworkInterface):
         # if no timeout is set then message will never timeout
         self.messageTimeout = kwargs.pop('messageTimeout', 0)
 
+        config = getConfig()
+        kwargs.setdefault('rxMsgs', BoundedRxQueue(config.RX_QUEUE_SIZE,
+                                                   config.RX_QUEUE_POLICY,
+                                                   name=kwargs['name']))
+
         self.raetStack = RoadStack(*args, **kwargs)
 
         if self.ha[1] != kwargs['ha'].port:
@@ -101,6 +109,14 @@ class RStack(NetworkInterface):
     def rxMsgs(self):
         return self.raetStack.rxMsgs
 
+    @property
+    def rxShedCounts(self) -> Dict[str, int]:
+        """
+        Number of received messages dropped since `rxMsgs` was full, by the
+        name of the remote sending them
+        """
+        return dict(self.raetStack.rxMsgs.shed)
+
     @staticmethod
     def isRemoteConnected(r) -> bool:
         """
@@ -293,15 +309,17 @@ class RStack(NetworkInterface):
         if self.coro:
             # x = next(self.coro)
             x = await self.coro()
+            processed = 0
             if x > 0:
-                for x in range(pracLimit):
+                for _ in range(min(pracLimit, x)):
                     try:
                         self.msgHandler(self.raetStack.rxMsgs.popleft())
                     except IndexError:
                         break
-            return x
+                    processed += 1
+            return processed
         else:
-            logger.debug("{} is stopped".format(self))
+            hotLogger.debug("{} is stopped", self)
             return 0
 
     # def _raetcoro(self):
@@ -356,7 +374,12 @@ class RStack(NetworkInterface):
         :param age: update timestamp of this RoadStack to this value
         """
         self.updateStamp(age)
-        self.raetStack.serviceAll()
+        if self.raetStack.rxMsgs.admits(1):
+            self.raetStack.serviceAll()
+        else:
+            # Not receiving while pushing back on senders, RAET retries
+            # sending messages which are not acknowledged
+            self.raetStack.serviceAllTx()
 
     def updateStamp(self, age=None):
         """
@@ -584,7 +607,8 @@ class KITRStack(SimpleRStack, KITNetworkInterface):
         return super(KITRStack, self).processRx(packet)
 
     def handleJoinFromUnregisteredRemote(self, sha):
-        logger.debug('Remote with HA {} not added -> not found in registry'.format(sha))
+        hotLogger.debug('Remote with HA {} not added -> not found in registry',
+                        sha)
         return None
 
 
@@ -0,0 +1,50 @@
+import struct
+from typing import List
+
+# Prefixes batches of messages, next to the tags of binary serializers in
+# `stp_zmq.serializers`
+BATCH_TAG = 0x02
+# Advertised along with serializers by stacks able to read batches
+BATCH_CAPABILITY = 'batch'
+
+_length = struct.Struct('>I')
+
+
+def packBatch(msgs: List[bytes]) -> bytes:
+    """
+    Pack serialized messages in one envelope, each prefixed by its length
+    """
+    parts = [bytes((BATCH_TAG,))]
+    for msg in msgs:
+        parts.append(_length.pack(len(msg)))
+        parts.append(msg)
+    return b''.join(parts)
+
+
+def isBatch(data) -> bool:
+    return not isinstance(data, str) and len(data) > 0 and \
+        data[0] == BATCH_TAG
+
+
+def unpackBatch(data) -> List[memoryview]:
+    """
+    Messages of a batch as views of `data`, which is not copied
+
+    :raises ValueError: when the batch is truncated
+    """
+    view = memoryview(data)
+    end = len(view)
+    offset = 1
+    msgs = []
+    while offset < end:
+        if offset + _length.size > end:
+            raise ValueError('batch truncated at {} of {} bytes'.
+                             format(offset, end))
+        size, = _length.unpack_from(view, offset)
+        offset += _length.size
+        if offset + size > end:
+            raise ValueError('batch truncated at {} of {} bytes'.
+                             format(offset, end))
+        msgs.append(view[offset:offset + size])
+        offset += size
+    return msgs
@@ -0,0 +1,244 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Tuple
+
+from stp_core.common.log import getlogger
+from stp_core.crypto.nacl_wrappers import Verifier
+from stp_zmq.batching import isBatch, unpackBatch
+from stp_zmq.serializers import serializers
+
+logger = getlogger()
+
+
+# Outcomes of decoding a received message, `(outcome, msg, ident)` tuples
+# are delivered back to the stack
+DECODED = 0
+# Short text which may be a ping or pong, handled by the stack
+CONTROL = 1
+# Could not be decoded, the message is a description of the error
+FAILED = 2
+
+
+def decodeBatch(items, textSerializerName, controlPrefixes, maxControlLen,
+                verKeys: Dict[bytes, bytes] = None, sigLen=64):
+    """
+    Verify, decode and deserialize received messages, run by workers of a
+    `DecodePool` so it is a module function which can be pickled.
+
+    :param items: `(msg, ident)` tuples with messages as str, bytes or
+    buffers
+    :param textSerializerName: serializer for messages without a tag
+    :param controlPrefixes: starts of pings and pongs
+    :param maxControlLen: messages up to this length may be pings or pongs
+    :param verKeys: raw verification keys by identity of the senders when
+    messages are signed, None for senders whose messages are accepted
+    without verifying them. Signed messages may be batches, unpacked once
+    verified
+    :param sigLen: length of the signatures ending signed messages
+    """
+    text = serializers.get(textSerializerName)
+    results = []
+    if verKeys is None:
+        for msg, ident in items:
+            _decode(msg, ident, text, controlPrefixes, maxControlLen, results)
+        return results
+
+    # Verifiers by identity of the sender, made once a batch
+    verifiers = {}
+    for msg, ident in items:
+        if len(msg) <= sigLen:
+            results.append((FAILED, 'message {} which is too short to be '
+                                    'signed'.format(bytes(msg)), ident))
+            continue
+        msg = bytes(msg)
+        data = msg[:-sigLen]
+        verKey = verKeys.get(ident)
+        if verKey is not None:
+            if ident not in verifiers:
+                verifiers[ident] = Verifier(verKey)
+            if not verifiers[ident].verify(msg[-sigLen:], data):
+                results.append((FAILED, 'message {} which could not be '
+                                        'verified'.format(data), ident))
+                continue
+        if not isBatch(data):
+            _decode(data, ident, text, controlPrefixes, maxControlLen,
+                    results)
+            continue
+        try:
+            msgs = unpackBatch(data)
+        except ValueError as ex:
+            results.append((FAILED, 'malformed batch: {}'.format(ex), ident))
+            continue
+        # Batches are unpacked one level only, stacks never nest them
+        for m in msgs:
+            if isBatch(m):
+                results.append((FAILED, 'batch nested in a batch', ident))
+            else:
+                _decode(m, ident, text, controlPrefixes, maxControlLen,
+                        results)
+    return results
+
+
+def _decode(msg, ident, text, controlPrefixes, maxControlLen, results):
+    if not isinstance(msg, str) and not serializers.isTagged(msg) and \
+            (not text.readsBuffers or len(msg) <= maxControlLen):
+        try:
+            msg = str(msg, 'utf-8')
+        except UnicodeDecodeError as ex:
+            results.append((FAILED, 'exception while decoding {} to '
+                                    'utf-8: {}'.format(bytes(msg), ex),
+                            ident))
+            return
+    if isinstance(msg, str) and msg[:2] in controlPrefixes:
+        results.append((CONTROL, msg, ident))
+        return
+    try:
+        results.append((DECODED, serializers.deserialize(msg, text), ident))
+    except Exception as ex:
+        results.append((FAILED, 'error {} while deserializing message {}'
+                                .format(ex, bytes(msg)
+                                        if isinstance(msg, memoryview)
+                                        else msg),
+                        ident))
+
+
+class DecodePool:
+    """
+    Verifies signatures of, decodes and deserializes received messages on a
+    pool of workers so neither holds up the event loop.
+
+    Messages are submitted in batches and their results are taken in the
+    order they were submitted, so messages of each sender are processed in
+    the order they were received. Thread workers only run in parallel when
+    deserializing releases the GIL, process workers always do but messages
+    are copied to them.
+    """
+    THREAD = 'thread'
+    PROCESS = 'process'
+
+    def __init__(self, kind: str, workers: int = None, batchSize: int = 256,
+                 maxPending: int = None, onDone: Callable = None, name=None):
+        """
+        :param kind: `THREAD` or `PROCESS`
+        :param workers: number of workers, the number of cores if None
+        :param batchSize: most messages decoded by a worker at a time
+        :param maxPending: most messages submitted and not taken yet, None
+        for no limit
+        :param onDone: called, from the worker's thread, whenever a batch
+        is decoded
+        :param name: name of the stack, used for logging
+        """
+        if kind not in (self.THREAD, self.PROCESS):
+            raise ValueError('Unknown kind of decode pool {}'.format(kind))
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.batchSize = batchSize
+        self.maxPending = maxPending
+        self.onDone = onDone
+        self.name = name
+        self._executor = None  # type: Executor
+        # Batches being decoded with their sizes, oldest first
+        self._batches = deque()  # type: Deque[Tuple[Future, int]]
+        # Results of decoded batches not taken yet
+        self._results = deque()  # type: Deque[Tuple[int, object, bytes]]
+        self._submitted = 0
+
+    @property
+    def copiesMessages(self) -> bool:
+        """
+        Whether messages are copied to workers, buffers of frames then need
+        to be converted to bytes
+        """
+        return self.kind == self.PROCESS
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of messages submitted whose results were not taken yet
+        """
+        return self._submitted + len(self._results)
+
+    @property
+    def admits(self) -> int:
+        """
+        Number of messages which can be submitted without going over
+        `maxPending`
+        """
+        if self.maxPending is None:
+            return self.batchSize * self.workers
+        return max(0, self.maxPending - self.pending)
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.kind == self.PROCESS:
+            # Forking copies the threads of zmq, of the ZAP handler and of
+            # other pools in a broken state, workers are started afresh
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def stop(self):
+        """
+        Stop the workers, waiting for the batches they are decoding, messages
+        not taken yet are dropped
+        """
+        if self._executor is None:
+            return
+        for future, _ in self._batches:
+            future.cancel()
+        dropped = self.pending
+        if dropped:
+            logger.info('{} dropped {} messages being decoded'.
+                        format(self.name, dropped), extra={"cli": False})
+        # Workers left running keep the process from exiting
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self._batches.clear()
+        self._results.clear()
+        self._submitted = 0
+
+    def submit(self, items: List[Tuple[object, bytes]],
+               textSerializer: str, controlPrefixes, maxControlLen,
+               verKeys: Dict[bytes, bytes] = None, sigLen=64):
+        """
+        Decode `(msg, ident)` tuples in batches of at most `batchSize`,
+        verifying their signatures first when `verKeys` are given, see
+        `decodeBatch`
+        """
+        for i in range(0, len(items), self.batchSize):
+            batch = items[i:i + self.batchSize]
+            future = self._executor.submit(decodeBatch, batch,
+                                           textSerializer,
+                                           controlPrefixes, maxControlLen,
+                                           verKeys, sigLen)
+            self._batches.append((future, len(batch)))
+            self._submitted += len(batch)
+            if self.onDone is not None:
+                future.add_done_callback(self._onDone)
+
+    def _onDone(self, future):
+        self.onDone()
+
+    def take(self, limit: int) -> List[Tuple[int, object, bytes]]:
+        """
+        Results of at most `limit` messages, in the order they were
+        submitted, stopping at the first batch which is not decoded yet
+        """
+        batches = self._batches
+        results = self._results
+        while len(results) < limit and batches and batches[0][0].done():
+            future, size = batches.popleft()
+            self._submitted -= size
+            try:
+                results.extend(future.result())
+            except Exception as ex:
+                # A worker died or the batch could not be sent to it
+                logger.error('{} could not decode {} messages: {}'.
+                             format(self.name, size, ex))
+        return [results.popleft() for _ in range(min(limit, len(results)))]
@@ -0,0 +1,83 @@
+import os
+import time
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+import zmq.auth
+
+Keys = Tuple[bytes, Optional[bytes]]
+
+# Keys of a certificate, the modification time, size and inode of its file
+# when it was read, and when they were last checked
+CachedKeys = namedtuple('CachedKeys', ['keys', 'stamp', 'checkedAt'])
+
+
+class KeyCache:
+    """
+    Keys loaded from certificate files, by the path of the file, so stacks
+    read and parse each file once instead of every time a key is used.
+
+    Files are written and removed through `stp_zmq.util` and stacks, which
+    invalidate the keys of files they change. Files changed some other way
+    are noticed by checking their modification time and size once every
+    `checkInterval` seconds, never if it is None.
+    """
+
+    def __init__(self, checkInterval: Optional[float] = 1):
+        self.checkInterval = checkInterval
+        self._keys = {}  # type: Dict[str, CachedKeys]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def load(self, path: str) -> Keys:
+        """
+        Public and secret key of the certificate at `path`, the secret key
+        is None for public certificates
+
+        :raises IOError: if the file does not exist
+        :raises ValueError: if it is not a certificate
+        """
+        path = os.path.normpath(path)
+        cached = self._keys.get(path)
+        now = time.perf_counter()
+        if cached is not None:
+            if self.checkInterval is None or \
+                    now - cached.checkedAt < self.checkInterval:
+                return cached.keys
+            stamp = self._stamp(path)
+            if stamp == cached.stamp:
+                self._keys[path] = cached._replace(checkedAt=now)
+                return cached.keys
+        # Stamped before reading so a change while reading is noticed at the
+        # next check
+        stamp = self._stamp(path)
+        keys = zmq.auth.load_certificate(path)
+        self._keys[path] = CachedKeys(keys, stamp, now)
+        return keys
+
+    def invalidate(self, path: str = None):
+        """
+        Forget keys of the certificate at `path`, or of all certificates in
+        the directory at `path`, or all keys if None
+        """
+        if path is None:
+            self._keys.clear()
+            return
+        path = os.path.normpath(path)
+        prefix = os.path.join(path, '')
+        for cached in [p for p in self._keys
+                       if p == path or p.startswith(prefix)]:
+            del self._keys[cached]
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+# Shared by the stacks of a process, which may read the same certificates
+keyCache = KeyCache()
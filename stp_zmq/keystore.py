@@ -0,0 +1,350 @@
+"""
+Stores of the keys of a stack and of its peers.
+
+Keys are kept either as ZMQ certificate files, one for each key in a
+directory for each kind of key, or in a single SQLite file indexed by name
+and by public key, which scales to many peers.
+
+Keys of a stack in directories are moved to SQLite with
+
+    python -m stp_zmq.keystore migrate <home dir of the stack>
+
+and stores are exported to and imported from JSON lines with the `export`
+and `import` commands.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Iterable, Iterator, Optional, Tuple
+
+import zmq
+
+from stp_core.common.config.util import getConfig
+from stp_zmq.key_cache import keyCache
+from stp_zmq.util import createCertsFromKeys, \
+    moveKeyFilesToCorrectLocations, writeKeyFile
+
+# A key entry, the public key and the secret key if any, both Z85 encoded
+Entry = Tuple[str, bytes, Optional[bytes]]
+
+
+class KeyStore:
+    """
+    Keys by kind and name of their owner. Keys of the `PUBLIC` and `VERIF`
+    kinds are public keys of a stack and its peers, those of the `SECRET`
+    and `SIG` kinds are the stack's own and have a secret key.
+    """
+    PUBLIC = 'public_keys'
+    SECRET = 'private_keys'
+    VERIF = 'verif_keys'
+    SIG = 'sig_keys'
+    kinds = (PUBLIC, SECRET, VERIF, SIG)
+    secretKinds = (SECRET, SIG)
+
+    def get(self, kind: str, name: str) -> Tuple[bytes, Optional[bytes]]:
+        """
+        :raises KeyError: if there is no key of `kind` for `name`
+        """
+        raise NotImplementedError
+
+    def put(self, kind: str, name: str, public: bytes,
+            secret: bytes = None):
+        raise NotImplementedError
+
+    def putMany(self, kind: str, entries: Iterable[Entry]):
+        for name, public, secret in entries:
+            self.put(kind, name, public, secret)
+
+    def remove(self, kind: str, name: str):
+        raise NotImplementedError
+
+    def items(self, kind: str) -> Iterator[Entry]:
+        raise NotImplementedError
+
+    def names(self, kind: str):
+        return [name for name, _, _ in self.items(kind)]
+
+    def hasPublicKey(self, kind: str, public: bytes) -> bool:
+        return any(p == public for _, p, _ in self.items(kind))
+
+    def putFromCertificates(self, keysDir: str, publicKind: str,
+                            secretKind: str):
+        """
+        Store keys of the certificates in `keysDir`, public ones as
+        `publicKind` and secret ones as `secretKind`
+        """
+        for fileName in os.listdir(keysDir):
+            name, ext = os.path.splitext(fileName)
+            if ext not in ('.key', '.key_secret'):
+                continue
+            public, secret = zmq.auth.load_certificate(
+                os.path.join(keysDir, fileName))
+            self.put(secretKind if ext == '.key_secret' else publicKind,
+                     name, public, secret)
+
+    def configureCurve(self, auth):
+        """
+        Let `auth` allow clients whose public keys are in this store
+        """
+        auth.configure_curve_callback(domain='*', credentials_provider=self)
+
+    def callback(self, domain, key: bytes) -> bool:
+        # Called by the ZAP handler with the Z85 encoded key of a client
+        return self.hasPublicKey(self.PUBLIC, key)
+
+    def close(self):
+        pass
+
+
+class DirectoryKeyStore(KeyStore):
+    """
+    Keys as ZMQ certificate files in a directory of the stack's home
+    directory for each kind of key
+    """
+
+    def __init__(self, homeDir: str):
+        self.homeDir = homeDir
+
+    def __repr__(self):
+        return 'DirectoryKeyStore({})'.format(self.homeDir)
+
+    def dirOf(self, kind):
+        return os.path.join(self.homeDir, kind)
+
+    def _path(self, kind, name):
+        suffix = 'key_secret' if kind in self.secretKinds else 'key'
+        return os.path.join(self.dirOf(kind), '{}.{}'.format(name, suffix))
+
+    def get(self, kind, name):
+        try:
+            return keyCache.load(self._path(kind, name))
+        except (ValueError, IOError) as ex:
+            raise KeyError(name) from ex
+
+    def put(self, kind, name, public, secret=None):
+        os.makedirs(self.dirOf(kind), exist_ok=True)
+        if kind not in self.secretKinds:
+            createCertsFromKeys(self.dirOf(kind), name, public)
+            return
+        path = self._path(kind, name)
+        keyCache.invalidate(path)
+        writeKeyFile(path, public, secret_key=secret)
+
+    def remove(self, kind, name):
+        for suffix in ('key', 'key_secret'):
+            path = os.path.join(self.dirOf(kind),
+                                '{}.{}'.format(name, suffix))
+            keyCache.invalidate(path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def items(self, kind):
+        directory = self.dirOf(kind)
+        if not os.path.isdir(directory):
+            return
+        suffix = '.key_secret' if kind in self.secretKinds else '.key'
+        for fileName in sorted(os.listdir(directory)):
+            if fileName.endswith(suffix):
+                public, secret = keyCache.load(
+                    os.path.join(directory, fileName))
+                yield fileName[:-len(suffix)], public, secret
+
+    def putFromCertificates(self, keysDir, publicKind, secretKind):
+        # Certificates are moved as they are
+        for kind in (publicKind, secretKind):
+            os.makedirs(self.dirOf(kind), exist_ok=True)
+        moveKeyFilesToCorrectLocations(keysDir, self.dirOf(publicKind),
+                                       self.dirOf(secretKind))
+
+    def configureCurve(self, auth):
+        auth.configure_curve(domain='*', location=self.dirOf(self.PUBLIC))
+
+
+class SqliteKeyStore(KeyStore):
+    """
+    Keys in a single SQLite file, indexed by name and by public key
+    """
+    fileName = 'keys.db'
+
+    def __init__(self, path: str):
+        self.path = path
+        # Clients are authenticated on the ZAP handler's thread, the
+        # connection is shared with it and used by one thread at a time
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS keys ('
+                             'kind TEXT NOT NULL, name TEXT NOT NULL, '
+                             'public BLOB NOT NULL, secret BLOB, '
+                             'PRIMARY KEY (kind, name))')
+            self._db.execute('CREATE INDEX IF NOT EXISTS keys_by_public '
+                             'ON keys (kind, public)')
+
+    def __repr__(self):
+        return 'SqliteKeyStore({})'.format(self.path)
+
+    def get(self, kind, name):
+        with self._lock:
+            row = self._db.execute('SELECT public, secret FROM keys '
+                                   'WHERE kind = ? AND name = ?',
+                                   (kind, name)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0], row[1]
+
+    def put(self, kind, name, public, secret=None):
+        self.putMany(kind, [(name, public, secret)])
+
+    def putMany(self, kind, entries):
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO keys '
+                                 '(kind, name, public, secret) '
+                                 'VALUES (?, ?, ?, ?)',
+                                 ((kind, name, public, secret)
+                                  for name, public, secret in entries))
+
+    def remove(self, kind, name):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM keys WHERE kind = ? AND name = ?',
+                             (kind, name))
+
+    def items(self, kind):
+        # Fetched at once so the lock is not held while they are consumed
+        with self._lock:
+            rows = self._db.execute('SELECT name, public, secret FROM keys '
+                                    'WHERE kind = ? ORDER BY name',
+                                    (kind,)).fetchall()
+        yield from rows
+
+    def hasPublicKey(self, kind, public):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM keys '
+                                    'WHERE kind = ? AND public = ?',
+                                    (kind, public)).fetchone() is not None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def openKeyStore(homeDir: str, config=None) -> KeyStore:
+    """
+    Key store of the stack with home directory `homeDir`, the SQLite store
+    if there is one or `ZMQ_KEY_STORE` is 'sqlite', otherwise the directories
+    """
+    path = os.path.join(homeDir, SqliteKeyStore.fileName)
+    config = config or getConfig()
+    if os.path.isfile(path) or config.ZMQ_KEY_STORE == 'sqlite':
+        os.makedirs(homeDir, exist_ok=True)
+        return SqliteKeyStore(path)
+    return DirectoryKeyStore(homeDir)
+
+
+def migrate(homeDir: str) -> int:
+    """
+    Copy keys of the stack with home directory `homeDir` from directories of
+    certificates to a SQLite store, the directories are left as they are
+    :return: number of keys copied
+    """
+    source = DirectoryKeyStore(homeDir)
+    target = SqliteKeyStore(os.path.join(homeDir, SqliteKeyStore.fileName))
+    try:
+        count = 0
+        for kind in KeyStore.kinds:
+            entries = list(source.items(kind))
+            target.putMany(kind, entries)
+            count += len(entries)
+        return count
+    finally:
+        target.close()
+
+
+def exportKeys(store: KeyStore, out, withSecrets=False) -> int:
+    """
+    Write keys of `store` to the file `out` as JSON lines
+    """
+    count = 0
+    for kind in store.kinds:
+        if kind in store.secretKinds and not withSecrets:
+            continue
+        for name, public, secret in store.items(kind):
+            entry = {'kind': kind, 'name': name, 'public': public.decode()}
+            if secret is not None:
+                entry['secret'] = secret.decode()
+            out.write(json.dumps(entry) + '\n')
+            count += 1
+    return count
+
+
+def importKeys(store: KeyStore, lines) -> int:
+    """
+    Store keys read from JSON lines written by `exportKeys`
+    """
+    byKind = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        if entry['kind'] not in store.kinds:
+            raise ValueError('Unknown kind of key {}'.format(entry['kind']))
+        secret = entry.get('secret')
+        byKind.setdefault(entry['kind'], []).append(
+            (entry['name'], entry['public'].encode(),
+             secret.encode() if secret is not None else None))
+    for kind, entries in byKind.items():
+        store.putMany(kind, entries)
+    return sum(len(entries) for entries in byKind.values())
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m stp_zmq.keystore',
+        description='Manage key stores of stacks')
+    commands = parser.add_subparsers(dest='command')
+    cmd = commands.add_parser('migrate', help='copy keys from directories '
+                                              'of certificates to SQLite')
+    cmd.add_argument('home_dir', help='home directory of the stack')
+    cmd = commands.add_parser('export', help='write keys as JSON lines')
+    cmd.add_argument('home_dir', help='home directory of the stack')
+    cmd.add_argument('file', help="file to write, '-' for stdout")
+    cmd.add_argument('--with-secrets', action='store_true',
+                     help="also write the stack's secret keys")
+    cmd = commands.add_parser('import', help='read keys from JSON lines')
+    cmd.add_argument('home_dir', help='home directory of the stack')
+    cmd.add_argument('file', help="file to read, '-' for stdin")
+    args = parser.parse_args(args)
+
+    if args.command == 'migrate':
+        count = migrate(args.home_dir)
+        print('Copied {} keys to {}'.format(
+            count, os.path.join(args.home_dir, SqliteKeyStore.fileName)))
+    elif args.command in ('export', 'import'):
+        store = openKeyStore(args.home_dir)
+        try:
+            if args.command == 'export':
+                if args.file == '-':
+                    exportKeys(store, sys.stdout, args.with_secrets)
+                else:
+                    with open(args.file, 'w') as out:
+                        count = exportKeys(store, out, args.with_secrets)
+                    print('Exported {} keys'.format(count))
+            elif args.file == '-':
+                importKeys(store, sys.stdin)
+            else:
+                with open(args.file) as lines:
+                    print('Imported {} keys'.format(importKeys(store, lines)))
+        finally:
+            store.close()
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+from typing import Dict, List, Optional
+
+from stp_core.network.exceptions import RemoteNotFound, DuplicateRemotes
+
+
+class RemoteRegistry:
+    """
+    Remotes of a stack indexed by name, public key, HA and verification key
+    so any of them finds a remote without scanning all remotes.
+
+    Names and public keys are unique, a remote added with the name or public
+    key of another replaces it. Several remotes may share an HA or a
+    verification key.
+    """
+
+    def __init__(self):
+        self.byName = {}  # type: Dict[str, 'Remote']
+        self.byKey = {}  # type: Dict[bytes, 'Remote']
+        self._byHa = {}  # type: Dict[tuple, Dict[str, 'Remote']]
+        self._byVerKey = {}  # type: Dict[bytes, Dict[str, 'Remote']]
+
+    def __len__(self):
+        return len(self.byName)
+
+    def __contains__(self, name):
+        return name in self.byName
+
+    def add(self, remote):
+        for other in (self.byName.get(remote.name),
+                      self.byKey.get(remote.publicKey)):
+            if other is not None and other is not remote:
+                self.remove(other)
+        self.byName[remote.name] = remote
+        self.byKey[remote.publicKey] = remote
+        self._byHa.setdefault(self._haKey(remote.ha), {})[remote.name] = \
+            remote
+        if remote.verKey:
+            self._byVerKey.setdefault(remote.verKey, {})[remote.name] = remote
+
+    def remove(self, remote) -> bool:
+        if self.byName.get(remote.name) is not remote:
+            return False
+        del self.byName[remote.name]
+        if self.byKey.get(remote.publicKey) is remote:
+            del self.byKey[remote.publicKey]
+        self._discard(self._byHa, self._haKey(remote.ha), remote.name)
+        if remote.verKey:
+            self._discard(self._byVerKey, remote.verKey, remote.name)
+        return True
+
+    def clear(self) -> List['Remote']:
+        """
+        Remove all remotes, returning them
+        """
+        remotes = list(self.byName.values())
+        self.byName = {}
+        self.byKey = {}
+        self._byHa = {}
+        self._byVerKey = {}
+        return remotes
+
+    def getByName(self, name) -> 'Remote':
+        try:
+            return self.byName[name]
+        except KeyError:
+            raise RemoteNotFound(name) from None
+
+    def getByKey(self, publicKey) -> Optional['Remote']:
+        return self.byKey.get(publicKey)
+
+    def getByHa(self, ha) -> 'Remote':
+        return self._single(self._byHa, self._haKey(ha), ha)
+
+    def getByVerKey(self, verKey) -> 'Remote':
+        return self._single(self._byVerKey, verKey, verKey)
+
+    @staticmethod
+    def _haKey(ha):
+        # HAs are given as `HA`s or plain tuples, which are equal
+        return tuple(ha) if ha is not None else None
+
+    @staticmethod
+    def _single(index, key, what):
+        remotes = index.get(key)
+        if not remotes:
+            raise RemoteNotFound(what)
+        if len(remotes) > 1:
+            raise DuplicateRemotes(list(remotes.values()))
+        return next(iter(remotes.values()))
+
+    @staticmethod
+    def _discard(index, key, name):
+        remotes = index.get(key)
+        if remotes is not None:
+            remotes.pop(name, None)
+            if not remotes:
+                del index[key]
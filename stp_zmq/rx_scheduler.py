@@ -0,0 +1,150 @@
+import time
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+
+class WaitStats:
+    """
+    How long a source with messages pending waited to be served
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, wait: float):
+        self.count += 1
+        self.total += wait
+        self.last = wait
+        if wait > self.max:
+            self.max = wait
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __repr__(self):
+        return 'WaitStats(count={}, mean={:.6f}, max={:.6f}, last={:.6f})'.\
+            format(self.count, self.mean, self.max, self.last)
+
+
+class RxScheduler:
+    """
+    Decides in which order and how many messages each source of a stack, its
+    listener and its remotes, is received from on a service.
+
+    Every source gets a share of its quantum, the quota the stack would give
+    it, multiplied by its weight. The order of sources rotates on each
+    schedule so no source is always served first. With the `wrr` (weighted
+    round robin) policy the share is rounded to a quota of at least one
+    message. With the `drr` (deficit round robin) policy fractions of a share
+    are carried over to the following schedules and quota left unused by a
+    source which had no more messages is forfeited.
+
+    When `backlogLimit` is given, shares shrink as the number of received but
+    unprocessed messages approaches it so sockets are drained slower, down to
+    `minFactor` of the share.
+    """
+    policies = ('wrr', 'drr')
+
+    def __init__(self, policy: str = 'wrr', backlogLimit: int = None,
+                 minFactor: float = 0.01):
+        if policy not in self.policies:
+            raise ValueError('Unknown receive scheduling policy {}, expected '
+                             'one of {}'.format(policy, self.policies))
+        self.policy = policy
+        self.backlogLimit = backlogLimit
+        self.minFactor = minFactor
+        self._weights = {}  # type: Dict[Hashable, float]
+        self._deficits = {}  # type: Dict[Hashable, float]
+        # Sources known to have messages, by the time they became known so
+        self._pendingSince = {}  # type: Dict[Hashable, float]
+        self.waitStats = {}  # type: Dict[Hashable, WaitStats]
+        self._turn = 0
+
+    def setWeight(self, source: Hashable, weight: float):
+        if weight <= 0:
+            raise ValueError('weight of {} should be positive, got {}'.
+                             format(source, weight))
+        self._weights[source] = weight
+
+    def weight(self, source: Hashable) -> float:
+        return self._weights.get(source, 1)
+
+    def budgetFactor(self, backlog: int) -> float:
+        """
+        Part of their shares sources get with `backlog` messages waiting to
+        be processed
+        """
+        if not self.backlogLimit:
+            return 1
+        return max(self.minFactor, 1 - backlog / self.backlogLimit)
+
+    def schedule(self, sources: List[Tuple[Hashable, int]], backlog: int,
+                 ready: bool = False) -> List[Tuple[Hashable, int]]:
+        """
+        :param sources: sources to receive from with their quanta
+        :param backlog: number of messages received but not processed yet
+        :param ready: whether `sources` are known to have messages, like when
+        reported readable by a poller
+        :return: sources in the order to receive from them with the number of
+        messages to receive from each, sources whose quota is still below one
+        message are left out
+        """
+        if not sources:
+            return []
+        now = time.perf_counter()
+        factor = self.budgetFactor(backlog)
+        start = self._turn % len(sources)
+        self._turn += 1
+        drr = self.policy == 'drr'
+        plan = []
+        for source, quantum in sources[start:] + sources[:start]:
+            if ready:
+                self._pendingSince.setdefault(source, now)
+            share = quantum * self.weight(source) * factor
+            if drr:
+                share += self._deficits.get(source, 0)
+                self._deficits[source] = share
+                quota = int(share)
+                if quota < 1:
+                    continue
+            else:
+                quota = max(1, int(round(share)))
+            plan.append((source, quota))
+        return plan
+
+    def served(self, source: Hashable, received: int, quota: int):
+        """
+        Record that `received` messages were received from `source` which was
+        scheduled for `quota` of them
+        """
+        now = time.perf_counter()
+        since = self._pendingSince.pop(source, None)
+        if since is not None and received:
+            self._statsOf(source).record(now - since)
+        if received >= quota:
+            # Quota ran out so there are probably more messages
+            self._pendingSince[source] = now
+        if source in self._deficits:
+            if received < quota:
+                # No messages left, unused quota is not carried over
+                self._deficits[source] = 0
+            else:
+                self._deficits[source] -= received
+
+    def forget(self, sources: Iterable[Hashable]):
+        """
+        Drop state kept for sources which are gone, like removed remotes
+        """
+        for source in sources:
+            self._deficits.pop(source, None)
+            self._pendingSince.pop(source, None)
+            self.waitStats.pop(source, None)
+
+    def _statsOf(self, source) -> WaitStats:
+        stats = self.waitStats.get(source)
+        if stats is None:
+            stats = self.waitStats[source] = WaitStats()
+        return stats
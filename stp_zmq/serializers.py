@@ -0,0 +1,192 @@
+from typing import Mapping, Dict, List
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def jsonKey(key):
+    """
+    Key of a mapping as JSON makes it, a string for numbers, booleans and
+    None, others are kept as they are
+    """
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, int):
+        return str(key)
+    if isinstance(key, float):
+        return repr(key)
+    return key
+
+
+def _jsonKeyedDict(pairs):
+    return {jsonKey(key): value for key, value in pairs}
+
+
+class Serializer:
+    """
+    Converts messages to bytes sent over the wire and back.
+
+    Messages which are already strings or bytes are sent as they are, only
+    mappings are serialized.
+    """
+    name = None
+    # Byte prefixed to messages of a binary format so the receiver can tell
+    # which serializer to use without knowing the sender. None for formats
+    # producing JSON text, which every peer can read
+    tag = None
+    # Whether `deserialize` reads bytes and buffers without them being
+    # decoded to text first
+    readsBuffers = False
+
+    def serialize(self, msg) -> bytes:
+        if isinstance(msg, Mapping):
+            msg = self.dumps(msg)
+        if isinstance(msg, str):
+            msg = msg.encode()
+        assert isinstance(msg, bytes)
+        return msg
+
+    def deserialize(self, data):
+        """
+        :param data: the message without the tag, as str, bytes or a
+        memoryview
+        """
+        raise NotImplementedError
+
+    def dumps(self, msg: Mapping):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return self.name
+
+
+class JsonSerializer(Serializer):
+    name = 'json'
+
+    def dumps(self, msg):
+        return json.dumps(msg)
+
+    def deserialize(self, data):
+        if not isinstance(data, str):
+            # ujson does not validate UTF-8 in bytes it is given
+            data = str(data, 'utf-8')
+        return json.loads(data)
+
+
+class OrjsonSerializer(Serializer):
+    """
+    JSON produced and parsed by orjson. The wire format is plain JSON text so
+    peers using any JSON serializer can read it.
+    """
+    name = 'orjson'
+    readsBuffers = True
+
+    def dumps(self, msg):
+        # Keys which are not strings are made strings as by other JSON
+        # serializers
+        return orjson.dumps(msg, option=orjson.OPT_NON_STR_KEYS)
+
+    def deserialize(self, data):
+        # orjson validates UTF-8 and reads straight from bytes or a buffer
+        return orjson.loads(data)
+
+
+class MsgPackSerializer(Serializer):
+    """
+    msgpack messages, read as JSON would read them: keys of mappings which
+    are not strings are made strings
+    """
+    name = 'msgpack'
+    tag = 0x01
+    readsBuffers = True
+
+    def dumps(self, msg):
+        return bytes((self.tag,)) + msgpack.packb(msg, use_bin_type=True)
+
+    def deserialize(self, data):
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except ValueError:
+            # Only keys which are not strings fail the strict reading, the
+            # slower one converting keys is left for such messages
+            return msgpack.unpackb(data, raw=False, strict_map_key=False,
+                                   object_pairs_hook=_jsonKeyedDict)
+
+
+class SerializerRegistry:
+    """
+    Serializers available to stacks, looked up by name or by the tag of a
+    received message.
+    """
+
+    def __init__(self):
+        self._byName = {}  # type: Dict[str, Serializer]
+        self._byTag = {}  # type: Dict[int, Serializer]
+
+    def register(self, serializer: Serializer):
+        if serializer.tag is not None:
+            other = self._byTag.get(serializer.tag)
+            if other is not None and other.name != serializer.name:
+                raise ValueError('tag {} of serializer {} is already used by '
+                                 '{}'.format(serializer.tag, serializer,
+                                             other))
+            self._byTag[serializer.tag] = serializer
+        self._byName[serializer.name] = serializer
+
+    def get(self, name: str) -> Serializer:
+        try:
+            return self._byName[name]
+        except KeyError:
+            raise ValueError('Unknown serializer {}, available ones are {}'.
+                             format(name, self.names)) from None
+
+    def __contains__(self, name):
+        return name in self._byName
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._byName)
+
+    def isTagged(self, data) -> bool:
+        """
+        Whether `data` is a message of a binary format
+        """
+        return not isinstance(data, str) and len(data) > 0 and \
+            data[0] in self._byTag
+
+    def deserialize(self, data, text: Serializer):
+        """
+        Deserialize a received message with the serializer its tag names.
+
+        :param data: the message as str, bytes or a memoryview
+        :param text: serializer for messages without a tag, which are JSON
+        """
+        if self.isTagged(data):
+            return self._byTag[data[0]].deserialize(data[1:])
+        return text.deserialize(data)
+
+
+serializers = SerializerRegistry()
+serializers.register(JsonSerializer())
+if orjson is not None:
+    serializers.register(OrjsonSerializer())
+if msgpack is not None:
+    serializers.register(MsgPackSerializer())
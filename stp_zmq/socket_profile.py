@@ -0,0 +1,60 @@
+from typing import Dict, Mapping, Optional
+
+import zmq
+
+
+class SocketProfile:
+    """
+    Options set on the sockets of a stack, by name of the zmq option like
+    `SNDHWM`, options with a None value are left at libzmq's defaults.
+
+    Some options only make sense for one kind of socket, those of the
+    listener like `ROUTER_MANDATORY` are not set on sockets of remotes and
+    those of connecting sockets like `IMMEDIATE` are not set on the listener.
+    """
+    LISTENER = 'listener'
+    REMOTE = 'remote'
+
+    listenerOnly = {'ROUTER_MANDATORY', 'ROUTER_HANDOVER'}
+    remoteOnly = {'IMMEDIATE', 'RECONNECT_IVL', 'RECONNECT_IVL_MAX',
+                  'CONNECT_TIMEOUT'}
+
+    def __init__(self, options: Mapping[str, Optional[int]] = None):
+        self.options = {}  # type: Dict[str, int]
+        for name, value in (options or {}).items():
+            name = name.upper()
+            if not isinstance(getattr(zmq, name, None), int):
+                raise ValueError('Unknown zmq socket option {}'.format(name))
+            if value is not None:
+                self.options[name] = value
+
+    def __repr__(self):
+        return 'SocketProfile({})'.format(self.options)
+
+    def __eq__(self, other):
+        return isinstance(other, SocketProfile) and \
+            self.options == other.options
+
+    def merged(self, overrides: Mapping[str, Optional[int]]) -> \
+            'SocketProfile':
+        """
+        Profile with `overrides` taking precedence over options of this one,
+        None in `overrides` resets an option to libzmq's default
+        """
+        options = dict(self.options)
+        options.update(overrides)
+        return SocketProfile(options)
+
+    def optionsFor(self, kind: str) -> Dict[str, int]:
+        skipped = self.remoteOnly if kind == self.LISTENER \
+            else self.listenerOnly
+        return {name: value for name, value in self.options.items()
+                if name not in skipped}
+
+    def apply(self, sock: zmq.Socket, kind: str):
+        """
+        Set the options on `sock`, before it is bound or connected since
+        most options only apply to connections made after they are set
+        """
+        for name, value in self.optionsFor(kind).items():
+            sock.setsockopt(getattr(zmq, name), value)
@@ -5,6 +5,7 @@ import zmq.asyncio
 
 from stp_core.common.config.util import getConfig
 from stp_core.common.temp_file_util import SafeTemporaryDirectory
+from stp_core.loop.event_loops import newEventLoop
 from stp_core.loop.looper import Looper
 
 from stp_core.network.port_dispenser import genHa
@@ -21,8 +22,17 @@ def registry():
 
 
 @pytest.fixture()
-def loop():
-    loop = zmq.asyncio.ZMQEventLoop()
+def loop(request):
+    """
+    Event loop of the backend of the config, or of the one a test is
+    parametrized with indirectly
+    """
+    backend = getattr(request, 'param', None) or \
+        getConfig().LOOPER_LOOP_BACKEND
+    if backend == 'asyncio':
+        loop = zmq.asyncio.ZMQEventLoop()
+    else:
+        loop = newEventLoop(backend)
     loop.set_debug(True)
     return loop
 
@@ -51,14 +51,14 @@ def add_counters_to_ping_pong(stack):
     stack.handlePingPong = types.MethodType(recv_ping_pong_counter, stack)
 
 
-def create_and_prep_stacks(names, basedir, looper, conf):
+def create_and_prep_stacks(names, basedir, looper, conf, restricted=True):
     genKeys(basedir, names)
     printers = [Printer(n) for n in names]
     # adict is used below to copy the config module since one stack might
     # have different config from others
     stacks = [ZStack(n, ha=genHa(), basedirpath=basedir,
                      msgHandler=printers[i].print,
-                     restricted=True, config=adict(**conf.__dict__))
+                     restricted=restricted, config=adict(**conf.__dict__))
               for i, n in enumerate(names)]
     prepStacks(looper, *stacks, connect=True, useKeys=True)
     return stacks, printers
@@ -0,0 +1,24 @@
+from stp_zmq.test.helper import create_and_prep_stacks
+
+
+def test_batch_handler_gets_messages_of_a_service(tdir, looper, tconf):
+    """
+    A stack with a batch handler passes it all messages processed in a
+    service at once instead of passing them to its message handler
+    """
+    names = ['Alpha', 'Beta']
+    (alpha, beta), (alphaP, _) = create_and_prep_stacks(names, tdir, looper,
+                                                        tconf)
+    batches = []
+    alpha.batchHandler = batches.append
+    motor = next(p for p in looper.prodables if p.stack is alpha)
+    looper.removeProdable(motor)
+    for i in range(10):
+        beta.send({'greetings': i}, alpha.name)
+    looper.runFor(1)
+
+    looper.run(alpha.service())
+    assert len(batches) == 1
+    assert batches[0] == [({'greetings': i}, beta.name) for i in range(10)]
+    assert not alphaP.printeds
+    motor.stop()
@@ -0,0 +1,94 @@
+import pytest
+
+from stp_core.loop.eventually import eventually
+from stp_zmq.batching import packBatch, unpackBatch, isBatch
+from stp_zmq.test.helper import create_and_prep_stacks, \
+    check_stacks_communicating
+
+
+def test_pack_and_unpack_batch():
+    msgs = [b'{"a": 1}', b'', b'\x01\x81\xa1b\x02']
+    batch = packBatch(msgs)
+    assert isBatch(batch)
+    assert [bytes(m) for m in unpackBatch(batch)] == msgs
+    with pytest.raises(ValueError):
+        unpackBatch(batch[:-1])
+
+
+@pytest.fixture(params=[False, True], ids=['copy', 'zero_copy'])
+def batching_conf(tconf, monkeypatch, request):
+    monkeypatch.setattr(tconf, 'ZMQ_BATCH_OUTBOUND', True)
+    monkeypatch.setattr(tconf, 'ZMQ_ZERO_COPY_RECEIVE', request.param)
+    return tconf
+
+
+def test_messages_sent_in_batches(tdir, looper, batching_conf):
+    """
+    Messages sent by a stack batching them are queued till the stack is
+    serviced and are received one by one and in order
+    """
+    names = ['Alpha', 'Beta', 'Gamma']
+    stacks, printers = create_and_prep_stacks(names, tdir, looper,
+                                              batching_conf)
+    check_stacks_communicating(looper, stacks, printers)
+
+    alpha, beta, _ = stacks
+    betaP = printers[1]
+    betaP.reset()
+    sent = []
+    alpha_send = alpha.remotes[beta.name].socket.send
+
+    def count_sends(*args, **kwargs):
+        sent.append(args[0])
+        return alpha_send(*args, **kwargs)
+
+    alpha.remotes[beta.name].socket.send = count_sends
+    msgs = [{'greetings': i} for i in range(50)]
+    for msg in msgs:
+        assert alpha.transmit(msg, beta.name) is None
+
+    def chk():
+        assert [m for m, _ in betaP.printeds] == msgs
+
+    looper.run(eventually(chk, retryWait=0.1, timeout=5))
+    assert len(sent) == 1
+
+
+def test_no_batches_to_peers_not_advertising_them(tdir, looper, tconf,
+                                                  monkeypatch):
+    monkeypatch.setattr(tconf, 'ZMQ_BATCH_OUTBOUND', True)
+    monkeypatch.setattr(tconf, 'ZMQ_NEGOTIATE_SERIALIZER', True)
+    names = ['Alpha', 'Beta']
+    (alpha, beta), printers = create_and_prep_stacks(names, tdir, looper,
+                                                     tconf)
+    assert alpha._batchesTo(alpha.remotes[beta.name])
+    beta.config.ZMQ_NEGOTIATE_SERIALIZER = False
+    alpha._peerSerializers.clear()
+    assert not alpha._batchesTo(alpha.remotes[beta.name])
+    assert alpha.transmit({'greetings': 'hi'}, beta.name) is True
+
+
+def test_nested_batches_dropped(tdir, looper, tconf):
+    """
+    Batches are unpacked one level only, even when not batching, so a peer
+    nesting them deeply cannot exhaust the stack's recursion
+    """
+    names = ['Alpha', 'Beta']
+    stacks, printers = create_and_prep_stacks(names, tdir, looper, tconf)
+    alpha, beta = stacks
+    betaP = printers[1]
+    nested = alpha.serializer.serialize({'greetings': 'nested'})
+    for _ in range(3000):
+        nested = packBatch([nested])
+    batch = packBatch([alpha.serializer.serialize({'greetings': 'before'}),
+                       nested,
+                       alpha.serializer.serialize({'greetings': 'after'})])
+    betaP.reset()
+    alpha.remotes[beta.name].socket.send(batch)
+
+    def chk():
+        assert [m for m, _ in betaP.printeds] == \
+            [{'greetings': 'before'}, {'greetings': 'after'}]
+
+    looper.run(eventually(chk, retryWait=0.1, timeout=5))
+    check_stacks_communicating(looper, stacks, printers)
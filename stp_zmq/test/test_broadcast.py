@@ -0,0 +1,27 @@
+from stp_core.loop.eventually import eventually
+from stp_core.test.helper import chkPrinted
+from stp_zmq.test.helper import create_and_prep_stacks
+
+
+def test_broadcast(tdir, looper, tconf):
+    """
+    A broadcast reaches every remote not excluded, large messages included,
+    and reports for each remote whether it was sent
+    """
+    names = ['Alpha', 'Beta', 'Gamma', 'Delta']
+    (alpha, beta, gamma, delta), (_, betaP, gammaP, deltaP) = \
+        create_and_prep_stacks(names, tdir, looper, tconf)
+
+    msg = {'greetings': 'hi'}
+    assert alpha.broadcast(msg, exclude={delta.name}) == {beta.name: True,
+                                                          gamma.name: True}
+    for printer in (betaP, gammaP):
+        looper.run(eventually(chkPrinted, printer, msg))
+    looper.runFor(0.5)
+    assert (msg, alpha.name) not in deltaP.printeds
+
+    # Big enough to be sent from a single shared frame
+    large = {'greetings': 'x' * 100000}
+    assert alpha.send(large)
+    for printer in (betaP, gammaP, deltaP):
+        looper.run(eventually(chkPrinted, printer, large))
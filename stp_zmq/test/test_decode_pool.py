@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from stp_core.crypto.nacl_wrappers import Signer
+from stp_core.loop.eventually import eventually
+from stp_zmq.batching import packBatch
+from stp_zmq.decode_pool import DecodePool, decodeBatch, DECODED, CONTROL, \
+    FAILED
+from stp_zmq.test.helper import create_and_prep_stacks, \
+    check_stacks_communicating
+
+
+def test_messages_decoded_in_batches():
+    items = [('{"a": 1}', b'x'), (b'{"b": 2}', b'y'), ('pi', b'x'),
+             (memoryview(b'{"c": [3]}'), b'y'), (b'{"a"', b'x'),
+             (b'\xff\xfe', b'y')]
+    results = decodeBatch(items, 'json', {'pi', 'po'}, 64)
+    assert results[:4] == [(DECODED, {'a': 1}, b'x'), (DECODED, {'b': 2}, b'y'),
+                           (CONTROL, 'pi', b'x'),
+                           (DECODED, {'c': [3]}, b'y')]
+    assert [(outcome, ident) for outcome, _, ident in results[4:]] == \
+        [(FAILED, b'x'), (FAILED, b'y')]
+
+
+def test_signed_messages_verified_while_decoded():
+    signer = Signer()
+    verKeys = {b'x': signer.verraw, b'y': None}
+
+    def signed(msg, by=signer):
+        return msg + by.signature(msg)
+
+    items = [(signed(b'{"a": 1}'), b'x'),
+             (memoryview(signed(packBatch([b'{"b": 2}', b'pi']))), b'x'),
+             (signed(b'{"c": 3}', Signer()), b'x'),
+             (b'{"d": 4}', b'x'),
+             (signed(b'{"e": 5}', Signer()), b'y')]
+    results = decodeBatch(items, 'json', {'pi', 'po'}, 64, verKeys=verKeys)
+    assert results == [(DECODED, {'a': 1}, b'x'), (DECODED, {'b': 2}, b'x'),
+                       (CONTROL, 'pi', b'x'), results[3], results[4],
+                       (DECODED, {'e': 5}, b'y')]
+    assert [(outcome, ident) for outcome, _, ident in results[3:5]] == \
+        [(FAILED, b'x'), (FAILED, b'x')]
+
+
+def test_results_taken_in_submitted_order():
+    pool = DecodePool(DecodePool.THREAD, workers=4, batchSize=3, maxPending=20)
+    pool.start()
+    try:
+        items = [('{{"i": {}}}'.format(i), b'x') for i in range(10)]
+        pool.submit(items, 'json', set(), 64)
+        assert pool.pending == 10
+        assert pool.admits == 10
+        taken = []
+        for _ in range(100):
+            taken.extend(pool.take(4))
+            if len(taken) == 10:
+                break
+            time.sleep(0.05)
+        assert [msg['i'] for _, msg, _ in taken] == list(range(10))
+        assert pool.pending == 0
+    finally:
+        pool.stop()
+    with pytest.raises(ValueError):
+        DecodePool('fiber')
+
+
+@pytest.mark.parametrize('signed', [False, True])
+@pytest.mark.parametrize('kind', [DecodePool.THREAD, DecodePool.PROCESS])
+def test_stacks_decode_through_pool(tdir, looper, tconf, monkeypatch, kind,
+                                    signed):
+    """
+    Stacks decoding, and verifying when signed, messages on a pool of
+    workers process pings and messages, and messages of each sender in the
+    order they were sent
+    """
+    monkeypatch.setattr(tconf, 'ZMQ_SIGN_MESSAGES', signed)
+    monkeypatch.setattr(tconf, 'ZMQ_BATCH_OUTBOUND', signed)
+    monkeypatch.setattr(tconf, 'ZMQ_DECODE_POOL', kind)
+    monkeypatch.setattr(tconf, 'ZMQ_DECODE_WORKERS', 2)
+    monkeypatch.setattr(tconf, 'ZMQ_DECODE_BATCH_SIZE', 7)
+    names = ['Alpha', 'Beta', 'Gamma']
+    stacks, printers = create_and_prep_stacks(names, tdir, looper, tconf)
+    check_stacks_communicating(looper, stacks, printers)
+    alpha = stacks[0]
+    alphaP = printers[0]
+    alphaP.reset()
+
+    for stack in stacks[1:]:
+        for i in range(50):
+            stack.send({'i': i, 'payload': 'x' * 1000}, alpha.name)
+
+    def chk():
+        for stack in stacks[1:]:
+            assert [m['i'] for m, frm in alphaP.printeds
+                    if frm == stack.name] == list(range(50))
+
+    looper.run(eventually(chk, retryWait=0.1, timeout=10))
+    assert alpha.decodePool.pending == 0
+
+
+def test_process_exits_after_pools_stopped():
+    """
+    Stopped pools leave no workers keeping the process from exiting, which
+    runs the other tests of this module
+    """
+    result = subprocess.run(
+        [sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider',
+         __file__, '-k', 'not test_process_exits_after_pools_stopped'],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=300)
+    assert result.returncode == 0, result.stdout.decode()
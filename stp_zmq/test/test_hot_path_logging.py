@@ -0,0 +1,89 @@
+import logging
+
+from stp_core.common.log import HotPathLogger, LazyMessage, \
+    reachedPowerOfTen
+from stp_core.loop.eventually import eventually
+from stp_core.test.helper import chkPrinted
+from stp_zmq.test.helper import create_and_prep_stacks
+
+
+class Payload:
+    formatted = 0
+
+    def __str__(self):
+        Payload.formatted += 1
+        return 'payload ' + 'x' * 1000
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_hot_path_logger_formats_lazily(tconf):
+    base = logging.getLogger('test_hot_path_logger')
+    handler = Records()
+    base.addHandler(handler)
+    try:
+        hot = HotPathLogger(base, maxLen=20, sampleEvery=3, config=tconf)
+
+        base.setLevel(logging.INFO)
+        hot.debug('sending {}', Payload())
+        assert Payload.formatted == 0
+        assert not handler.records
+
+        base.setLevel(logging.DEBUG)
+        for _ in range(7):
+            hot.debug('sending {}', Payload())
+        # Messages 1, 4 and 7
+        assert len(handler.records) == 3
+        record = handler.records[0]
+        assert record.funcName == 'test_hot_path_logger_formats_lazily'
+        assert record.filename == 'test_hot_path_logging.py'
+        # Formatted when emitted only, then kept
+        assert record.getMessage() == 'sending ' + LazyMessage.truncate(
+            Payload(), 20)
+        assert record.getMessage().endswith('...(988 more chars)')
+    finally:
+        base.removeHandler(handler)
+
+
+def test_reached_power_of_ten():
+    assert [c for c in range(1200) if reachedPowerOfTen(c)] == \
+        [1, 10, 100, 1000]
+    assert reachedPowerOfTen(12, previous=8)
+    assert not reachedPowerOfTen(99, previous=11)
+    assert not reachedPowerOfTen(0, previous=0)
+
+
+def test_no_payload_formatted_when_not_logged(tdir, looper, tconf,
+                                             monkeypatch):
+    """
+    Messages sent and received by a stack are not formatted for logging
+    unless DEBUG is enabled
+    """
+    formatted = []
+    monkeypatch.setattr(LazyMessage, '__str__',
+                        lambda self: formatted.append(self.fmt) or '')
+    names = ['Alpha', 'Beta']
+    (alpha, beta), (_, betaP) = create_and_prep_stacks(names, tdir, looper,
+                                                       tconf)
+    root = logging.getLogger()
+    level = root.level
+    root.setLevel(logging.INFO)
+    formatted.clear()
+    try:
+        for i in range(10):
+            alpha.send({'greetings': 'hi', 'i': i}, beta.name)
+        looper.run(eventually(chkPrinted, betaP, {'greetings': 'hi', 'i': 9}))
+        assert not formatted
+
+        root.setLevel(logging.DEBUG)
+        alpha.send({'greetings': 'hi', 'i': 10}, beta.name)
+        assert '{} transmitting message {} to {}' in formatted
+    finally:
+        root.setLevel(level)
@@ -0,0 +1,69 @@
+import os
+
+import zmq.auth
+
+from stp_zmq.key_cache import KeyCache, keyCache
+from stp_zmq.test.helper import genKeys
+from stp_zmq.util import createCertsFromKeys
+from stp_zmq.zstack import ZStack
+
+
+def test_certificates_read_once(tdir, monkeypatch):
+    cache = KeyCache(checkInterval=None)
+    reads = []
+    load_certificate = zmq.auth.load_certificate
+
+    def load(path):
+        reads.append(path)
+        return load_certificate(path)
+
+    monkeypatch.setattr(zmq.auth, 'load_certificate', load)
+    public, secret = zmq.auth.create_certificates(tdir, 'Alpha')
+    assert cache.load(secret) == cache.load(secret) == load_certificate(secret)
+    assert cache.load(public)[1] is None
+    assert len(reads) == 2
+
+    cache.invalidate(tdir)
+    assert not cache
+    cache.load(secret)
+    assert len(reads) == 3
+
+
+def test_changed_certificates_reloaded(tdir):
+    cache = KeyCache(checkInterval=0)
+    _, secret = zmq.auth.create_certificates(tdir, 'Alpha')
+    keys = cache.load(secret)
+    os.remove(secret)
+    _, secret = zmq.auth.create_certificates(tdir, 'Alpha')
+    assert cache.load(secret) != keys
+    assert cache.load(secret) == zmq.auth.load_certificate(secret)
+
+
+def test_stack_keys_served_from_cache(tdir, tconf, monkeypatch):
+    """
+    Keys of a stack are read from disk once, and again once they are
+    written
+    """
+    names = ['Alpha', 'Beta']
+    genKeys(tdir, names)
+    alpha = ZStack(names[0], ha=None, basedirpath=tdir, msgHandler=None,
+                   config=tconf)
+    alpha.selfEncKeys, alpha.publicKey, alpha.verKey, alpha.sigKey
+    other = zmq.auth.create_certificates(tdir, 'Other')[0]
+    otherKey = zmq.auth.load_certificate(other)[0]
+
+    reads = []
+    load_certificate = zmq.auth.load_certificate
+    monkeypatch.setattr(keyCache, 'checkInterval', None)
+    monkeypatch.setattr(zmq.auth, 'load_certificate',
+                        lambda path: reads.append(path) or
+                        load_certificate(path))
+    for _ in range(10):
+        alpha.selfEncKeys, alpha.selfSigKeys, alpha.publicKey, \
+            alpha.verKey, alpha.sigKey, alpha.priKey, alpha.getAllVerKeys()
+    assert not reads
+
+    verKey = alpha.getVerKey('Beta')
+    createCertsFromKeys(alpha.verifKeyDir, 'Beta', otherKey)
+    assert alpha.getVerKey('Beta') == otherKey != verKey
+    assert len(reads) == 1
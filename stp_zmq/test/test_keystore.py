@@ -0,0 +1,115 @@
+import os
+import shutil
+import threading
+
+import pytest
+import zmq.auth
+
+from stp_core.network.port_dispenser import genHa
+from stp_core.test.helper import Printer, prepStacks
+from stp_zmq.keystore import KeyStore, DirectoryKeyStore, SqliteKeyStore, \
+    main
+from stp_zmq.test.helper import check_stacks_communicating, genKeys
+from stp_zmq.zstack import ZStack
+
+
+@pytest.fixture(params=['directory', 'sqlite'])
+def store(request, tdir):
+    if request.param == 'directory':
+        store = DirectoryKeyStore(tdir)
+    else:
+        store = SqliteKeyStore(os.path.join(tdir, SqliteKeyStore.fileName))
+    yield store
+    store.close()
+
+
+def test_keys_stored_by_kind_and_name(tdir, store):
+    public, secret = zmq.auth.load_certificate(
+        zmq.auth.create_certificates(tdir, 'Alpha')[1])
+    store.put(KeyStore.SECRET, 'Alpha', public, secret)
+    store.putMany(KeyStore.PUBLIC, [('Alpha', public, None),
+                                    ('Beta', b'x' * 40, None)])
+    assert store.get(KeyStore.SECRET, 'Alpha') == (public, secret)
+    assert store.get(KeyStore.PUBLIC, 'Alpha') == (public, None)
+    assert store.names(KeyStore.PUBLIC) == ['Alpha', 'Beta']
+    assert store.hasPublicKey(KeyStore.PUBLIC, b'x' * 40)
+    assert store.callback('*', public)
+
+    store.remove(KeyStore.PUBLIC, 'Alpha')
+    with pytest.raises(KeyError):
+        store.get(KeyStore.PUBLIC, 'Alpha')
+    assert not store.callback('*', public)
+    assert store.names(KeyStore.VERIF) == []
+
+
+def test_sqlite_store_shared_between_threads(tdir):
+    """
+    Keys are looked up on another thread, like the ZAP handler's, while they
+    are being written
+    """
+    store = SqliteKeyStore(os.path.join(tdir, SqliteKeyStore.fileName))
+    errors = []
+    done = threading.Event()
+
+    def lookUp():
+        try:
+            while not done.is_set():
+                store.hasPublicKey(KeyStore.PUBLIC, b'0' * 40)
+                store.names(KeyStore.PUBLIC)
+        except Exception as ex:
+            errors.append(ex)
+
+    thread = threading.Thread(target=lookUp)
+    thread.start()
+    try:
+        for i in range(200):
+            store.putMany(KeyStore.PUBLIC,
+                          [('N{}-{}'.format(i, j), str(j).encode() * 40, None)
+                           for j in range(5)])
+            store.remove(KeyStore.PUBLIC, 'N{}-0'.format(i))
+    finally:
+        done.set()
+        thread.join()
+        store.close()
+    assert not errors
+
+def test_stacks_use_migrated_keys(tdir, looper, tconf):
+    """
+    Stacks whose keys were migrated to SQLite communicate without the
+    directories of certificates, keys exported from one store can be
+    imported in another
+    """
+    names = ['Alpha', 'Beta', 'Gamma']
+    genKeys(tdir, names)
+    for name in names:
+        homeDir = ZStack.homeDirPath(tdir, name)
+        assert main(['migrate', homeDir]) == 0
+        for kind in KeyStore.kinds:
+            shutil.rmtree(os.path.join(homeDir, kind))
+        assert ZStack.areKeysSetup(name, tdir)
+
+    printers = [Printer(n) for n in names]
+    stacks = [ZStack(n, ha=genHa(), basedirpath=tdir, msgHandler=p.print,
+                     restricted=True, config=tconf)
+              for n, p in zip(names, printers)]
+    prepStacks(looper, *stacks, connect=True, useKeys=True)
+    assert all(isinstance(s.keyStore, SqliteKeyStore) for s in stacks)
+    check_stacks_communicating(looper, stacks, printers)
+
+    exported = os.path.join(tdir, 'keys.jsonl')
+    assert main(['export', stacks[0].homeDir, exported]) == 0
+    target = os.path.join(tdir, 'Other')
+    assert main(['import', target, exported]) == 0
+    other = DirectoryKeyStore(target)
+    assert other.names(KeyStore.VERIF) == names
+    assert other.names(KeyStore.SIG) == []
+    assert other.get(KeyStore.PUBLIC, 'Beta')[0] == stacks[1].publicKey
+
+
+def test_local_keys_created_in_sqlite(tdir, tconf, monkeypatch):
+    monkeypatch.setattr(tconf, 'ZMQ_KEY_STORE', 'sqlite')
+    ZStack.initLocalKeys('Alpha', tdir, b'A' * 32)
+    assert ZStack.areKeysSetup('Alpha', tdir)
+    homeDir = ZStack.homeDirPath(tdir, 'Alpha')
+    assert os.path.isfile(os.path.join(homeDir, SqliteKeyStore.fileName))
+    assert not os.listdir(os.path.join(homeDir, KeyStore.SIG))
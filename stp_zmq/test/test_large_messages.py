@@ -2,9 +2,10 @@ import json
 
 import zmq
 from stp_core.crypto.util import randomSeed
+from stp_core.loop.eventually import eventually
 from stp_core.network.port_dispenser import genHa
-from stp_core.test.helper import SMotor
-from stp_zmq.test.helper import genKeys
+from stp_core.test.helper import SMotor, chkPrinted
+from stp_zmq.test.helper import genKeys, create_and_prep_stacks
 from stp_zmq.zstack import SimpleZStack
 
 
@@ -63,3 +64,23 @@ def testSimpleZStacksMsgs(tdir, looper):
     alpha.send({'greetings': 'hi'}, beta.name)
     looper.runFor(1)
 
+
+def test_zero_copy_receive(tdir, looper, tconf, monkeypatch):
+    """
+    Stacks receiving messages without copying them deliver large messages
+    and drop the ones which are not utf-8
+    """
+    monkeypatch.setattr(tconf, 'ZMQ_ZERO_COPY_RECEIVE', True)
+    names = ['Alpha', 'Beta']
+    (alpha, beta), (alphaP, betaP) = create_and_prep_stacks(names, tdir,
+                                                            looper, tconf)
+    large = {'random': randomSeed(100000).decode()}
+    alpha.send(large, beta.name)
+    beta.send({'greetings': 'hi'}, alpha.name)
+    looper.run(eventually(chkPrinted, betaP, large))
+    looper.run(eventually(chkPrinted, alphaP, {'greetings': 'hi'}))
+
+    alpha.transmit(b'{"k2": "v2\x9c"}', beta.name, serialized=True)
+    alpha.transmit(b'{"k3": "v3"}', beta.name, serialized=True)
+    looper.run(eventually(chkPrinted, betaP, {"k3": "v3"}))
+    assert {"k2": "v2\x9c"} not in [m for m, _ in betaP.printeds]
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+import zmq
+
+from stp_core.loop.eventually import eventually
+from stp_core.network.exceptions import PortNotAvailable
+from stp_core.network.port_dispenser import genHa
+from stp_core.test.helper import Printer, prepStacks, chkPrinted
+from stp_core.types import HA
+from stp_zmq.test.helper import genKeys
+from stp_zmq.zstack import ZStack, io_threads
+
+
+def test_io_threads_sized_from_cores(tconf, monkeypatch):
+    monkeypatch.setattr(tconf, 'ZMQ_IO_THREADS', 'auto')
+    assert io_threads(tconf) == max(1, os.cpu_count() - 1)
+    monkeypatch.setattr(tconf, 'ZMQ_IO_THREADS', 3)
+    assert io_threads(tconf) == 3
+
+
+@pytest.mark.parametrize('shardPeers', [10000, 1])
+def test_peers_served_through_listener_shards(tdir, looper, tconf,
+                                              monkeypatch, shardPeers):
+    """
+    Clients connecting to any shard of a listener are received from and
+    replied to through the shard they connected to, also when the stack
+    remembers the shards of fewer clients
+    """
+    monkeypatch.setattr(tconf, 'ZMQ_LISTENER_SHARDS', 3)
+    monkeypatch.setattr(tconf, 'ZMQ_LISTENER_SHARD_PEERS', shardPeers)
+    # Shards are looked for relying on ROUTER_MANDATORY, set anyway
+    monkeypatch.setitem(tconf.ZMQ_SOCKET_PROFILE, 'ROUTER_MANDATORY', None)
+    names = ['Node', 'Client1', 'Client2', 'Client3']
+    genKeys(tdir, names)
+    printers = [Printer(n) for n in names]
+    node = ZStack(names[0], ha=genHa(), basedirpath=tdir,
+                  msgHandler=printers[0].print, restricted=True,
+                  onlyListener=True, config=tconf)
+    node.listenerShardPorts = [ha.port for ha in genHa(2)]
+    clients = [ZStack(n, ha=genHa(), basedirpath=tdir,
+                      msgHandler=p.print, restricted=True, config=tconf)
+               for n, p in zip(names[1:], printers[1:])]
+    prepStacks(looper, node, *clients, connect=False)
+    assert len(node.listeners) == 3
+
+    ports = [node.ha[1]] + node.listenerShardPorts
+    for client, port in zip(clients, ports):
+        # Each client connects to another shard
+        client.connect(name=node.name, ha=HA(node.ha[0], port),
+                       verKeyRaw=node.verKeyRaw,
+                       publicKeyRaw=node.publicKeyRaw)
+    looper.runFor(1)
+
+    for client in clients:
+        client.send({'from': client.name}, node.name)
+    for client in clients:
+        looper.run(eventually(chkPrinted, printers[0], {'from': client.name}))
+    if shardPeers >= len(clients):
+        assert set(node._shardOf.values()) == set(node.listeners)
+    else:
+        assert list(node._shardOf) == [clients[-1].publicKey]
+
+    for client, printer in zip(clients, printers[1:]):
+        assert node.transmitThroughListener({'to': client.name},
+                                            client.publicKey)
+        looper.run(eventually(chkPrinted, printer, {'to': client.name}))
+
+
+def test_listener_shard_ports(tdir, tconf, monkeypatch):
+    """
+    Shards are bound apart from the ports of stacks next to each other, or
+    to the ports given, and failing to bind one leaves the stack closed
+    """
+    monkeypatch.setattr(tconf, 'ZMQ_LISTENER_SHARDS', 3)
+    names = ['Node', 'NodeC']
+    genKeys(tdir, names)
+    ha = genHa()
+    node = ZStack(names[0], ha=ha, basedirpath=tdir, msgHandler=print,
+                  restricted=True, config=tconf)
+    step = tconf.ZMQ_LISTENER_SHARD_PORT_STEP
+    assert node.shardPorts == [ha.port + step, ha.port + 2 * step]
+
+    other = ZStack(names[1], ha=genHa(), basedirpath=tdir, msgHandler=print,
+                   restricted=True, config=tconf)
+    other.listenerShardPorts = [genHa().port]
+    with pytest.raises(ValueError):
+        other.shardPorts
+    other.listenerShardPorts = [genHa().port, other.ha[1]]
+    with pytest.raises(ValueError):
+        other.shardPorts
+
+    node.start()
+    try:
+        # A port taken by a shard of another stack
+        other.listenerShardPorts = [genHa().port, node.shardPorts[1]]
+        with pytest.raises(PortNotAvailable):
+            other.start()
+        assert not other.opened
+        other.stop()
+        other.listenerShardPorts = [ha.port for ha in genHa(2)]
+        other.start()
+        assert len(other.listeners) == 3
+        other.stop()
+    finally:
+        node.stop()
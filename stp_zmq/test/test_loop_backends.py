@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from stp_core.loop.eventually import eventually
+from stp_core.loop.event_loops import isOfBackend, loopBackends
+from stp_zmq.test.helper import create_and_prep_stacks
+
+backends = [
+    'asyncio',
+    pytest.param('uvloop', marks=pytest.mark.skipif(
+        'uvloop' not in loopBackends(), reason='uvloop is not installed')),
+]
+
+
+@pytest.mark.parametrize('loop', backends, indirect=True)
+def test_ping_pong_on_loop_backend(loop, tdir, looper, tconf):
+    """
+    Messages go back and forth between two stacks, one at a time and in
+    bursts, on each event loop backend
+    """
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper, tconf)
+    pongs = []
+    alpha.msgHandler = pongs.append
+    beta.msgHandler = lambda m: beta.send({'pong': m[0]['ping']}, m[1])
+
+    def chkPongs(count):
+        assert len(pongs) == count
+
+    for i in range(20):
+        alpha.send({'ping': i}, beta.name)
+        looper.run(eventually(chkPongs, i + 1, retryWait=0.01, timeout=5))
+
+    pongs.clear()
+    burst = 2000
+    for i in range(burst):
+        alpha.send({'ping': i}, beta.name)
+    looper.run(eventually(chkPongs, burst, retryWait=0.01, timeout=30))
+    assert [m['pong'] for m, _ in pongs] == list(range(burst))
+
+
+@pytest.mark.parametrize('loop', backends, indirect=True)
+def test_ping_pong_benchmark(loop, tdir, looper, tconf):
+    """
+    Benchmark of the latency of messages going back and forth between two
+    stacks, and of the throughput of messages sent in bursts, on each event
+    loop backend. Reported and not checked against bounds since it depends
+    on the machine
+    """
+    backend = 'uvloop' if isOfBackend(loop, 'uvloop') else 'asyncio'
+    loop.set_debug(False)
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper, tconf)
+    pongs = []
+    alpha.msgHandler = pongs.append
+    beta.msgHandler = lambda m: beta.send({'pong': m[0]['ping']}, m[1])
+
+    def chkPongs(count):
+        assert len(pongs) == count
+
+    rounds = 200
+    start = time.perf_counter()
+    for i in range(rounds):
+        alpha.send({'ping': i}, beta.name)
+        looper.run(eventually(chkPongs, i + 1, retryWait=0.0001, timeout=5))
+    latency = (time.perf_counter() - start) / rounds
+
+    pongs.clear()
+    burst = 2000
+    start = time.perf_counter()
+    for i in range(burst):
+        alpha.send({'ping': i}, beta.name)
+    looper.run(eventually(chkPongs, burst, retryWait=0.01, timeout=30))
+    throughput = burst / (time.perf_counter() - start)
+
+    print('On {} a ping-pong takes {:.0f} microseconds and {:.0f} ping-pongs '
+          'are done per second'.format(backend, latency * 1e6, throughput))
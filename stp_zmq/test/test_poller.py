@@ -0,0 +1,65 @@
+import pytest
+
+from stp_zmq.test.helper import create_and_prep_stacks, \
+    check_stacks_communicating
+
+
+@pytest.fixture()
+def poller_conf(tconf, monkeypatch):
+    monkeypatch.setattr(tconf, 'ZMQ_USE_POLLER', True)
+    return tconf
+
+
+def test_stacks_communicate_with_poller(tdir, looper, poller_conf):
+    """
+    Stacks servicing their sockets through a poller are able to send and
+    receive messages
+    """
+    names = ['Alpha', 'Beta', 'Gamma']
+    stacks, printers = create_and_prep_stacks(names, tdir, looper,
+                                              poller_conf)
+    for stack in stacks:
+        assert stack.poller is not None
+        # Listener and one socket for each remote are registered
+        assert len(stack.poller.sockets) == len(names)
+    check_stacks_communicating(looper, stacks, printers)
+
+
+def test_poller_follows_remote_sockets(tdir, looper, poller_conf):
+    """
+    Sockets of remotes are registered with the poller when connected and
+    unregistered when disconnected or removed
+    """
+    names = ['Alpha', 'Beta', 'Gamma']
+    (alpha, beta, gamma), _ = create_and_prep_stacks(names, tdir, looper,
+                                                     poller_conf)
+    remote = alpha.getRemote(beta.name)
+    old_socket = remote.socket
+    alpha.reconnectRemote(remote)
+    assert old_socket not in alpha._polledRemotes
+    assert alpha._polledRemotes[remote.socket] == remote.publicKey
+
+    socket = remote.socket
+    alpha.disconnectByName(beta.name)
+    assert socket not in alpha._polledRemotes
+
+    remote = alpha.getRemote(gamma.name)
+    socket = remote.socket
+    alpha.removeRemote(remote)
+    assert socket not in alpha._polledRemotes
+    assert len(alpha.poller.sockets) == 1
+
+
+def test_poller_survives_remote_closed_directly(tdir, looper, poller_conf):
+    """
+    Closing a remote's socket without going through the stack does not break
+    servicing of the stack
+    """
+    names = ['Alpha', 'Beta', 'Gamma']
+    (alpha, beta, gamma), (alphaP, betaP, gammaP) = \
+        create_and_prep_stacks(names, tdir, looper, poller_conf)
+
+    alpha.getRemote(beta.name).disconnect()
+    looper.runFor(1)
+    assert alpha.send({'greetings': 'hello'}, beta.name) is False
+    check_stacks_communicating(looper, (alpha, gamma), (alphaP, gammaP))
@@ -0,0 +1,32 @@
+from stp_zmq.test.helper import create_and_prep_stacks
+
+
+def test_processed_messages_counted_exactly(tdir, looper, tconf):
+    """
+    Processing received messages reports the ones passed to the handler,
+    counting apart pings, pongs and messages which could not be
+    deserialized, and so does a service
+    """
+    names = ['Alpha', 'Beta']
+    (alpha, beta), (alphaP, _) = create_and_prep_stacks(names, tdir, looper,
+                                                        tconf)
+    motor = next(p for p in looper.prodables if p.stack is alpha)
+    looper.removeProdable(motor)
+    alpha.rxMsgs.clear()
+    alphaP.reset()
+    ident = alpha.getRemote(beta.name).publicKey
+
+    for msg in (alpha.pingMessage, '{"greetings": 1}', '{"greet',
+                alpha.pongMessage, '{"greetings": 2}'):
+        alpha.rxMsgs.append((msg, ident))
+    assert alpha.processReceived(10) == 2
+    assert alpha.processedCounts == (2, 1, 2)
+    assert alpha.processedCounts.processed == len(alphaP.printeds)
+    assert alpha.processReceived(10) == 0
+    assert alpha.processedCounts == (0, 0, 0)
+
+    alpha.rxMsgs.append((alpha.pingMessage, ident))
+    assert looper.run(alpha.service()) == 0
+    alpha.rxMsgs.append(('{"greetings": 3}', ident))
+    assert looper.run(alpha.service()) == 1
+    motor.stop()
@@ -0,0 +1,126 @@
+import time
+
+from stp_core.loop.eventually import eventually
+from stp_core.loop.idle_policy import FixedIdlePolicy
+from stp_core.network.port_dispenser import genHa
+from stp_core.test.helper import prepStacks
+from stp_zmq.test.helper import create_and_prep_stacks, genKeys
+from stp_zmq.zstack import ZStack
+
+
+def test_stack_sockets_watched_on_loop(tdir, looper, tconf):
+    """
+    Listener and remote sockets of a stack added to a looper are watched on
+    the looper's event loop, and not anymore once the stack is removed
+    """
+    names = ['Alpha', 'Beta', 'Gamma']
+    (alpha, beta, gamma), _ = create_and_prep_stacks(names, tdir, looper,
+                                                     tconf)
+    watched = set(alpha._watchedFds)
+    assert alpha.listener in watched
+    assert {r.socket for r in alpha.remotes.values()} < watched
+
+    motor = next(p for p in looper.prodables if p.stack is alpha)
+    looper.removeProdable(motor)
+    motor.stop()
+    assert not alpha._watchedFds
+    looper.add(motor)
+    assert alpha.listener in alpha._watchedFds
+
+
+def test_wait_readable(tdir, looper, tconf):
+    """
+    Readiness of a stack which is not being serviced can be awaited
+    """
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper, tconf)
+    motor = next(p for p in looper.prodables if p.stack is alpha)
+    looper.removeProdable(motor)
+    alpha.attach_to_loop(looper.loop)
+
+    assert not looper.run(alpha.wait_readable(timeout=0.5))
+
+    async def send_and_wait():
+        looper.loop.call_later(0.1, beta.send, {'greetings': 'hi'},
+                               alpha.name)
+        return await alpha.wait_readable(timeout=5)
+
+    assert looper.run(send_and_wait())
+    motor.stop()
+
+
+def test_idle_stack_wakes_up_looper(tdir, looper, tconf):
+    """
+    Messages sent to idle stacks are serviced as soon as they arrive, the
+    stack waking the looper up instead of the looper waiting out its idle
+    timeout
+    """
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper, tconf)
+    received = []
+    alpha.msgHandler = received.append
+
+    def chkReceived(count):
+        assert len(received) == count
+
+    # Waiting far longer than the test when idle, messages are serviced
+    # only if the stack wakes the looper up
+    idlePolicy = looper.idlePolicy
+    looper.idlePolicy = FixedIdlePolicy(60)
+    try:
+        looper.runFor(0.1)
+        for i in range(5):
+            wokenUp = looper.idleStats.wokenUp
+            beta.send({'ping': i}, alpha.name)
+            looper.run(eventually(chkReceived, i + 1, retryWait=0.01,
+                                  timeout=5))
+            assert looper.idleStats.wokenUp > wokenUp
+    finally:
+        looper.idlePolicy = idlePolicy
+        looper.wakeup()
+
+
+def test_idle_stack_wakes_up_after_sending(tdir, looper, tconf):
+    """
+    Messages arriving on a socket of an idle stack right after the stack
+    sent on it are serviced as soon as they arrive, though sending can
+    consume the edge of the socket's descriptor
+    """
+    names = ['Node', 'Client']
+    genKeys(tdir, names)
+    node = ZStack(names[0], ha=genHa(), basedirpath=tdir,
+                  msgHandler=lambda m: None, restricted=True,
+                  onlyListener=True, config=tconf)
+    client = ZStack(names[1], ha=genHa(), basedirpath=tdir,
+                    msgHandler=lambda m: None, restricted=True,
+                    config=tconf)
+    prepStacks(looper, node, client, connect=False)
+    client.connect(name=node.name, ha=node.ha, verKeyRaw=node.verKeyRaw,
+                   publicKeyRaw=node.publicKeyRaw)
+    requests = []
+    node.msgHandler = requests.append
+    replies = []
+    client.msgHandler = replies.append
+
+    def chkReceived(received, count):
+        assert len(received) == count
+
+    client.send({'hello': 0}, node.name)
+    looper.run(eventually(chkReceived, requests, 1, retryWait=0.01,
+                          timeout=5))
+
+    idlePolicy = looper.idlePolicy
+    looper.idlePolicy = FixedIdlePolicy(60)
+    try:
+        looper.runFor(0.1)
+        for i in range(5):
+            # The reply reaches the client's socket before the client sends
+            # on it, sending drains the socket's descriptor
+            node.send({'reply': i}, client.publicKey)
+            time.sleep(0.05)
+            client.send({'request': i}, node.name)
+            looper.run(eventually(chkReceived, replies, i + 1,
+                                  retryWait=0.01, timeout=5))
+    finally:
+        looper.idlePolicy = idlePolicy
+        looper.wakeup()
@@ -0,0 +1,52 @@
+import pytest
+
+from stp_core.network.exceptions import RemoteNotFound, DuplicateRemotes
+from stp_core.types import HA
+from stp_zmq.remote_registry import RemoteRegistry
+from stp_zmq.test.helper import create_and_prep_stacks
+from stp_zmq.zstack import Remote
+
+
+def test_registry_indexes_remotes():
+    registry = RemoteRegistry()
+    alpha = Remote('Alpha', HA('127.0.0.1', 9701), b'va', b'pa')
+    beta = Remote('Beta', ('127.0.0.1', 9702), b'vb', b'pb')
+    registry.add(alpha)
+    registry.add(beta)
+    assert registry.getByName('Beta') is beta
+    assert registry.getByKey(b'pa') is alpha
+    assert registry.getByHa(('127.0.0.1', 9701)) is alpha
+    assert registry.getByHa(HA('127.0.0.1', 9702)) is beta
+    assert registry.getByVerKey(b'vb') is beta
+
+    # A remote with the same public key replaces the other one
+    gamma = Remote('Gamma', ('127.0.0.1', 9702), b'vg', b'pa')
+    registry.add(gamma)
+    assert 'Alpha' not in registry and len(registry) == 2
+    with pytest.raises(RemoteNotFound):
+        registry.getByHa(('127.0.0.1', 9701))
+    with pytest.raises(DuplicateRemotes):
+        registry.getByHa(('127.0.0.1', 9702))
+
+    assert registry.remove(beta)
+    assert not registry.remove(beta)
+    assert registry.getByHa(('127.0.0.1', 9702)) is gamma
+    assert registry.clear() == [gamma]
+    assert not registry.byKey
+
+
+def test_stack_finds_remotes_by_any_key(tdir, looper, tconf):
+    names = ['Alpha', 'Beta', 'Gamma']
+    (alpha, beta, gamma), _ = create_and_prep_stacks(names, tdir, looper,
+                                                     tconf)
+    remote = alpha.getRemote(beta.name)
+    assert alpha.getRemote(ha=beta.ha) is remote
+    assert alpha.findInRemotesByVerKey(remote.verKey) is remote
+    assert alpha.remotesByKeys[remote.publicKey] is remote
+    assert alpha.getHa(beta.name) == beta.ha
+
+    alpha.removeRemote(remote)
+    assert not alpha.hasRemote(beta.name)
+    assert remote.publicKey not in alpha.remotesByKeys
+    assert not alpha.isConnectedTo(ha=beta.ha)
+    assert alpha.hasRemote(gamma.name)
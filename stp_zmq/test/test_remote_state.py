@@ -0,0 +1,45 @@
+import zmq
+
+from stp_core.loop.eventually import eventually
+from stp_zmq.test.helper import create_and_prep_stacks
+
+
+def test_connection_state_follows_monitor_events(tdir, looper, tconf,
+                                                 monkeypatch):
+    """
+    Connection states of remotes are updated from monitor events consumed
+    once a service, reading them does not touch the monitor and the events
+    are kept for diagnostics
+    """
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper, tconf)
+    remote = alpha.getRemote(beta.name)
+
+    def events():
+        return [e for _, e in remote.eventHistory]
+
+    # Monitor events may come after the pong which connected the remote
+    def chkLinkUp():
+        assert remote.isConnected and remote.linkUp
+        assert zmq.EVENT_CONNECTED in events()
+
+    looper.run(eventually(chkLinkUp, retryWait=0.1, timeout=5))
+
+    def fail(*args, **kwargs):
+        raise AssertionError('monitor read')
+
+    with monkeypatch.context() as m:
+        m.setattr(remote, '_get_monitor_events', fail)
+        for _ in range(100):
+            assert remote.isConnected
+
+    motor = next(p for p in looper.prodables if p.stack is beta)
+    looper.removeProdable(motor)
+    motor.stop()
+
+    # The link is not checked as attempts to reconnect bring it up again
+    def chkDisconnected():
+        assert zmq.EVENT_DISCONNECTED in events()
+        assert not remote.isConnected
+
+    looper.run(eventually(chkDisconnected, retryWait=0.2, timeout=10))
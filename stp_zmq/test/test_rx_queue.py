@@ -0,0 +1,112 @@
+import pytest
+
+from stp_core.network.rx_queue import BoundedRxQueue, ShedPolicy
+from stp_zmq.test.helper import create_and_prep_stacks
+
+
+def fill(queue, senders):
+    for i, sender in enumerate(senders):
+        queue.append((i, sender))
+
+
+def test_drop_oldest():
+    queue = BoundedRxQueue(3, ShedPolicy.DROP_OLDEST)
+    fill(queue, [b'a', b'b', b'a', b'c', b'c'])
+    assert [m for m, _ in queue] == [2, 3, 4]
+    assert queue.shed == {b'a': 1, b'b': 1}
+
+
+def test_drop_by_share():
+    queue = BoundedRxQueue(4, 'drop_by_share')
+    fill(queue, [b'a', b'a', b'a', b'b'])
+    # The flooding sender loses its own new message
+    queue.append((4, b'a'))
+    # Others get in at the cost of the oldest message of the flooding sender
+    queue.append((5, b'c'))
+    assert [m for m, _ in queue] == [1, 2, 3, 5]
+    assert queue.shed == {b'a': 2}
+    queue.popleft()
+    queue.append((6, b'b'))
+    assert len(queue) == 4 and not queue.shed[b'b']
+
+
+def test_backpressure_admits_up_to_bound():
+    queue = BoundedRxQueue(3)
+    assert queue.admits(10) == 3
+    fill(queue, [b'a', b'b', b'c'])
+    assert queue.admits(10) == 0 and queue.isFull
+    assert BoundedRxQueue(None).admits(10) == 10
+
+
+def test_backpressure_overflow_waits_for_room():
+    queue = BoundedRxQueue(3)
+    fill(queue, [b'a', b'b', b'c', b'd', b'e'])
+    assert len(queue) == 3 and len(queue.overflow) == 2
+    assert queue.admits(10) == 0
+    assert [queue.popleft()[0] for _ in range(3)] == [0, 1, 2]
+    assert len(queue) == 2 and not queue.overflow
+    assert queue.admits(10) == 1
+    assert not queue.shed
+
+
+@pytest.fixture()
+def bounded_conf(tconf, monkeypatch):
+    monkeypatch.setattr(tconf, 'RX_QUEUE_SIZE', 10)
+    return tconf
+
+
+def test_stack_stops_receiving_when_full(tdir, looper, bounded_conf):
+    """
+    A stack whose queue of received messages is full leaves messages in its
+    sockets and receives them once the queue is processed
+    """
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper,
+                                              bounded_conf)
+    motor = next(p for p in looper.prodables if p.stack is alpha)
+    looper.removeProdable(motor)
+    received = []
+    alpha.msgHandler = received.append
+    for i in range(25):
+        beta.send({'greetings': i}, alpha.name)
+    looper.runFor(1)
+
+    looper.run(alpha._serviceStack(alpha.age))
+    looper.run(alpha._serviceStack(alpha.age))
+    assert len(alpha.rxMsgs) == 10
+    while len(received) < 25 and alpha.rxMsgs:
+        alpha.processReceived(len(alpha.rxMsgs))
+        looper.run(alpha._serviceStack(alpha.age))
+    assert [m['greetings'] for m, _ in received] == list(range(25))
+    assert not alpha.rxShedCounts
+    motor.stop()
+
+
+def test_batch_kept_to_bound(tdir, looper, bounded_conf, monkeypatch):
+    """
+    Messages of a batch not fitting in the queue of received messages wait
+    for room and the stack receives nothing more meanwhile
+    """
+    monkeypatch.setattr(bounded_conf, 'ZMQ_BATCH_OUTBOUND', True)
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper,
+                                              bounded_conf)
+    motor = next(p for p in looper.prodables if p.stack is alpha)
+    looper.removeProdable(motor)
+    received = []
+    alpha.msgHandler = received.append
+    for i in range(25):
+        beta.send({'greetings': i}, alpha.name)
+    beta.send({'greetings': 25}, alpha.name)
+    looper.runFor(1)
+
+    looper.run(alpha._serviceStack(alpha.age))
+    looper.run(alpha._serviceStack(alpha.age))
+    assert len(alpha.rxMsgs) == 10
+    while len(received) < 26 and alpha.rxMsgs:
+        alpha.processReceived(len(alpha.rxMsgs))
+        assert len(alpha.rxMsgs) <= 10
+        looper.run(alpha._serviceStack(alpha.age))
+    assert [m['greetings'] for m, _ in received] == list(range(26))
+    assert not alpha.rxShedCounts
+    motor.stop()
@@ -0,0 +1,96 @@
+import pytest
+
+from stp_core.loop.eventually import eventually
+from stp_zmq.rx_scheduler import RxScheduler
+from stp_zmq.test.helper import create_and_prep_stacks, \
+    check_stacks_communicating
+
+
+def test_sources_rotate_and_get_weighted_quotas():
+    scheduler = RxScheduler('wrr')
+    scheduler.setWeight(b'b', 3)
+    sources = [('listener', 10), (b'a', 5), (b'b', 5)]
+    first = scheduler.schedule(sources, 0)
+    second = scheduler.schedule(sources, 0)
+    assert first == [('listener', 10), (b'a', 5), (b'b', 15)]
+    assert second == [(b'a', 5), (b'b', 15), ('listener', 10)]
+    with pytest.raises(ValueError):
+        scheduler.setWeight(b'a', 0)
+
+
+def test_deficit_round_robin_carries_fractions():
+    scheduler = RxScheduler('drr')
+    scheduler.setWeight(b'a', 0.4)
+    sources = [(b'a', 1)]
+    quotas = []
+    for _ in range(5):
+        plan = scheduler.schedule(sources, 0)
+        for source, quota in plan:
+            # Source always has more messages than its quota
+            scheduler.served(source, quota, quota)
+        quotas.append(sum(q for _, q in plan))
+    assert quotas == [0, 0, 1, 0, 1]
+
+
+def test_budget_shrinks_with_backlog():
+    scheduler = RxScheduler('wrr', backlogLimit=100)
+    sources = [(b'a', 100)]
+    assert scheduler.schedule(sources, 0) == [(b'a', 100)]
+    assert scheduler.schedule(sources, 75) == [(b'a', 25)]
+    assert scheduler.schedule(sources, 1000) == [(b'a', 1)]
+
+
+def test_wait_stats_of_sources_left_with_messages():
+    scheduler = RxScheduler('wrr')
+    scheduler.schedule([(b'a', 2), (b'b', 2)], 0)
+    scheduler.served(b'a', 2, 2)
+    scheduler.served(b'b', 1, 2)
+    scheduler.schedule([(b'a', 2), (b'b', 2)], 0)
+    scheduler.served(b'a', 1, 2)
+    scheduler.served(b'b', 0, 2)
+    assert scheduler.waitStats[b'a'].count == 1
+    assert b'b' not in scheduler.waitStats
+
+
+@pytest.fixture(params=['wrr', 'drr'])
+def scheduled_conf(tconf, monkeypatch, request):
+    monkeypatch.setattr(tconf, 'ZMQ_RX_SCHEDULER', request.param)
+    return tconf
+
+
+def test_stacks_communicate_with_scheduler(tdir, looper, scheduled_conf):
+    names = ['Alpha', 'Beta', 'Gamma']
+    stacks, printers = create_and_prep_stacks(names, tdir, looper,
+                                              scheduled_conf)
+    check_stacks_communicating(looper, stacks, printers)
+
+
+def test_listener_weight_limits_received(tdir, looper, scheduled_conf):
+    """
+    A stack receives from its listener on each service as many messages as
+    its quota scaled by the listener's weight, and reports how long the
+    listener waited with messages left
+    """
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper,
+                                              scheduled_conf)
+    motor = next(p for p in looper.prodables if p.stack is alpha)
+    looper.removeProdable(motor)
+    alpha.rxMsgs.clear()
+    alpha.listenerQuota = 10
+    alpha.setPeerWeight(alpha.listenerSource, 2)
+    for i in range(50):
+        beta.send({'greetings': i}, alpha.name)
+
+    looper.runFor(1)
+
+    counts = []
+
+    def chk():
+        counts.append(alpha._receiveScheduled())
+        assert sum(counts) >= 50
+
+    looper.run(eventually(chk, retryWait=0.1, timeout=5))
+    assert max(counts) == 20
+    assert alpha.rxWaitStats[alpha.listenerSource].count >= 1
+    motor.stop()
@@ -0,0 +1,158 @@
+import pytest
+
+from stp_core.common.util import adict
+from stp_core.loop.eventually import eventually
+from stp_core.network.port_dispenser import genHa
+from stp_core.test.helper import Printer, prepStacks
+from stp_zmq.serializers import serializers
+from stp_zmq.test.helper import genKeys, check_stacks_communicating, \
+    add_counters_to_ping_pong
+from stp_zmq.zstack import ZStack
+
+msgpack = pytest.importorskip('msgpack')
+
+
+def create_stacks(names, tdir, looper, conf, **overrides):
+    """
+    Stacks whose configs differ by the values in `overrides`, given by
+    stack name
+    """
+    genKeys(tdir, names)
+    printers = [Printer(n) for n in names]
+    stacks = []
+    for name, printer in zip(names, printers):
+        config = adict(**conf.__dict__)
+        config.update(overrides.get(name, {}))
+        stacks.append(ZStack(name, ha=genHa(), basedirpath=tdir,
+                             msgHandler=printer.print, restricted=True,
+                             config=config))
+    prepStacks(looper, *stacks, connect=True, useKeys=True)
+    return stacks, printers
+
+
+def test_registry_round_trips():
+    msg = {'op': 'greetings', 'data': ['hi', 1, 2.5, None]}
+    json = serializers.get('json')
+    packer = serializers.get('msgpack')
+    for serializer in (json, packer):
+        data = serializer.serialize(msg)
+        assert serializers.deserialize(data, json) == msg
+        assert serializers.deserialize(memoryview(data), json) == msg
+    assert serializers.isTagged(packer.serialize(msg))
+    assert not serializers.isTagged(json.serialize(msg))
+
+    # Keys which are not strings are made strings by all serializers, as
+    # by JSON
+    msg = {'a': {1: 'x', 2.5: 'y', None: 'z'}, 'b': [{False: 'w'}]}
+    expected = {'a': {'1': 'x', '2.5': 'y', 'null': 'z'},
+                'b': [{'false': 'w'}]}
+    names = ['json', 'msgpack'] + \
+        (['orjson'] if 'orjson' in serializers else [])
+    for name in names:
+        data = serializers.get(name).serialize(msg)
+        assert serializers.deserialize(data, json) == expected
+    with pytest.raises(ValueError):
+        serializers.get('pickle')
+
+
+def test_stacks_negotiate_serializer(tdir, looper, tconf, monkeypatch):
+    """
+    Stacks advertising the serializers they can read send each other
+    messages in a binary format
+    """
+    monkeypatch.setattr(tconf, 'ZMQ_SERIALIZER', 'msgpack')
+    monkeypatch.setattr(tconf, 'ZMQ_NEGOTIATE_SERIALIZER', True)
+    names = ['Alpha', 'Beta', 'Gamma']
+    stacks, printers = create_stacks(names, tdir, looper, tconf)
+    for stack in stacks:
+        for remote in stack.remotes.values():
+            assert stack._serializerFor(remote.publicKey,
+                                        remote).name == 'msgpack'
+    check_stacks_communicating(looper, stacks, printers)
+
+    # Pings following each other before offers are answered, as when
+    # reconnecting, do not make the peer look as not negotiating
+    alpha, beta, _ = stacks
+    remote = alpha.getRemote(beta.name)
+    add_counters_to_ping_pong(alpha)
+    del alpha._peerSerializers[remote.publicKey]
+    for _ in range(alpha.maxUnansweredSerializerOffers):
+        alpha.sendPingPong(beta.name)
+
+    def chkAnswered():
+        assert alpha.recv_pong_count == alpha.maxUnansweredSerializerOffers
+        assert remote._unansweredSerializerOffers == 0
+
+    looper.run(eventually(chkAnswered, retryWait=0.1, timeout=5))
+    assert not remote.ignoresSerializerOffers
+    assert alpha._serializerFor(remote.publicKey, remote).name == 'msgpack'
+
+    # Serializers learnt are kept over pings, like heartbeats, which are
+    # not followed by offers anymore
+    for stack, peer in ((alpha, beta), (beta, alpha)):
+        stack.sendPingPong(peer.name)
+    looper.runFor(0.5)
+    assert remote._unansweredSerializerOffers == 0
+    for stack, peer in ((alpha, beta), (beta, alpha)):
+        peerRemote = stack.getRemote(peer.name)
+        assert stack._serializerFor(peerRemote.publicKey,
+                                    peerRemote).name == 'msgpack'
+
+
+def test_negotiating_stack_falls_back_to_json(tdir, looper, tconf):
+    """
+    A stack advertising serializers sends JSON to a peer which does not
+    """
+    names = ['Alpha', 'Beta']
+    overrides = {'Alpha': {'ZMQ_SERIALIZER': 'msgpack',
+                           'ZMQ_NEGOTIATE_SERIALIZER': True}}
+    (alpha, beta), printers = create_stacks(names, tdir, looper, tconf,
+                                            **overrides)
+    remote = alpha.getRemote(beta.name)
+    assert alpha._serializerFor(remote.publicKey, remote).name == 'json'
+    check_stacks_communicating(looper, (alpha, beta), printers)
+    checkPingsAnsweredWithoutOffers(looper, alpha, beta)
+
+    alpha.setRemoteSerializer(beta.name, 'msgpack')
+    assert alpha._serializerFor(remote.publicKey, remote).name == 'msgpack'
+    check_stacks_communicating(looper, (alpha, beta), printers)
+
+
+def checkPingsAnsweredWithoutOffers(looper, stack, peer):
+    """
+    Pings of `stack` are answered by `peer` right away while its offers of
+    serializers are not, so it stops offering them
+    """
+    add_counters_to_ping_pong(stack)
+    remote = stack.getRemote(peer.name)
+    for i in range(1, stack.maxUnansweredSerializerOffers + 2):
+        stack.sendPingPong(peer.name)
+
+        def chkPong():
+            assert stack.recv_pong_count == i
+
+        looper.run(eventually(chkPong, retryWait=0.1, timeout=5))
+    assert remote.ignoresSerializerOffers
+    assert stack._serializerFor(remote.publicKey, remote).name == 'json'
+
+
+def test_old_peer_answers_pings_of_negotiating_stack(tdir, looper, tconf):
+    """
+    A stack of an older version, which reads pings and pongs only when
+    they are plain, answers the pings of a negotiating stack
+    """
+    names = ['Alpha', 'Beta']
+    overrides = {'Alpha': {'ZMQ_SERIALIZER': 'msgpack',
+                           'ZMQ_NEGOTIATE_SERIALIZER': True}}
+    (alpha, beta), printers = create_stacks(names, tdir, looper, tconf,
+                                            **overrides)
+
+    def oldHandlePingPong(msg, frm, ident):
+        if msg == beta.pingMessage:
+            beta.sendPingPong(frm, is_ping=False)
+            return True
+        return msg == beta.pongMessage
+
+    beta.handlePingPong = oldHandlePingPong
+    checkPingsAnsweredWithoutOffers(looper, alpha, beta)
+    check_stacks_communicating(looper, (alpha, beta), printers)
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from stp_core.crypto.nacl_wrappers import Signer
+from stp_core.loop.eventually import eventually
+from stp_zmq.test.helper import create_and_prep_stacks, \
+    check_stacks_communicating
+
+
+@pytest.mark.parametrize('restricted', [True, False])
+def test_signed_messages_verified(tdir, looper, tconf, monkeypatch,
+                                  restricted):
+    """
+    Stacks signing messages communicate, messages not signed by the remote
+    they come from are dropped, also by stacks which are not restricted
+    """
+    monkeypatch.setattr(tconf, 'ZMQ_SIGN_MESSAGES', True)
+    monkeypatch.setattr(tconf, 'ZMQ_BATCH_OUTBOUND', True)
+    names = ['Alpha', 'Beta', 'Gamma']
+    stacks, printers = create_and_prep_stacks(names, tdir, looper, tconf,
+                                              restricted=restricted)
+    check_stacks_communicating(looper, stacks, printers)
+    alpha, beta, _ = stacks
+    assert alpha.isRestricted == restricted
+    alphaP = printers[0]
+    alphaP.reset()
+
+    socket = beta.remotes[alpha.name].socket
+    forged = beta.serializer.serialize({'forged': True})
+    socket.send(beta.signedMsg(forged, Signer()))
+    socket.send(forged)
+    beta.send({'greetings': 1}, alpha.name)
+    beta.send({'greetings': 2}, alpha.name)
+
+    def chk():
+        assert [m for m, _ in alphaP.printeds] == \
+            [{'greetings': 1}, {'greetings': 2}]
+
+    looper.run(eventually(chk, retryWait=0.1, timeout=5))
+    looper.runFor(0.5)
+    assert len(alphaP.printeds) == 2
+
+
+def test_signed_messages_verified_in_bulk(tdir, looper, tconf, monkeypatch):
+    """
+    Signed messages received in one service are verified together, those
+    with a bad signature are dropped
+    """
+    monkeypatch.setattr(tconf, 'ZMQ_SIGN_MESSAGES', True)
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper, tconf)
+    ident = beta.remotes[alpha.name].publicKey
+    msg = alpha.serializer.serialize({'op': 'REQUEST', 'payload': 'x' * 1000})
+    count = 2000
+    signed = [alpha.signedMsg(msg) for _ in range(count)]
+    signed[7] = signed[7][:-1] + bytes([signed[7][-1] ^ 1])
+
+    beta.rxMsgs.clear()
+    beta._unverified = [(m, ident) for m in signed]
+    assert beta._verifyReceived() == 1
+    assert len(beta.rxMsgs) == count - 1
+    beta.rxMsgs.clear()
+
+
+def test_signing_cost_per_message(tdir, looper, tconf, monkeypatch):
+    """
+    Benchmark of signing a message and verifying its signature, reported
+    and not checked against bounds since it depends on the machine
+    """
+    monkeypatch.setattr(tconf, 'ZMQ_SIGN_MESSAGES', True)
+    names = ['Alpha', 'Beta']
+    (alpha, beta), _ = create_and_prep_stacks(names, tdir, looper, tconf)
+    ident = beta.remotes[alpha.name].publicKey
+    msg = alpha.serializer.serialize({'op': 'REQUEST', 'payload': 'x' * 1000})
+    count = 2000
+
+    start = time.perf_counter()
+    signed = [alpha.signedMsg(msg) for _ in range(count)]
+    signing = (time.perf_counter() - start) / count
+
+    beta.rxMsgs.clear()
+    beta._unverified = [(m, ident) for m in signed]
+    start = time.perf_counter()
+    beta._verifyReceived()
+    verifying = (time.perf_counter() - start) / count
+    assert len(beta.rxMsgs) == count
+    beta.rxMsgs.clear()
+
+    print('Signing takes {:.1f} and verifying {:.1f} microseconds per '
+          'message'.format(signing * 1e6, verifying * 1e6))
@@ -0,0 +1,58 @@
+import pytest
+import zmq
+
+from stp_zmq.socket_profile import SocketProfile
+from stp_zmq.test.helper import create_and_prep_stacks, \
+    check_stacks_communicating
+
+
+def test_profile_options_by_kind_of_socket():
+    profile = SocketProfile({'sndhwm': 100, 'RCVHWM': None, 'IMMEDIATE': 1,
+                             'ROUTER_MANDATORY': 1})
+    assert profile.options == {'SNDHWM': 100, 'IMMEDIATE': 1,
+                               'ROUTER_MANDATORY': 1}
+    assert profile.optionsFor(SocketProfile.LISTENER) == \
+        {'SNDHWM': 100, 'ROUTER_MANDATORY': 1}
+    assert profile.optionsFor(SocketProfile.REMOTE) == \
+        {'SNDHWM': 100, 'IMMEDIATE': 1}
+    assert profile.merged({'SNDHWM': None, 'RCVBUF': 1 << 20}).options == \
+        {'RCVBUF': 1 << 20, 'IMMEDIATE': 1, 'ROUTER_MANDATORY': 1}
+    with pytest.raises(ValueError):
+        SocketProfile({'NO_SUCH_OPTION': 1})
+
+
+def test_profile_applied_to_sockets(tdir, looper, tconf, monkeypatch):
+    """
+    The socket profile of the config is applied to the listener and sockets
+    of remotes, options can be overridden for a remote
+    """
+    monkeypatch.setitem(tconf.ZMQ_SOCKET_PROFILE, 'SNDHWM', 5000)
+    monkeypatch.setitem(tconf.ZMQ_SOCKET_PROFILE, 'RCVBUF', 1 << 18)
+    names = ['Alpha', 'Beta', 'Gamma']
+    stacks, printers = create_and_prep_stacks(names, tdir, looper, tconf)
+    alpha = stacks[0]
+    assert alpha.listener.getsockopt(zmq.SNDHWM) == 5000
+    for remote in alpha.remotes.values():
+        assert remote.socket.getsockopt(zmq.SNDHWM) == 5000
+        assert remote.socket.getsockopt(zmq.RCVBUF) == 1 << 18
+
+    check_stacks_communicating(looper, stacks, printers)
+
+    alpha.setRemoteSocketOptions('Beta', SNDHWM=20000, immediate=1)
+    beta = alpha.remotes['Beta']
+    assert beta.socket.getsockopt(zmq.SNDHWM) == 5000
+    alpha.reconnectRemote(beta)
+    assert beta.socket.getsockopt(zmq.SNDHWM) == 20000
+    assert beta.socket.getsockopt(zmq.IMMEDIATE) == 1
+    assert alpha.remotes['Gamma'].socket.getsockopt(zmq.SNDHWM) == 5000
+
+    alpha.setRemoteSocketOptions('Beta', SNDHWM=None)
+    alpha.reconnectRemote(beta)
+    assert beta.socket.getsockopt(zmq.SNDHWM) == 5000
+    assert beta.socket.getsockopt(zmq.IMMEDIATE) == 1
+    with pytest.raises(ValueError):
+        alpha.setRemoteSocketOptions('Beta', NO_SUCH_OPTION=1)
+
+    assert 'ROUTER_MANDATORY' not in alpha.listenerProfile.options
+    monkeypatch.setattr(alpha.config, 'ZMQ_LISTENER_TX_QUEUE', True)
+    assert alpha.listenerProfile.options['ROUTER_MANDATORY'] == 1
@@ -0,0 +1,86 @@
+import time
+
+import zmq
+
+from stp_core.loop.eventually import eventually
+from stp_zmq.test.helper import create_and_prep_stacks, \
+    check_stacks_communicating
+from stp_zmq.tx_queue import TxQueues
+
+
+def test_queue_is_bounded_and_retried_in_order():
+    queues = TxQueues(maxSize=3, maxAge=None)
+    for i in range(5):
+        assert queues.push('Beta', i) == (i < 3)
+    assert queues.size('Beta') == 3
+    assert queues.dropped['Beta'] == {TxQueues.FULL: 2}
+
+    sent = []
+
+    def send(data):
+        if len(sent) == 2:
+            raise zmq.Again()
+        sent.append(data)
+
+    assert queues.retry('Beta', send) == 2
+    assert sent == [0, 1]
+    assert queues.retry('Beta', sent.append) == 1
+    assert sent == [0, 1, 2]
+    assert 'Beta' not in queues
+
+
+def test_old_and_orphaned_messages_are_dropped():
+    queues = TxQueues(maxSize=10, maxAge=0.1)
+    queues.push('Beta', b'old')
+    queues.push('Gamma', b'msg')
+    time.sleep(0.2)
+    queues.push('Beta', b'new')
+    sent = []
+    assert queues.retry('Beta', sent.append) == 1
+    assert sent == [b'new']
+    assert queues.discard('Gamma') == 1
+    assert queues.droppedCounts() == {'Beta': 1, 'Gamma': 1}
+    assert queues.dropped['Gamma'] == {TxQueues.GONE: 1}
+    assert not queues
+
+
+def test_messages_retried_when_socket_is_full(tdir, looper, tconf):
+    """
+    Messages which could not be sent since the socket of a remote was full
+    are sent in order once it takes messages again, and messages sent in
+    the meantime wait for them
+    """
+    names = ['Alpha', 'Beta']
+    stacks, printers = create_and_prep_stacks(names, tdir, looper, tconf)
+    check_stacks_communicating(looper, stacks, printers)
+    alpha, beta = stacks
+    betaP = printers[1]
+    betaP.reset()
+
+    socket = alpha.remotes[beta.name].socket
+    socket_send = socket.send
+    full = True
+
+    def send(*args, **kwargs):
+        if full:
+            raise zmq.Again()
+        return socket_send(*args, **kwargs)
+
+    socket.send = send
+    msgs = [{'greetings': i} for i in range(10)]
+    for msg in msgs[:5]:
+        assert alpha.send(msg, beta.name)
+    assert alpha._txQueues.size(beta.name) == 5
+    looper.runFor(0.5)
+    assert not betaP.printeds
+
+    full = False
+    for msg in msgs[5:]:
+        assert alpha.send(msg, beta.name)
+
+    def chk():
+        assert [m for m, _ in betaP.printeds] == msgs
+
+    looper.run(eventually(chk, retryWait=0.1, timeout=5))
+    assert beta.name not in alpha._txQueues
+    assert not alpha.txDropCounts
@@ -0,0 +1,156 @@
+import time
+from collections import deque, Counter
+from typing import Any, Callable, Dict, Hashable, List
+
+import zmq
+
+from stp_core.common.log import getlogger, reachedPowerOfTen
+
+logger = getlogger()
+
+
+class TxQueues:
+    """
+    Serialized messages a stack could not send since the socket to their
+    destination, a remote or a peer connected to the listener, was full,
+    queued by destination in the order they were sent so they can be retried
+    in that order when the stack is serviced.
+
+    At most `maxSize` messages are queued for a destination, messages sent
+    while that many wait are dropped. Messages waiting for more than `maxAge`
+    seconds are dropped instead of being retried. Dropped messages are
+    counted by destination and reason in `dropped`.
+    """
+    FULL = 'full'
+    EXPIRED = 'expired'
+    GONE = 'gone'
+    # Why messages are dropped, for logging
+    _reasons = {
+        FULL: 'too many messages wait to be sent',
+        EXPIRED: 'they waited too long to be sent',
+        GONE: 'it is gone',
+    }
+
+    def __init__(self, maxSize: int, maxAge: float = None, name=None):
+        self.maxSize = maxSize
+        self.maxAge = maxAge
+        # Name of the stack, used for logging
+        self.name = name
+        # Messages with the time they were queued, by destination
+        self._queues = {}  # type: Dict[Hashable, deque]
+        self.dropped = {}  # type: Dict[Hashable, Counter]
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def __bool__(self):
+        return bool(self._queues)
+
+    def __contains__(self, dest):
+        return dest in self._queues
+
+    @property
+    def destinations(self) -> List[Hashable]:
+        return list(self._queues)
+
+    def size(self, dest) -> int:
+        queue = self._queues.get(dest)
+        return len(queue) if queue else 0
+
+    def push(self, dest, data) -> bool:
+        """
+        Queue `data` to be sent to `dest`
+        :return: whether it was queued, False if it was dropped
+        """
+        queue = self._queues.get(dest)
+        if queue is None:
+            if not self.maxSize:
+                self._drop(dest, self.FULL)
+                return False
+            queue = self._queues[dest] = deque()
+        elif len(queue) >= self.maxSize:
+            self._drop(dest, self.FULL)
+            return False
+        queue.append((data, time.perf_counter()))
+        return True
+
+    def expire(self, dest) -> int:
+        """
+        Drop messages which waited too long to be sent to `dest`
+        :return: number of messages dropped
+        """
+        queue = self._queues.get(dest)
+        if not queue or not self.maxAge:
+            return 0
+        oldest = time.perf_counter() - self.maxAge
+        expired = 0
+        while queue and queue[0][1] < oldest:
+            queue.popleft()
+            expired += 1
+        if expired:
+            self._drop(dest, self.EXPIRED, expired)
+        if not queue:
+            del self._queues[dest]
+        return expired
+
+    def retry(self, dest, send: Callable[[Any], None]) -> int:
+        """
+        Send messages queued for `dest` in order with `send` till it raises
+        `zmq.Again`, dropping the ones which waited too long first
+        :return: number of messages sent
+        """
+        self.expire(dest)
+        queue = self._queues.get(dest)
+        if not queue:
+            return 0
+        sent = 0
+        while queue:
+            try:
+                send(queue[0][0])
+            except zmq.Again:
+                break
+            queue.popleft()
+            sent += 1
+        if not queue:
+            del self._queues[dest]
+        return sent
+
+    def discard(self, dest) -> int:
+        """
+        Drop messages queued for `dest` which is gone
+        :return: number of messages dropped
+        """
+        queue = self._queues.pop(dest, None)
+        if not queue:
+            return 0
+        self._drop(dest, self.GONE, len(queue))
+        return len(queue)
+
+    def clear(self):
+        self._queues = {}
+
+    def droppedCounts(self) -> Dict[Hashable, int]:
+        return {dest: sum(reasons.values())
+                for dest, reasons in self.dropped.items()}
+
+    def _drop(self, dest, reason, count=1):
+        reasons = self.dropped.get(dest)
+        if reasons is None:
+            reasons = self.dropped[dest] = Counter()
+        before = sum(reasons.values())
+        reasons[reason] += count
+        after = before + count
+        if reachedPowerOfTen(after, before):
+            logger.warning('{} dropped {} messages to {} since {} ({} '
+                           'dropped in total)'.format(
+                               self.name, count, dest,
+                               self._reasons[reason], after))
+
+    def report(self) -> dict:
+        return {
+            'queued': {dest: len(q) for dest, q in self._queues.items()},
+            'maxSize': self.maxSize,
+            'maxAge': self.maxAge,
+            'dropped': {dest: dict(reasons)
+                        for dest, reasons in self.dropped.items()},
+        }
@@ -7,12 +7,43 @@ import shutil
 from binascii import hexlify, unhexlify
 
 from libnacl import crypto_sign_seed_keypair
-from zmq.auth.certs import _write_key_file, _cert_public_banner, \
-    _cert_secret_banner
 from zmq.utils import z85
 
 from stp_core.crypto.util import ed25519PkToCurve25519 as ep2c, \
     ed25519SkToCurve25519 as es2c, isHex, randomSeed
+from stp_zmq.key_cache import keyCache
+
+_certPublicBanner = """#   ****  Generated on {} by stp  ****
+#   ZeroMQ CURVE Public Certificate
+#   Exchange securely, or use a secure mechanism to verify the contents
+#   of this file after exchange.
+
+"""
+_certSecretBanner = """#   ****  Generated on {} by stp  ****
+#   ZeroMQ CURVE **Secret** Certificate
+#   DO NOT PROVIDE THIS FILE TO OTHER USERS nor change its permissions.
+
+"""
+
+
+def writeKeyFile(path, public_key, secret_key=None, metadata=None):
+    """
+    Write a ZMQ certificate, in the format `zmq.auth.load_certificate`
+    reads, with the secret key if given
+    """
+    def text(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    banner = _certSecretBanner if secret_key else _certPublicBanner
+    with open(path, 'w', encoding='utf8') as f:
+        f.write(banner.format(datetime.datetime.now()))
+        f.write('metadata\n')
+        for k, v in (metadata or {}).items():
+            f.write('    {} = {}\n'.format(text(k), text(v)))
+        f.write('curve\n')
+        f.write('    public-key = "{}"\n'.format(text(public_key)))
+        if secret_key:
+            f.write('    secret-key = "{}"\n'.format(text(secret_key)))
 
 
 def createCertsFromKeys(key_dir, name, public_key, secret_key=None,
@@ -20,17 +51,12 @@ def createCertsFromKeys(key_dir, name, public_key, secret_key=None,
     base_filename = os.path.join(key_dir, name)
     secret_key_file = "{}.{}".format(base_filename, sSuffix)
     public_key_file = "{}.{}".format(base_filename, pSuffix)
-    now = datetime.datetime.now()
+    keyCache.invalidate(secret_key_file)
+    keyCache.invalidate(public_key_file)
     # print('{} writing {} {} in {}'.format(name, public_key, secret_key, key_dir))
-    _write_key_file(public_key_file,
-                    _cert_public_banner.format(now),
-                    public_key)
-
-    _write_key_file(secret_key_file,
-                    _cert_secret_banner.format(now),
-                    public_key,
-                    secret_key=secret_key,
-                    metadata=metadata)
+    writeKeyFile(public_key_file, public_key)
+    writeKeyFile(secret_key_file, public_key, secret_key=secret_key,
+                 metadata=metadata)
 
     return public_key_file, secret_key_file
 
@@ -51,6 +77,8 @@ def createEncAndSigKeys(enc_key_dir, sig_key_dir, name, seed=None):
 
 
 def moveKeyFilesToCorrectLocations(keys_dir, pkdir, skdir):
+    keyCache.invalidate(pkdir)
+    keyCache.invalidate(skdir)
     for key_file in os.listdir(keys_dir):
         if key_file.endswith(".key"):
             try:
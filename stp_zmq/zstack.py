@@ -1,4 +1,6 @@
+import asyncio
 import inspect
+import logging
 
 from stp_core.common.config.util import getConfig
 
@@ -13,29 +15,48 @@ import sys
 import time
 from abc import abstractmethod
 from binascii import hexlify, unhexlify
-from collections import deque
-from typing import Dict, Mapping, Callable, Tuple, Any, Union
+from collections import namedtuple, deque, OrderedDict
+from functools import partial
+from typing import Dict, Mapping, Callable, Tuple, Any, Union, List
 from typing import Set
 
-# import stp_zmq.asyncio
 import zmq.auth
 from stp_core.crypto.nacl_wrappers import Signer, Verifier
 from stp_core.crypto.util import isHex, ed25519PkToCurve25519
 from stp_core.network.auth_mode import AuthMode
-from stp_core.network.exceptions import PublicKeyNotFoundOnDisk, VerKeyNotFoundOnDisk
+from stp_core.network.exceptions import PublicKeyNotFoundOnDisk, \
+    VerKeyNotFoundOnDisk, PortNotAvailable
 from stp_core.network.keep_in_touch import KITNetworkInterface
 from stp_zmq.authenticator import MultiZapAuthenticator
+from stp_zmq.batching import BATCH_CAPABILITY, packBatch, isBatch, \
+    unpackBatch
+from stp_zmq.decode_pool import DecodePool, CONTROL, FAILED
+from stp_zmq.key_cache import keyCache
+from stp_zmq.keystore import KeyStore, openKeyStore
+from stp_zmq.remote_registry import RemoteRegistry
+from stp_zmq.rx_scheduler import RxScheduler, WaitStats
+from stp_zmq.serializers import serializers, Serializer
+from stp_zmq.socket_profile import SocketProfile
+from stp_zmq.tx_queue import TxQueues
 from zmq.utils import z85
 from zmq.utils.monitor import recv_monitor_message
 
 import zmq
-from stp_core.common.log import getlogger
+from stp_core.common.log import getlogger, getHotPathLogger
 from stp_core.network.network_interface import NetworkInterface
+from stp_core.network.rx_queue import BoundedRxQueue
 from stp_core.types import HA
-from stp_zmq.util import createEncAndSigKeys, \
-    moveKeyFilesToCorrectLocations, createCertsFromKeys
+from stp_zmq.util import createEncAndSigKeys
 
 logger = getlogger()
+hotLogger = getHotPathLogger()
+
+
+# Outcome of processing received messages: `processed` were passed to the
+# handlers, `dropped` could not be decoded or were filtered out and `control`
+# were pings or pongs
+ProcessedCounts = namedtuple('ProcessedCounts',
+                             ['processed', 'dropped', 'control'])
 
 
 # TODO: Separate directories are maintainer for public keys and verification
@@ -53,7 +74,31 @@ def set_keepalive(sock, config):
     sock.setsockopt(zmq.TCP_KEEPALIVE_CNT, config.KEEPALIVE_CNT)
 
 
+def io_threads(config) -> int:
+    """
+    Number of IO threads for the zmq context, `ZMQ_IO_THREADS` or with
+    'auto' one less than the number of cores, leaving one to the thread
+    servicing stacks
+    """
+    setting = config.ZMQ_IO_THREADS
+    if setting == 'auto':
+        return max(1, (os.cpu_count() or 1) - 1)
+    return setting
+
+
 class Remote:
+    # Monitor events telling whether the socket's connection is up or down
+    linkEvents = {
+        # noinspection PyUnresolvedReferences
+        zmq.EVENT_CONNECTED: True,
+        # noinspection PyUnresolvedReferences
+        zmq.EVENT_CONNECT_DELAYED: True,
+        # noinspection PyUnresolvedReferences
+        zmq.EVENT_DISCONNECTED: False,
+        # noinspection PyUnresolvedReferences
+        zmq.EVENT_CLOSED: False,
+    }
+
     def __init__(self, name, ha, verKey, publicKey, config=None):
         # TODO, remove *args, **kwargs after removing test
 
@@ -74,6 +119,24 @@ class Remote:
         self._lastConnectedAt = None
         self.config = config or getConfig()
 
+        # Whether the last connection event seen on the socket's monitor was
+        # of the connection being up, None till one is seen
+        self.linkUp = None
+        # Monitor events of the socket with the time they were consumed, for
+        # diagnostics
+        self.eventHistory = deque(
+            maxlen=self.config.ZMQ_REMOTE_EVENT_HISTORY)  # type: deque
+
+        # Serializer for messages sent to the remote, overrides the one the
+        # stack would use
+        self.serializer = None  # type: Serializer
+        # Socket options for the remote overriding the stack's profile
+        self.socketOptions = {}  # type: Dict[str, int]
+        # Set when offers of serializers go unanswered, as stacks of older
+        # versions or not negotiating do not answer them
+        self.ignoresSerializerOffers = False
+        self._unansweredSerializerOffers = 0
+
         # Currently keeping uid field to resemble RAET RemoteEstate
         self.uid = name
 
@@ -82,23 +145,49 @@ class Remote:
 
     @property
     def isConnected(self):
-        if not self._isConnected:
-            return False
-        lost = self.hasLostConnection
-        if lost:
-            self._isConnected = False
-            return False
-        return True
+        # Kept up to date by the stack consuming monitor events on every
+        # service
+        return self._isConnected
 
     def setConnected(self):
+        # Events seen before are older than the proof of connection
+        self.pollEvents()
         self._numOfReconnects += 1
         self._isConnected = True
         self._lastConnectedAt = time.perf_counter()
 
+    def pollEvents(self) -> List[int]:
+        """
+        Consume events of the socket's monitor, marking the remote as not
+        connected when they end with the connection going down
+        :return: the consumed events
+        """
+        if self.socket is None:
+            return []
+        events = self._get_monitor_events(self.socket)
+        if not events:
+            return events
+        now = time.perf_counter()
+        lastLink = None
+        for event in events:
+            self.eventHistory.append((now, event))
+            up = self.linkEvents.get(event)
+            if up is not None:
+                lastLink = up
+        hotLogger.trace('Remote {} has monitor events: {}', self, events)
+        if lastLink is not None:
+            self.linkUp = lastLink
+            if not lastLink and self._isConnected:
+                logger.debug('{} found disconnected event on monitor'.
+                             format(self))
+                self._isConnected = False
+        return events
+
     def firstConnect(self):
         return self._numOfReconnects == 0
 
-    def connect(self, context, localPubKey, localSecKey, typ=None):
+    def connect(self, context, localPubKey, localSecKey, typ=None,
+                profile: SocketProfile = None):
         typ = typ or zmq.DEALER
         sock = context.socket(typ)
         sock.curve_publickey = localPubKey
@@ -106,9 +195,14 @@ class Remote:
         sock.curve_serverkey = self.publicKey
         sock.identity = localPubKey
         set_keepalive(sock, self.config)
+        profile = profile or SocketProfile(self.config.ZMQ_SOCKET_PROFILE)
+        profile.merged(self.socketOptions).apply(sock, SocketProfile.REMOTE)
+        # Monitoring from the start so no connection event is missed
+        sock.get_monitor_socket()
         addr = 'tcp://{}:{}'.format(*self.ha)
         sock.connect(addr)
         self.socket = sock
+        self.linkUp = None
         logger.trace('connecting socket {} {} to remote {}'.
                      format(self.socket.FD, self.socket.underlying, self))
 
@@ -139,42 +233,21 @@ class Remote:
             logger.warning('Remote {} already disconnected'.format(self))
             return False
 
-        events = self._lastSocketEvents()
-
-        if events:
-            logger.trace('Remote {} has monitor events: {}'.
-                         format(self, events))
-
-        # noinspection PyUnresolvedReferences
-        if zmq.EVENT_DISCONNECTED in events or zmq.EVENT_CLOSED in events:
-            logger.debug('{} found disconnected event on monitor'.format(self))
-
-            # Reverse events list since list has no builtin to get last index
-            events.reverse()
-
-            def eventIndex(eventName):
-                try:
-                    return events.index(eventName)
-                except ValueError:
-                    return sys.maxsize
-
-            connected = eventIndex(zmq.EVENT_CONNECTED)
-            delayed = eventIndex(zmq.EVENT_CONNECT_DELAYED)
-            disconnected = min(eventIndex(zmq.EVENT_DISCONNECTED),
-                               eventIndex(zmq.EVENT_CLOSED))
-            if disconnected < connected and disconnected < delayed:
-                return True
-
-        return False
+        self.pollEvents()
+        return self.linkUp is False
 
     def _lastSocketEvents(self, nonBlock=True):
-        return self._get_monitor_events(self.socket, nonBlock)
+        return self.pollEvents() if nonBlock else \
+            self._get_monitor_events(self.socket, nonBlock)
 
     @staticmethod
     def _get_monitor_events(socket, non_block=True):
         monitor = socket.get_monitor_socket()
         events = []
         # noinspection PyUnresolvedReferences
+        if non_block and not monitor.EVENTS & zmq.POLLIN:
+            return events
+        # noinspection PyUnresolvedReferences
         flags = zmq.NOBLOCK if non_block else 0
         while True:
             try:
@@ -199,21 +272,46 @@ class ZStack(NetworkInterface):
     pingMessage = 'pi'
     pongMessage = 'po'
     healthMessages = {pingMessage.encode(), pongMessage.encode()}
+    # Starts of received messages which are pings or pongs
+    healthPrefixes = {pingMessage, pongMessage}
+    # Separates the serializers a stack can read from the ping or pong
+    # marker in the offers of serializers sent after plain pings, and in
+    # their answers
+    serializersSep = ':'
+    # Offers of serializers left unanswered when sending another one after
+    # which peers are taken as not negotiating, answers may be in flight
+    maxUnansweredSerializerOffers = 3
+    # Messages up to this length are decoded to text before checking
+    # whether they are pings or pongs
+    maxControlMsgLen = 64
+    # Source the receive scheduler knows the listener by, remotes are known by
+    # their identities
+    listenerSource = 'listener'
 
     # TODO: This is not implemented, implement this
     messageTimeout = 3
 
     def __init__(self, name, ha, basedirpath, msgHandler, restricted=True,
-                 seed=None, onlyListener=False, config=None):
+                 seed=None, onlyListener=False, config=None,
+                 batchHandler=None):
         self._name = name
         self.ha = ha
         self.basedirpath = basedirpath
         self.msgHandler = msgHandler
+        # When set, messages processed in a service are passed to it at once
+        # as a list of `(msg, frm)` instead of one by one to `msgHandler`
+        self.batchHandler = batchHandler
         self.seed = seed
         self.config = config or getConfig()
 
         self.listenerQuota = self.config.DEFAULT_LISTENER_QUOTA
         self.senderQuota = self.config.DEFAULT_SENDER_QUOTA
+        # When set, the quotas are the quanta the scheduler shares between
+        # the listener and remotes
+        self.rxScheduler = RxScheduler(
+            self.config.ZMQ_RX_SCHEDULER,
+            backlogLimit=self.config.ZMQ_RX_BACKLOG_LIMIT) \
+            if self.config.ZMQ_RX_SCHEDULER else None
 
         self.homeDir = None
         # As of now there would be only one file in secretKeysDir and sigKeyDir
@@ -221,26 +319,76 @@ class ZStack(NetworkInterface):
         self.secretKeysDir = None
         self.verifKeyDir = None
         self.sigKeyDir = None
+        self.keyStore = None  # type: KeyStore
 
         self.signer = None
         self.verifiers = {}
+        # Sent messages are signed and signatures of received ones verified
+        self.signMessages = self.config.ZMQ_SIGN_MESSAGES
+        # Messages received in a service whose signatures are verified at
+        # its end, `(msg, ident)` tuples
+        self._unverified = []  # type: List[Tuple[Any, bytes]]
+
+        self.serializer = self.config.ZMQ_SERIALIZER
+        # Options set on the listener and the sockets of remotes
+        self.socketProfile = SocketProfile(self.config.ZMQ_SOCKET_PROFILE)
+        # Names of serializers peers can read, by their identity, learnt from
+        # their pings and pongs and kept till they offer others or their
+        # remote's connection drops
+        self._peerSerializers = {}  # type: Dict[bytes, List[str]]
+
+        # Serialized messages to be sent to remotes in batches when the
+        # stack is serviced, by the names of remotes, with their total sizes
+        self._outBoxes = {}  # type: Dict[str, List[bytes]]
+        self._outBoxSizes = {}  # type: Dict[str, int]
+        # Serialized messages which could not be sent since sockets were
+        # full, retried when the stack is serviced. Queued by the names of
+        # remotes and by the identities of peers replied to through the
+        # listener
+        self._txQueues = TxQueues(self.config.ZMQ_TX_QUEUE_SIZE,
+                                  self.config.ZMQ_TX_QUEUE_MAX_AGE, name=name)
+        self._listenerTxQueues = TxQueues(self.config.ZMQ_TX_QUEUE_SIZE,
+                                          self.config.ZMQ_TX_QUEUE_MAX_AGE,
+                                          name=name)
 
         self.setupDirs()
         self.setupOwnKeysIfNeeded()
         self.setupSigning()
 
-        # self.poller = test.asyncio.Poller()
+        # Created in `open` when `ZMQ_USE_POLLER` is set, sockets of remotes
+        # are registered with it as they are connected
+        self.poller = None  # type: zmq.Poller
+        # Maps sockets registered with the poller to identities of remotes
+        self._polledRemotes = {}  # type: Dict[zmq.Socket, bytes]
+
+        # Set by `attach_to_loop`, file descriptors of the stack's sockets are
+        # then watched by the event loop to signal readiness
+        self._loop = None
+        self._onReadable = None  # type: Callable
+        self._readable = None  # type: asyncio.Event
+        self._watchedFds = {}  # type: Dict[zmq.Socket, int]
+        # Whether a check of the watched sockets for being readable is
+        # scheduled on the event loop
+        self._readableCheckDue = False
 
         self.restricted = restricted
 
         self.ctx = None  # type: Context
         self.listener = None
+        # Listener sockets bound to `shardPorts` when `ZMQ_LISTENER_SHARDS`
+        # is more than 1, received from like the listener
+        self.listenerShards = []  # type: List[zmq.Socket]
+        # Ports to bind the listener shards to, set before the stack is
+        # started, None for ones derived from the stack's port
+        self.listenerShardPorts = None  # type: List[int]
+        # The shard through which peers connected to a shard are replied to,
+        # by identity of the peer, kept for the peers received from last
+        self._shardOf = OrderedDict()  # type: Dict[bytes, zmq.Socket]
         self.auth = None
 
-        # Each remote is identified uniquely by the name
-        self._remotes = {}  # type: Dict[str, Remote]
-
-        self.remotesByKeys = {}
+        # Each remote is identified uniquely by the name, remotes are indexed
+        # by their public keys, HAs and verkeys too
+        self._remotes = RemoteRegistry()
 
         # Indicates if this stack will maintain any remotes or will
         # communicate simply to listeners. Used in ClientZStack
@@ -249,14 +397,79 @@ class ZStack(NetworkInterface):
 
         self._conns = set()  # type: Set[str]
 
-        self.rxMsgs = deque()
+        # Breakdown of the messages the last `processReceived` went through
+        self.processedCounts = ProcessedCounts(0, 0, 0)
+
+        self.rxMsgs = BoundedRxQueue(self.config.RX_QUEUE_SIZE,
+                                     self.config.RX_QUEUE_POLICY, name=name)
+        # Decodes received messages off the event loop when
+        # `ZMQ_DECODE_POOL` is set, its workers run while the stack is open
+        self.decodePool = DecodePool(
+            self.config.ZMQ_DECODE_POOL,
+            workers=self.config.ZMQ_DECODE_WORKERS,
+            batchSize=self.config.ZMQ_DECODE_BATCH_SIZE,
+            maxPending=self.config.ZMQ_DECODE_MAX_PENDING,
+            onDone=self._onDecoded, name=name) \
+            if self.config.ZMQ_DECODE_POOL else None
         self._created = time.perf_counter()
 
         self.last_heartbeat_at = None
 
     @property
-    def remotes(self):
-        return self._remotes
+    def remotes(self) -> Dict[str, Remote]:
+        return self._remotes.byName
+
+    @property
+    def remotesByKeys(self) -> Dict[bytes, Remote]:
+        return self._remotes.byKey
+
+    def findInRemotesByName(self, name: str):
+        return self._remotes.getByName(name)
+
+    def findInRemotesByHA(self, remoteHa: HA):
+        return self._remotes.getByHa(remoteHa)
+
+    def findInRemotesByVerKey(self, verKey):
+        return self._remotes.getByVerKey(verKey)
+
+    @property
+    def serializer(self) -> Serializer:
+        return self._serializer
+
+    @serializer.setter
+    def serializer(self, serializer: Union[str, Serializer]):
+        if isinstance(serializer, str):
+            serializer = serializers.get(serializer)
+        self._serializer = serializer
+        # Messages without a tag are JSON, and also the format every peer
+        # can read
+        self._textSerializer = serializer if serializer.tag is None \
+            else serializers.get('json')
+
+    def setRemoteSocketOptions(self, name: str, **options):
+        """
+        Set socket options for remote `name` overriding the stack's
+        `socketProfile`, like `SNDHWM=10000`, None resets an option to the
+        stack's. They apply from the next time the remote is connected, as
+        on `reconnectRemote`.
+        """
+        remote = self.remotes[name]
+        # Checks the options before touching the remote
+        self.socketProfile.merged(options)
+        for option, value in options.items():
+            if value is None:
+                remote.socketOptions.pop(option.upper(), None)
+            else:
+                remote.socketOptions[option.upper()] = value
+
+    def setRemoteSerializer(self, name: str, serializer: Union[str, Serializer]):
+        """
+        Use `serializer` for messages sent to remote `name` whatever the stack
+        would use otherwise. None resets it.
+        """
+        if isinstance(serializer, str):
+            serializer = serializers.get(serializer)
+        self.remotes[name].serializer = serializer
 
     @property
     def created(self):
@@ -279,11 +492,19 @@ class ZStack(NetworkInterface):
         pkey = remote.publicKey
         vkey = remote.verKey
         if name in self.remotes:
-            self.remotes.pop(name)
-            self.remotesByKeys.pop(pkey, None)
+            remote = self.remotes[name]
+            self._unregisterRemoteSocket(remote)
+            self._remotes.remove(remote)
             self.verifiers.pop(vkey, None)
+            self._outBoxes.pop(name, None)
+            self._outBoxSizes.pop(name, None)
+            self._txQueues.discard(name)
+            self._shardOf.pop(pkey, None)
+            self._peerSerializers.pop(pkey, None)
+            if self.rxScheduler is not None:
+                self.rxScheduler.forget((pkey,))
         else:
-            logger.warning('No remote named {} present')
+            logger.warning('No remote named {} present'.format(name))
 
     @staticmethod
     def initLocalKeys(name, baseDir, sigseed, override=False):
@@ -304,8 +525,13 @@ class ZStack(NetworkInterface):
         for d in (homeDir, verifDirPath, sigDirPath, secretDirPath, pubDirPath):
             os.makedirs(d, exist_ok=True)
 
-        moveKeyFilesToCorrectLocations(sDir, verifDirPath, sigDirPath)
-        moveKeyFilesToCorrectLocations(eDir, pubDirPath, secretDirPath)
+        keyStore = openKeyStore(homeDir)
+        try:
+            keyStore.putFromCertificates(sDir, KeyStore.VERIF, KeyStore.SIG)
+            keyStore.putFromCertificates(eDir, KeyStore.PUBLIC,
+                                         KeyStore.SECRET)
+        finally:
+            keyStore.close()
 
         shutil.rmtree(sDir)
         shutil.rmtree(eDir)
@@ -322,9 +548,13 @@ class ZStack(NetworkInterface):
         if isHex(verkey):
             verkey = unhexlify(verkey)
 
-        createCertsFromKeys(verifDirPath, remoteName, z85.encode(verkey))
         public_key = ed25519PkToCurve25519(verkey)
-        createCertsFromKeys(pubDirPath, remoteName, z85.encode(public_key))
+        keyStore = openKeyStore(homeDir)
+        try:
+            keyStore.put(KeyStore.VERIF, remoteName, z85.encode(verkey))
+            keyStore.put(KeyStore.PUBLIC, remoteName, z85.encode(public_key))
+        finally:
+            keyStore.close()
 
     def onHostAddressChanged(self):
         # we don't store remote data like ip, port, domain name, etc, so
@@ -334,16 +564,16 @@ class ZStack(NetworkInterface):
     @staticmethod
     def areKeysSetup(name, baseDir):
         homeDir = ZStack.homeDirPath(baseDir, name)
-        verifDirPath = ZStack.verifDirPath(homeDir)
-        pubDirPath = ZStack.publicDirPath(homeDir)
-        sigDirPath = ZStack.sigDirPath(homeDir)
-        secretDirPath = ZStack.secretDirPath(homeDir)
-        for d in (verifDirPath, pubDirPath):
-            if not os.path.isfile(os.path.join(d, '{}.key'.format(name))):
-                return False
-        for d in (sigDirPath, secretDirPath):
-            if not os.path.isfile(os.path.join(d, '{}.key_secret'.format(name))):
-                return False
+        if not os.path.isdir(homeDir):
+            return False
+        keyStore = openKeyStore(homeDir)
+        try:
+            for kind in KeyStore.kinds:
+                keyStore.get(kind, name)
+        except KeyError:
+            return False
+        finally:
+            keyStore.close()
         return True
 
     @staticmethod
@@ -386,14 +616,19 @@ class ZStack(NetworkInterface):
         for d in (homeDir, verifDirPath, pubDirPath):
             os.makedirs(d, exist_ok=True)
 
-        for other in others:
-            createCertsFromKeys(verifDirPath, other.name, other.verKey)
-            createCertsFromKeys(pubDirPath, other.name, other.publicKey)
+        keyStore = openKeyStore(homeDir)
+        try:
+            keyStore.putMany(KeyStore.VERIF,
+                             [(o.name, o.verKey, None) for o in others])
+            keyStore.putMany(KeyStore.PUBLIC,
+                             [(o.name, o.publicKey, None) for o in others])
+        finally:
+            keyStore.close()
 
     def tellKeysToOthers(self, others):
         for other in others:
-            createCertsFromKeys(other.verifKeyDir, self.name, self.verKey)
-            createCertsFromKeys(other.publicKeysDir, self.name, self.publicKey)
+            other.keyStore.put(KeyStore.VERIF, self.name, self.verKey)
+            other.keyStore.put(KeyStore.PUBLIC, self.name, self.publicKey)
 
     def setupDirs(self):
         self.homeDir = self.homeDirPath(self.basedirpath, self.name)
@@ -405,12 +640,13 @@ class ZStack(NetworkInterface):
         for d in (self.homeDir, self.publicKeysDir, self.secretKeysDir,
                   self.verifKeyDir, self.sigKeyDir):
             os.makedirs(d, exist_ok=True)
+        self.keyStore = openKeyStore(self.homeDir, self.config)
 
     def setupOwnKeysIfNeeded(self):
-        if not os.listdir(self.sigKeyDir):
+        if not self.keyStore.names(KeyStore.SIG):
             # If signing keys are not present, secret (private keys) should
             # not be present since they should be converted keys.
-            assert not os.listdir(self.secretKeysDir)
+            assert not self.keyStore.names(KeyStore.SECRET)
             # Seed should be present
             assert self.seed, 'Keys are not setup for {}'.format(self)
             logger.info("Signing and Encryption keys were not found for {}. "
@@ -421,22 +657,25 @@ class ZStack(NetworkInterface):
             os.makedirs(tdirS, exist_ok=True)
             os.makedirs(tdirE, exist_ok=True)
             createEncAndSigKeys(tdirE, tdirS, self.name, self.seed)
-            moveKeyFilesToCorrectLocations(tdirE, self.publicKeysDir,
-                                           self.secretKeysDir)
-            moveKeyFilesToCorrectLocations(tdirS, self.verifKeyDir,
-                                           self.sigKeyDir)
+            self.keyStore.putFromCertificates(tdirE, KeyStore.PUBLIC,
+                                              KeyStore.SECRET)
+            self.keyStore.putFromCertificates(tdirS, KeyStore.VERIF,
+                                              KeyStore.SIG)
             shutil.rmtree(tdirE)
             shutil.rmtree(tdirS)
 
     def setupAuth(self, restricted=True, force=False):
         if self.auth and not force:
             raise RuntimeError('Listener already setup')
-        location = self.publicKeysDir if restricted else zmq.auth.CURVE_ALLOW_ANY
         # self.auth = AsyncioAuthenticator(self.ctx)
         self.auth = MultiZapAuthenticator(self.ctx)
         self.auth.start()
         self.auth.allow('0.0.0.0')
-        self.auth.configure_curve(domain='*', location=location)
+        if restricted:
+            self.keyStore.configureCurve(self.auth)
+        else:
+            self.auth.configure_curve(domain='*',
+                                      location=zmq.auth.CURVE_ALLOW_ANY)
 
     def teardownAuth(self):
         if self.auth:
@@ -455,7 +694,9 @@ class ZStack(NetworkInterface):
 
     def start(self, restricted=None, reSetupAuth=True):
         # self.ctx = test.asyncio.Context.instance()
-        self.ctx = zmq.Context.instance()
+        # The context is shared by stacks of the process, the first one
+        # started sizes its IO threads
+        self.ctx = zmq.Context.instance(io_threads=io_threads(self.config))
         if self.config.MAX_SOCKETS:
             self.ctx.MAX_SOCKETS = self.config.MAX_SOCKETS
         restricted = self.restricted if restricted is None else restricted
@@ -479,49 +720,118 @@ class ZStack(NetworkInterface):
         return self.listener is not None
 
     def open(self):
+        if self.config.ZMQ_USE_POLLER:
+            self.poller = zmq.Poller()
+            self._polledRemotes = {}
+        shardPorts = self.shardPorts
+        self.listener = self._openListener(self.ha[1])
+        # Connections of each shard are handled by an IO thread of the
+        # context so CURVE decryption for many peers spreads over cores
+        try:
+            for port in shardPorts:
+                self.listenerShards.append(self._openListener(port))
+        except PortNotAvailable:
+            self._closeListeners()
+            raise
+        if self.decodePool is not None:
+            self.decodePool.start()
+
+    def _openListener(self, port):
         # noinspection PyUnresolvedReferences
-        self.listener = self.ctx.socket(zmq.ROUTER)
-        # noinspection PyUnresolvedReferences
-        # self.poller.register(self.listener, test.POLLIN)
+        listener = self.ctx.socket(zmq.ROUTER)
+        if self.poller is not None:
+            # noinspection PyUnresolvedReferences
+            self.poller.register(listener, zmq.POLLIN)
         public, secret = self.selfEncKeys
-        self.listener.curve_secretkey = secret
-        self.listener.curve_publickey = public
-        self.listener.curve_server = True
-        self.listener.identity = self.publicKey
-        logger.debug('{} will bind its listener at {}'.format(self, self.ha[1]))
-        set_keepalive(self.listener, self.config)
-        self.listener.bind(
-            'tcp://*:{}'.format(self.ha[1]))
+        listener.curve_secretkey = secret
+        listener.curve_publickey = public
+        listener.curve_server = True
+        listener.identity = self.publicKey
+        logger.debug('{} will bind its listener at {}'.format(self, port))
+        set_keepalive(listener, self.config)
+        self.listenerProfile.apply(listener, SocketProfile.LISTENER)
+        try:
+            listener.bind('tcp://*:{}'.format(port))
+        except zmq.ZMQError as ex:
+            if self.poller is not None:
+                self.poller.unregister(listener)
+            listener.close(linger=0)
+            if ex.errno != zmq.EADDRINUSE:
+                raise
+            logger.error('{} could not bind its listener at {} since the '
+                         'port is taken'.format(self, port))
+            raise PortNotAvailable(port) from ex
+        self._watchSocket(listener)
+        return listener
+
+    @property
+    def shardPorts(self) -> List[int]:
+        """
+        Ports the listener shards are bound to, `listenerShardPorts` or the
+        stack's port plus multiples of `ZMQ_LISTENER_SHARD_PORT_STEP`
+        """
+        count = self.config.ZMQ_LISTENER_SHARDS - 1
+        if self.listenerShardPorts is None:
+            step = self.config.ZMQ_LISTENER_SHARD_PORT_STEP
+            return [self.ha[1] + step * i for i in range(1, count + 1)]
+        ports = list(self.listenerShardPorts)
+        if len(ports) != count:
+            raise ValueError('{} has {} listener shard ports for {} shards'.
+                             format(self, len(ports), count))
+        if len(set(ports + [self.ha[1]])) != count + 1:
+            raise ValueError('{} has listener shard ports {} which repeat or '
+                             'include its port {}'.
+                             format(self, ports, self.ha[1]))
+        return ports
+
+    @property
+    def listenerProfile(self) -> SocketProfile:
+        """
+        Socket profile of listeners, the stack's one with ROUTER_MANDATORY
+        set when replies through the listener are queued or peers are looked
+        for among listener shards
+        """
+        if self.config.ZMQ_LISTENER_TX_QUEUE or \
+                self.config.ZMQ_LISTENER_SHARDS > 1:
+            return self.socketProfile.merged({'ROUTER_MANDATORY': 1})
+        return self.socketProfile
+
+    @property
+    def listeners(self) -> List[zmq.Socket]:
+        return [self.listener] + self.listenerShards
 
     def close(self):
-        self.listener.unbind(self.listener.LAST_ENDPOINT)
-        self.listener.close(linger=0)
-        self.listener = None
+        self._closeListeners()
+        self._shardOf.clear()
+        self.poller = None
+        self._polledRemotes = {}
+        self._outBoxes = {}
+        self._outBoxSizes = {}
+        self._txQueues.clear()
+        self._listenerTxQueues.clear()
+        if self.decodePool is not None:
+            self.decodePool.stop()
         logger.debug('{} starting to disconnect remotes'.format(self))
-        for r in self.remotes.values():
+        for r in self._remotes.clear():
+            self._unregisterRemoteSocket(r)
             r.disconnect()
-            self.remotesByKeys.pop(r.publicKey, None)
-
-        self._remotes = {}
-        if self.remotesByKeys:
-            logger.warning('{} found remotes that were only in remotesByKeys and '
-                        'not in remotes. This is suspicious')
-            for r in self.remotesByKeys.values():
-                r.disconnect()
-            self.remotesByKeys = {}
         self._conns = set()
 
+    def _closeListeners(self):
+        for listener in self.listeners:
+            self._unwatchSocket(listener)
+            listener.unbind(listener.LAST_ENDPOINT)
+            listener.close(linger=0)
+        self.listener = None
+        self.listenerShards = []
+
     @property
     def selfEncKeys(self):
-        serverSecretFile = os.path.join(self.secretKeysDir,
-                                        "{}.key_secret".format(self.name))
-        return zmq.auth.load_certificate(serverSecretFile)
+        return self.keyStore.get(KeyStore.SECRET, self.name)
 
     @property
     def selfSigKeys(self):
-        serverSecretFile = os.path.join(self.sigKeyDir,
-                                        "{}.key_secret".format(self.name))
-        return zmq.auth.load_certificate(serverSecretFile)
+        return self.keyStore.get(KeyStore.SIG, self.name)
 
     @property
     def isRestricted(self):
@@ -571,26 +881,63 @@ class ZStack(NetworkInterface):
         processes all of the messages in rxMsgs.
         :return: the number of messages processed.
         """
+        if self._readable is not None:
+            self._readable.clear()
         if self.listener:
+            self.retryQueued()
+            self.flushOutBoxes()
             await self._serviceStack(self.age)
         else:
-            logger.debug("{} is stopped".format(self))
+            hotLogger.debug("{} is stopped", self)
 
+        processed = 0
         r = len(self.rxMsgs)
-        if r > 0:
+        if r > 0 or (self.decodePool is not None and
+                     self.decodePool.pending):
             pracLimit = limit if limit else sys.maxsize
-            return self.processReceived(pracLimit)
-        return 0
+            # Pings and pongs are not counted so a stack getting only them
+            # looks idle
+            processed = self.processReceived(pracLimit)
+        # Messages sent while processing go out in this service
+        self.flushOutBoxes()
+        if self._readable is not None:
+            # Sending in this service may have reset the descriptors of
+            # sockets which got messages meanwhile
+            self._checkReadable()
+        return processed
 
     def _verifyAndAppend(self, msg, ident):
-        # if self.verify(msg, ident):
-        #     self.rxMsgs.append((msg[:-self.sigLen].decode(), ident))
-        # else:
-        #     logger.error('{} got error while '
-        #                  'verifying message {} from {}'
-        #                  .format(self, msg, ident))
+        # Signatures of signed messages are verified and removed by
+        # `_verifyReceived` before
+        data = msg.buffer if isinstance(msg, zmq.Frame) else msg
+        if not isBatch(data):
+            return self._appendReceived(msg, ident)
+        try:
+            msgs = unpackBatch(data)
+        except ValueError as ex:
+            logger.error('{} got malformed batch from {}: {}'
+                         .format(self, ident, ex))
+            return False
+        # Batches are unpacked one level only, stacks never nest them
+        nested = 0
+        for m in msgs:
+            if isBatch(m):
+                nested += 1
+            else:
+                self._appendReceived(m, ident)
+        if nested:
+            logger.warning('{} dropped {} batches nested in a batch from {}'
+                           .format(self, nested, ident))
+        return True
+
+    def _appendReceived(self, msg, ident):
+        if isinstance(msg, zmq.Frame) or serializers.isTagged(msg):
+            # Received without copying or in a binary format, kept as is
+            # till `processReceived` parses it
+            self.rxMsgs.append((msg, ident))
+            return True
         try:
-            decoded = msg.decode()
+            decoded = str(msg, 'utf-8')
         except UnicodeDecodeError as ex:
             logger.error('{} got exception while decoding {} to utf-8: {}'
                          .format(self, msg, ex))
@@ -600,27 +947,49 @@ class ZStack(NetworkInterface):
 
     def _receiveFromListener(self, quota) -> int:
         """
-        Receives messages from listener
+        Receives messages from listener, and from its shards if any which
+        share the quota
         :param quota: number of messages to receive
         :return: number of received messages
         """
         assert quota
+        quota = self.rxMsgs.admits(quota)
+        if not self.listenerShards:
+            i = self._receiveFromListenerSocket(self.listener, quota)
+        else:
+            i = 0
+            for listener in self.listeners:
+                if i >= quota:
+                    break
+                i += self._receiveFromListenerSocket(listener, quota - i,
+                                                     shard=True)
+        if i > 0:
+            hotLogger.trace('{} got {} messages through listener', self, i)
+        return i
+
+    def _receiveFromListenerSocket(self, listener, quota, shard=False) -> int:
         i = 0
+        copy = not self.config.ZMQ_ZERO_COPY_RECEIVE
         while i < quota:
             try:
-                ident, msg = self.listener.recv_multipart(flags=zmq.NOBLOCK)
+                ident, msg = listener.recv_multipart(flags=zmq.NOBLOCK,
+                                                     copy=copy)
+                if not copy:
+                    ident = ident.bytes
                 if not msg:
                     # Router probing sends empty message on connection
                     continue
                 i += 1
+                if shard:
+                    self._rememberShard(ident, listener)
                 if self.onlyListener and ident not in self.remotesByKeys:
                     self.peersWithoutRemotes.add(ident)
-                self._verifyAndAppend(msg, ident)
+                if self.signMessages:
+                    self._unverified.append((msg, ident))
+                else:
+                    self._verifyAndAppend(msg, ident)
             except zmq.Again:
                 break
-        if i > 0:
-            logger.trace('{} got {} messages through listener'.
-                         format(self, i))
         return i
 
     def _receiveFromRemotes(self, quotaPerRemote) -> int:
@@ -635,24 +1004,306 @@ class ZStack(NetworkInterface):
         for ident, remote in self.remotesByKeys.items():
             if not remote.socket:
                 continue
-            i = 0
-            sock = remote.socket
-            while i < quotaPerRemote:
-                try:
-                    msg, = sock.recv_multipart(flags=zmq.NOBLOCK)
-                    if not msg:
-                        # Router probing sends empty message on connection
-                        continue
-                    i += 1
+            totalReceived += self._receiveFromRemote(ident, remote,
+                                                     quotaPerRemote)
+        return totalReceived
+
+    def _receiveFromRemote(self, ident, remote, quota) -> int:
+        """
+        Receives messages from the socket of a single remote
+        :param ident: identity of the remote, its public key
+        :param remote: the remote to receive from
+        :param quota: number of messages to receive
+        :return: number of received messages
+        """
+        quota = self.rxMsgs.admits(quota)
+        i = 0
+        sock = remote.socket
+        copy = not self.config.ZMQ_ZERO_COPY_RECEIVE
+        while i < quota:
+            try:
+                msg, = sock.recv_multipart(flags=zmq.NOBLOCK, copy=copy)
+                if not msg:
+                    # Router probing sends empty message on connection
+                    continue
+                i += 1
+                if self.signMessages:
+                    self._unverified.append((msg, ident))
+                else:
                     self._verifyAndAppend(msg, ident)
-                except zmq.Again:
-                    break
-            if i > 0:
-                logger.trace('{} got {} messages through remote {}'.
-                             format(self, i, remote))
-            totalReceived += i
+            except zmq.Again:
+                break
+        if i > 0:
+            hotLogger.trace('{} got {} messages through remote {}',
+                            self, i, remote)
+        return i
+
+    def _receiveFromPolled(self) -> int:
+        """
+        Receives messages only from the sockets which the poller reports as
+        readable
+        :return: number of received messages
+        """
+        readable = self._pollReadable()
+        if not readable:
+            return 0
+        totalReceived = 0
+        if any(listener in readable for listener in self.listeners):
+            totalReceived += self._receiveFromListener(quota=self.listenerQuota)
+        for sock in readable:
+            ident = self._polledRemotes.get(sock)
+            if ident is None:
+                continue
+            remote = self.remotesByKeys.get(ident)
+            if remote is None or remote.socket is not sock:
+                continue
+            totalReceived += self._receiveFromRemote(ident, remote,
+                                                     self.senderQuota)
         return totalReceived
 
+    def _receiveScheduled(self) -> int:
+        """
+        Receives messages from the listener and remotes in the order and
+        amounts decided by the receive scheduler. With a poller only readable
+        sockets are scheduled
+        :return: number of received messages
+        """
+        readable = self._pollReadable() if self.poller is not None else None
+        if readable is not None and not readable:
+            return 0
+        sources = []
+        if readable is None or \
+                any(listener in readable for listener in self.listeners):
+            sources.append((self.listenerSource, self.listenerQuota))
+        for ident, remote in self.remotesByKeys.items():
+            if remote.socket and (readable is None or remote.socket in readable):
+                sources.append((ident, self.senderQuota))
+
+        scheduler = self.rxScheduler
+        totalReceived = 0
+        for source, quota in scheduler.schedule(sources, len(self.rxMsgs),
+                                                ready=readable is not None):
+            if source == self.listenerSource:
+                received = self._receiveFromListener(quota=quota)
+            else:
+                received = self._receiveFromRemote(
+                    source, self.remotesByKeys[source], quota)
+            scheduler.served(source, received, quota)
+            totalReceived += received
+        return totalReceived
+
+    def setPeerWeight(self, name: str, weight: float):
+        """
+        Set the weight of remote `name`, or of the listener when `name` is
+        `listenerSource`, in the receive scheduler. A remote with weight 2 is
+        received twice as many messages from as one with weight 1.
+        """
+        if self.rxScheduler is None:
+            raise RuntimeError('{} does not schedule receiving, set '
+                               'ZMQ_RX_SCHEDULER'.format(self))
+        source = name if name == self.listenerSource \
+            else self.remotes[name].publicKey
+        self.rxScheduler.setWeight(source, weight)
+
+    @property
+    def rxWaitStats(self) -> Dict[str, WaitStats]:
+        """
+        How long the listener and remotes, by name, waited to be received from
+        while having messages
+        """
+        if self.rxScheduler is None:
+            return {}
+        return {source if source == self.listenerSource
+                else self.remotesByKeys[source].name: stats
+                for source, stats in self.rxScheduler.waitStats.items()
+                if source == self.listenerSource or
+                source in self.remotesByKeys}
+
+    @property
+    def rxShedCounts(self) -> Dict[Union[str, bytes], int]:
+        """
+        Number of received messages dropped since `rxMsgs` was full, by the
+        name of the remote sending them or their sender's identity
+        """
+        return {self.remotesByKeys[ident].name
+                if ident in self.remotesByKeys else ident: count
+                for ident, count in self.rxMsgs.shed.items()}
+
+    @property
+    def txDropCounts(self) -> Dict[Union[str, bytes], int]:
+        """
+        Number of messages dropped since they could not be sent, by the name
+        of the remote or the identity of the peer they were sent to
+        """
+        counts = self._listenerTxQueues.droppedCounts()
+        counts.update(self._txQueues.droppedCounts())
+        return counts
+
+    def _pollReadable(self):
+        try:
+            # noinspection PyUnresolvedReferences
+            return dict(self.poller.poll(0))
+        except zmq.ZMQError as ex:
+            # A registered socket was closed without being unregistered, like
+            # when `disconnect` is called directly on a remote
+            logger.debug('{} got error {} while polling, re-registering '
+                         'sockets'.format(self, ex))
+            self._resetPoller()
+            # noinspection PyUnresolvedReferences
+            return dict(self.poller.poll(0))
+
+    def _resetPoller(self):
+        self.poller = zmq.Poller()
+        for listener in self.listeners:
+            # noinspection PyUnresolvedReferences
+            self.poller.register(listener, zmq.POLLIN)
+        self._polledRemotes = {}
+        for remote in self.remotesByKeys.values():
+            self._registerRemoteSocket(remote)
+
+    def _registerRemoteSocket(self, remote):
+        sock = remote.socket
+        if sock is None or sock.closed:
+            return
+        if self.poller is not None:
+            # noinspection PyUnresolvedReferences
+            self.poller.register(sock, zmq.POLLIN)
+            self._polledRemotes[sock] = remote.publicKey
+        self._watchSocket(sock)
+
+    def _unregisterRemoteSocket(self, remote):
+        sock = remote.socket
+        if sock is None:
+            return
+        self._unwatchSocket(sock)
+        if sock in self._polledRemotes:
+            self._polledRemotes.pop(sock)
+            self.poller.unregister(sock)
+
+    def attach_to_loop(self, loop, on_readable: Callable = None):
+        """
+        Watch the file descriptors of the listener and remote sockets on
+        `loop` so that readiness of the stack can be awaited with
+        `wait_readable` instead of checking the sockets periodically.
+
+        :param loop: the asyncio event loop the stack is serviced on
+        :param on_readable: called whenever any of the sockets has become
+        readable, like `Looper.wakeup`
+        """
+        self.detach_from_loop()
+        self._loop = loop
+        self._onReadable = on_readable
+        self._readable = asyncio.Event(loop=loop)
+        try:
+            if self.listener is not None:
+                for listener in self.listeners:
+                    self._watchSocket(listener)
+            for remote in self.remotesByKeys.values():
+                if remote.socket is not None and not remote.socket.closed:
+                    self._watchSocket(remote.socket)
+        except NotImplementedError:
+            # Event loops like the ProactorEventLoop cannot watch file
+            # descriptors
+            logger.info('{} cannot watch its sockets on loop {}'.
+                        format(self, loop), extra={"cli": False})
+            self.detach_from_loop()
+
+    def detach_from_loop(self):
+        for sock in list(self._watchedFds):
+            self._unwatchSocket(sock)
+        self._loop = None
+        self._onReadable = None
+        self._readable = None
+        self._readableCheckDue = False
+
+    async def wait_readable(self, timeout=None) -> bool:
+        """
+        Wait till any socket of this stack becomes readable.
+
+        :param timeout: seconds to wait for, wait indefinitely if None
+        :return: whether any socket became readable before the timeout
+        """
+        if self._readable is None:
+            raise RuntimeError('{} is not attached to an event loop'.
+                               format(self))
+        try:
+            await asyncio.wait_for(self._readable.wait(), timeout,
+                                   loop=self._loop)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _watchSocket(self, sock):
+        if self._loop is None:
+            return
+        fd = sock.FD
+        # The descriptor can be left registered by a socket closed without
+        # the stack knowing, like when a remote is disconnected directly
+        self._loop.remove_reader(fd)
+        self._loop.add_reader(fd, self._onSocketEvent, sock)
+        self._watchedFds[sock] = fd
+
+    def _unwatchSocket(self, sock):
+        fd = self._watchedFds.pop(sock, None)
+        if fd is not None and self._loop is not None:
+            self._loop.remove_reader(fd)
+
+    def _onSocketEvent(self, sock):
+        # ZMQ's descriptor is edge triggered and only tells that the
+        # socket's state has changed, `EVENTS` tells what changed and also
+        # resets the descriptor
+        if sock.closed:
+            self._unwatchSocket(sock)
+            return
+        # noinspection PyUnresolvedReferences
+        if sock.EVENTS & zmq.POLLIN:
+            self._wakeUp()
+
+    def _onSent(self):
+        # Sending processes the socket's pending commands and can consume
+        # the edge of its descriptor telling that a message arrived, so like
+        # zmq.asyncio the sockets are checked again afterwards
+        if self._loop is None or self._readableCheckDue:
+            return
+        self._readableCheckDue = True
+        self._loop.call_soon(self._checkReadable)
+
+    def _checkReadable(self) -> bool:
+        """
+        Wake the stack up if any of its watched sockets is readable
+        :return: whether any is
+        """
+        self._readableCheckDue = False
+        if self._readable is None:
+            return False
+        for sock in self._watchedFds:
+            # noinspection PyUnresolvedReferences
+            if not sock.closed and sock.EVENTS & zmq.POLLIN:
+                self._wakeUp()
+                return True
+        return False
+
+    def _wakeUp(self):
+        self._readable.set()
+        if self._onReadable:
+            self._onReadable()
+
+    def _onDecoded(self):
+        # Called from a thread of the decode pool when messages are decoded,
+        # the stack is woken up on its event loop to process them
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._onDecodedInLoop)
+        except RuntimeError:
+            # The loop was closed
+            pass
+
+    def _onDecodedInLoop(self):
+        if self._readable is not None:
+            self._wakeUp()
+
     async def _serviceStack(self, age):
         # TODO: age is unused
 
@@ -664,38 +1315,244 @@ class ZStack(NetworkInterface):
                         self.config.HEARTBEAT_FREQ):
             self.send_heartbeats()
 
-        self._receiveFromListener(quota=self.listenerQuota)
-        self._receiveFromRemotes(quotaPerRemote=self.senderQuota)
+        if self.rxScheduler is not None:
+            self._receiveScheduled()
+        elif self.poller is not None:
+            self._receiveFromPolled()
+        else:
+            self._receiveFromListener(quota=self.listenerQuota)
+            self._receiveFromRemotes(quotaPerRemote=self.senderQuota)
+        if self._unverified:
+            self._verifyReceived()
+        self._pollRemoteEvents()
         return len(self.rxMsgs)
 
-    def processReceived(self, limit):
-        if limit <= 0:
+    def _verifyReceived(self) -> int:
+        """
+        Verify signatures of the messages received in this service in one
+        pass, looking up the verifier of each sender once, and queue those
+        signed by the remote they come from without their signatures.
+        Messages of senders without a known verification key are dropped
+        unless the stack is not restricted
+        :return: number of messages dropped
+        """
+        unverified = self._unverified
+        self._unverified = []
+        if self.decodePool is not None:
+            # Verified by the workers of the pool before decoding them
+            append = self.rxMsgs.append
+            for item in unverified:
+                append(item)
             return 0
+        sigLen = self.sigLen
+        trustsUnknown = self.isKeySharing
+        # Verifiers by identity of the sender, None for unknown senders
+        verifiers = {}
+        dropped = 0
+        for msg, ident in unverified:
+            if isinstance(msg, zmq.Frame):
+                msg = msg.bytes
+            if len(msg) <= sigLen:
+                logger.error('{} got message {} from {} which is too short '
+                             'to be signed'.format(self, msg, ident))
+                dropped += 1
+                continue
+            data = msg[:-sigLen]
+            if ident in verifiers:
+                verifier = verifiers[ident]
+            else:
+                verifier = verifiers[ident] = self._verifierOf(ident)
+            if verifier is None:
+                verified = trustsUnknown
+            else:
+                verified = verifier.verify(msg[-sigLen:], data)
+            if not verified:
+                logger.error('{} could not verify message {} from {}'.
+                             format(self, data, ident))
+                dropped += 1
+                continue
+            self._verifyAndAppend(data, ident)
+        return dropped
 
-        for x in range(limit):
+    def _verifierOf(self, ident) -> Verifier:
+        remote = self.remotesByKeys.get(ident)
+        if remote is None:
+            return None
+        return self.verifiers.get(remote.verKey)
+
+    def _pollRemoteEvents(self):
+        # Connection states of remotes are read often, consuming the events
+        # here once a service keeps reading them cheap
+        for remote in self.remotesByKeys.values():
+            if remote.socket is not None:
+                wasConnected = remote.isConnected
+                remote.pollEvents()
+                if wasConnected and not remote.isConnected:
+                    # The peer may come back with another version
+                    self._peerSerializers.pop(remote.publicKey, None)
+
+    def processReceived(self, limit) -> int:
+        """
+        Process at most `limit` received messages, passing them to the
+        handlers. How many were dropped or were pings and pongs is left in
+        `processedCounts`
+        :return: number of messages passed to the handlers
+        """
+        if limit <= 0:
+            counts = ProcessedCounts(0, 0, 0)
+        elif self.decodePool is not None:
+            counts = self._processThroughPool(limit)
+        else:
+            counts = self._processReceived(limit)
+        self.processedCounts = counts
+        return counts.processed
+
+    def _processReceived(self, limit) -> ProcessedCounts:
+
+        # Looked up once since this runs for every received message
+        popleft = self.rxMsgs.popleft
+        remotesByKeys = self.remotesByKeys
+        healthPrefixes = self.healthPrefixes
+        handlePingPong = self.handlePingPong
+        deserialize = serializers.deserialize
+        textSerializer = self._textSerializer
+        doProcessReceived = self.doProcessReceived
+        batch = [] if self.batchHandler is not None else None
+        deliver = batch.append if batch is not None else self.msgHandler
+
+        processed = dropped = control = 0
+        for _ in range(min(limit, len(self.rxMsgs))):
             try:
-                msg, ident = self.rxMsgs.popleft()
+                msg, ident = popleft()
+            except IndexError:
+                break
+
+            if isinstance(msg, zmq.Frame):
+                msg = self._decodeFrame(msg, ident)
+                if msg is None:
+                    dropped += 1
+                    continue
 
-                frm = self.remotesByKeys[ident].name \
-                    if ident in self.remotesByKeys else ident
+            remote = remotesByKeys.get(ident)
+            frm = remote.name if remote is not None else ident
+
+            if isinstance(msg, str) and msg[:2] in healthPrefixes and \
+                    handlePingPong(msg, frm, ident):
+                control += 1
+                continue
 
-                r = self.handlePingPong(msg, frm, ident)
-                if r:
+            try:
+                msg = deserialize(msg, textSerializer)
+            except Exception as e:
+                logger.error('Error {} while deserializing message {} '
+                             'from {}'.format(e, msg, ident))
+                dropped += 1
+                continue
+
+            msg = doProcessReceived(msg, frm, ident)
+            if msg:
+                deliver((msg, frm))
+                processed += 1
+            else:
+                dropped += 1
+        if batch:
+            self.batchHandler(batch)
+        return ProcessedCounts(processed, dropped, control)
+
+    def _processThroughPool(self, limit) -> ProcessedCounts:
+        """
+        Submit received messages to the decode pool, which verifies their
+        signatures too when messages are signed, and process the ones it has
+        decoded, in the order they were received
+        """
+        pool = self.decodePool
+        count = min(pool.admits, len(self.rxMsgs))
+        processed = dropped = control = 0
+        if count:
+            popleft = self.rxMsgs.popleft
+            # Buffers of frames, and views of messages unpacked from batches,
+            # cannot be sent to other processes
+            copy = pool.copiesMessages
+            # Raw verification keys of the senders when messages are signed,
+            # None for senders accepted without verifying them
+            verKeys = {} if self.signMessages else None
+            trustsUnknown = self.isKeySharing
+            items = []
+            for _ in range(count):
+                msg, ident = popleft()
+                if verKeys is not None and ident not in verKeys:
+                    verifier = self._verifierOf(ident)
+                    verKeys[ident] = verifier.keyraw \
+                        if verifier is not None else None
+                if verKeys is not None and verKeys[ident] is None and \
+                        not trustsUnknown:
+                    logger.error('{} could not verify message from {} since '
+                                 'its verification key is not known'.
+                                 format(self, ident))
+                    dropped += 1
                     continue
+                if isinstance(msg, zmq.Frame):
+                    msg = msg.bytes if copy else msg.buffer
+                elif copy and not isinstance(msg, (bytes, str)):
+                    msg = bytes(msg)
+                items.append((msg, ident))
+            if items:
+                pool.submit(items, self._textSerializer.name,
+                            self.healthPrefixes, self.maxControlMsgLen,
+                            verKeys, self.sigLen)
+
+        remotesByKeys = self.remotesByKeys
+        doProcessReceived = self.doProcessReceived
+        batch = [] if self.batchHandler is not None else None
+        deliver = batch.append if batch is not None else self.msgHandler
+
+        for outcome, msg, ident in pool.take(limit):
+            if outcome == FAILED:
+                logger.error('{} got {} from {}'.format(self, msg, ident))
+                dropped += 1
+                continue
+
+            remote = remotesByKeys.get(ident)
+            frm = remote.name if remote is not None else ident
 
+            if outcome == CONTROL:
+                if self.handlePingPong(msg, frm, ident):
+                    control += 1
+                    continue
                 try:
-                    msg = self.deserializeMsg(msg)
+                    msg = serializers.deserialize(msg, self._textSerializer)
                 except Exception as e:
-                    logger.error('Error {} while converting message {} '
-                                 'to JSON from {}'.format(e, msg, ident))
+                    logger.error('Error {} while deserializing message {} '
+                                 'from {}'.format(e, msg, ident))
+                    dropped += 1
                     continue
 
-                msg = self.doProcessReceived(msg, frm, ident)
-                if msg:
-                    self.msgHandler((msg, frm))
-            except IndexError:
-                break
-        return x + 1
+            msg = doProcessReceived(msg, frm, ident)
+            if msg:
+                deliver((msg, frm))
+                processed += 1
+            else:
+                dropped += 1
+        if batch:
+            self.batchHandler(batch)
+        return ProcessedCounts(processed, dropped, control)
+
+    def _decodeFrame(self, frame, ident):
+        buf = frame.buffer
+        # Binary messages, and JSON when its serializer validates UTF-8
+        # itself, are parsed straight from the frame's buffer. Short
+        # messages are decoded since pings and pongs are compared as text
+        if serializers.isTagged(buf) or \
+                (self._textSerializer.readsBuffers and
+                 len(buf) > self.maxControlMsgLen):
+            return buf
+        # Decoding from the buffer avoids copying the message to bytes first
+        try:
+            return str(buf, 'utf-8')
+        except UnicodeDecodeError as ex:
+            logger.error('{} got exception while decoding {} to utf-8: {}'
+                         .format(self, frame.bytes, ex))
+            return None
 
     @abstractmethod
     def doProcessReceived(self, msg, frm, ident):
@@ -725,7 +1582,9 @@ class ZStack(NetworkInterface):
             remote = self.addRemote(name, ha, verKey, publicKey)
 
         public, secret = self.selfEncKeys
-        remote.connect(self.ctx, public, secret)
+        self._unregisterRemoteSocket(remote)
+        remote.connect(self.ctx, public, secret, profile=self.socketProfile)
+        self._registerRemoteSocket(remote)
 
         logger.info("{} looking for {} at {}:{}".
                     format(self, name or remote.name, *remote.ha),
@@ -746,8 +1605,11 @@ class ZStack(NetworkInterface):
         assert remote
         logger.debug('{} reconnecting to {}'.format(self, remote))
         public, secret = self.selfEncKeys
+        self._unregisterRemoteSocket(remote)
         remote.disconnect()
-        remote.connect(self.ctx, public, secret)
+        self._peerSerializers.pop(remote.publicKey, None)
+        remote.connect(self.ctx, public, secret, profile=self.socketProfile)
+        self._registerRemoteSocket(remote)
         self.sendPingPong(remote, is_ping=True)
 
     def reconnectRemoteWithName(self, remoteName):
@@ -763,14 +1625,21 @@ class ZStack(NetworkInterface):
                            'by name {} to disconnect'
                            .format(self, name))
             return None
+        self._unregisterRemoteSocket(remote)
         remote.disconnect()
+        self._peerSerializers.pop(remote.publicKey, None)
         return remote
 
     def addRemote(self, name, ha, remoteVerkey, remotePublicKey):
+        other = self.remotesByKeys.get(remotePublicKey)
+        if other is not None and other.name != name:
+            logger.warning('{} replacing remote {} by {} since they have the '
+                           'same public key'.format(self, other, name))
+            self._unregisterRemoteSocket(other)
+            other.disconnect()
+            self.removeRemote(other)
         remote = Remote(name, ha, remoteVerkey, remotePublicKey)
-        self.remotes[name] = remote
-        # TODO: Use weakref to remote below instead
-        self.remotesByKeys[remotePublicKey] = remote
+        self._remotes.add(remote)
         if remoteVerkey:
             self.addVerifier(remoteVerkey)
         else:
@@ -783,8 +1652,14 @@ class ZStack(NetworkInterface):
         action = 'ping' if is_ping else 'pong'
         name = remote if isinstance(remote, (str, bytes)) else remote.name
         r = self.send(msg, name)
+        # The offer follows the plain ping in a message of its own so peers
+        # not negotiating, or of older versions, answer the ping anyway
+        if is_ping and r is not False and \
+                self._offersSerializers(remote) and \
+                self._sendSerializersOffer(name, is_ping) is not False:
+            self.remotes[name]._unansweredSerializerOffers += 1
         if r is True:
-            logger.debug('{} {}ed {}'.format(self.name, action, name))
+            hotLogger.debug('{} {}ed {}', self.name, action, name)
         elif r is False:
             # TODO: This fails the first time as socket is not established,
             # need to make it retriable
@@ -792,24 +1667,126 @@ class ZStack(NetworkInterface):
                         format(self.name, action, name),
                         extra={"cli": False})
         elif r is None:
-            logger.debug('{} will be sending in batch'.format(self))
+            hotLogger.debug('{} will be sending in batch', self)
         else:
             logger.warning('{} got an unexpected return value {} while sending'.
                         format(self, r))
         return r
 
     def handlePingPong(self, msg, frm, ident):
+        if not isinstance(msg, str):
+            return False
         if msg in (self.pingMessage, self.pongMessage):
-            if msg == self.pingMessage:
-                logger.debug('{} got ping from {}'.format(self, frm))
-                self.sendPingPong(frm, is_ping=False)
-
-            if msg == self.pongMessage:
-                if ident in self.remotesByKeys:
-                    self.remotesByKeys[ident].setConnected()
-                logger.debug('{} got pong from {}'.format(self, frm))
+            offered = None
+        elif msg[:3] in (self.pingMessage + self.serializersSep,
+                         self.pongMessage + self.serializersSep):
+            offered = msg[3:].split(',')
+            msg = msg[:2]
+        else:
+            return False
+
+        if offered is not None:
+            # Offers are not answered when not negotiating so the peer
+            # sends JSON
+            if self.config.ZMQ_NEGOTIATE_SERIALIZER:
+                self._learnPeerSerializers(ident, offered)
+                if msg == self.pingMessage:
+                    self._sendSerializersOffer(frm, is_ping=False)
+                elif ident in self.remotesByKeys:
+                    self.remotesByKeys[ident]._unansweredSerializerOffers = 0
             return True
-        return False
+
+        if msg == self.pingMessage:
+            hotLogger.debug('{} got ping from {}', self, frm)
+            self.sendPingPong(frm, is_ping=False)
+
+        if msg == self.pongMessage:
+            if ident in self.remotesByKeys:
+                remote = self.remotesByKeys[ident]
+                if not remote.isConnected:
+                    # The peer may have been upgraded while disconnected
+                    remote.ignoresSerializerOffers = False
+                    remote._unansweredSerializerOffers = 0
+                remote.setConnected()
+            hotLogger.debug('{} got pong from {}', self, frm)
+        return True
+
+    def _learnPeerSerializers(self, ident, names):
+        if self._peerSerializers.get(ident) != names:
+            logger.debug('{} learnt that {} can read {}'.
+                         format(self, ident, names))
+        self._peerSerializers[ident] = names
+        remote = self.remotesByKeys.get(ident)
+        if remote is not None:
+            remote.ignoresSerializerOffers = False
+
+    def _sendSerializersOffer(self, name, is_ping):
+        """
+        Advertise the serializers this stack can read to `name`, as an offer
+        after a ping or as the answer to the offer of the peer
+        """
+        msg = '{}{}{}'.format(
+            self.pingMessage if is_ping else self.pongMessage,
+            self.serializersSep,
+            ','.join(serializers.names + [BATCH_CAPABILITY]))
+        return self.send(msg, name)
+
+    def _offersSerializers(self, remote) -> bool:
+        """
+        Whether pings sent to `remote` are followed by an offer of the
+        serializers this stack can read
+        """
+        if not self.config.ZMQ_NEGOTIATE_SERIALIZER:
+            return False
+        if isinstance(remote, (str, bytes)):
+            remote = self.remotes.get(remote)
+        if remote is None:
+            return False
+        if remote.publicKey in self._peerSerializers:
+            # Both ends learnt what the other reads, from an offer and its
+            # answer
+            return False
+        if remote._unansweredSerializerOffers >= \
+                self.maxUnansweredSerializerOffers:
+            if not remote.ignoresSerializerOffers:
+                logger.info('{} got no answer to advertising serializers to '
+                            '{}, using JSON for it'.format(self, remote),
+                            extra={"cli": False})
+            remote.ignoresSerializerOffers = True
+        return not remote.ignoresSerializerOffers
+
+    def _batchesTo(self, remote: Remote) -> bool:
+        """
+        Whether messages to `remote` are sent in batches
+        """
+        if not self.config.ZMQ_BATCH_OUTBOUND:
+            return False
+        if not self.config.ZMQ_NEGOTIATE_SERIALIZER:
+            # Peers are expected to be configured alike
+            return True
+        return BATCH_CAPABILITY in \
+            self._peerSerializers.get(remote.publicKey, ())
+
+    def _identOf(self, remote: Union[str, bytes, Remote]):
+        if isinstance(remote, Remote):
+            return remote.publicKey
+        if remote in self.remotes:
+            return self.remotes[remote].publicKey
+        return remote.encode() if isinstance(remote, str) else remote
+
+    def _serializerFor(self, ident, remote: Remote = None) -> Serializer:
+        """
+        Serializer for messages sent to the peer with identity `ident`
+        """
+        if remote is not None and remote.serializer is not None:
+            return remote.serializer
+        serializer = self._serializer
+        if serializer.tag is None or \
+                not self.config.ZMQ_NEGOTIATE_SERIALIZER:
+            return serializer
+        if serializer.name in self._peerSerializers.get(ident, ()):
+            return serializer
+        return self._textSerializer
 
     def send_heartbeats(self):
         # Sends heartbeat (ping) to all
@@ -823,16 +1800,66 @@ class ZStack(NetworkInterface):
             return self.transmitThroughListener(msg, remoteName)
         else:
             if remoteName is None:
-                r = []
-                # Serializing beforehand since to avoid serializing for each
-                # remote
-                msg = self.serializeMsg(msg)
-                for uid in self.remotes:
-                    r.append(self.transmit(msg, uid, serialized=True))
-                return all(r)
+                # Messages queued to be sent in batches count as sent
+                return all(r is not False
+                           for r in self.broadcast(msg).values())
             else:
                 return self.transmit(msg, remoteName)
 
+    def broadcast(self, msg: Any, exclude=None) -> Dict[str, bool]:
+        """
+        Send `msg` to all remotes except the ones named in `exclude`.
+
+        The message is serialized once for each serializer in use, messages
+        large enough to be worth it are sent from one `zmq.Frame` shared by
+        all sockets without copying.
+
+        :return: whether the message was sent, by the name of the remote,
+        None for remotes it is queued for to be sent in a batch. Messages
+        queued to be retried since sockets were full count as sent
+        """
+        exclude = exclude or ()
+        results = {}
+        # Serialized message and whether it is a ping or pong, by serializer
+        serialized = {}
+        notConnected = []
+        for name, remote in self.remotes.items():
+            if name in exclude:
+                continue
+            socket = remote.socket
+            if not socket:
+                results[name] = False
+                continue
+            serializer = self._serializerFor(remote.publicKey, remote)
+            if serializer not in serialized:
+                raw = serializer.serialize(msg)
+                isHealth = raw[:2] in self.healthMessages
+                # Signed once for all remotes, batches are signed when sent
+                data = self.signedMsg(raw) if self.signMessages else raw
+                data = zmq.Frame(data) if len(data) >= zmq.COPY_THRESHOLD \
+                    else data
+                serialized[serializer] = raw, data, isHealth
+            raw, data, isHealth = serialized[serializer]
+            if not isHealth and self._batchesTo(remote):
+                self._queueOut(name, raw)
+                results[name] = None
+                continue
+            # Frames are sent without copying whatever `copy` is
+            results[name] = sent = \
+                self._sendToRemote(remote, data, retry=not isHealth)
+            if sent and not isHealth and not remote.isConnected:
+                notConnected.append(name)
+
+        if hotLogger.isEnabledFor(logging.DEBUG):
+            hotLogger.debug('{} broadcast message {} to {}', self, msg,
+                            [n for n, sent in results.items() if sent])
+        if notConnected:
+            logger.warning('Remotes {} are not connected - message will not be '
+                           'sent immediately. If this problem does not resolve '
+                           'itself - check your firewall settings'.
+                           format(notConnected))
+        return results
+
     def transmit(self, msg, uid, timeout=None, serialized=False):
         remote = self.remotes.get(uid)
         if not remote:
@@ -844,46 +1871,201 @@ class ZStack(NetworkInterface):
                            'for remote {}'.format(self, uid))
             return False
         try:
-            msg = self.serializeMsg(msg) if not serialized else msg
-            # socket.send(self.signedMsg(msg), flags=zmq.NOBLOCK)
-            socket.send(msg, flags=zmq.NOBLOCK)
-            logger.debug('{} transmitting message {} to {}'
-                        .format(self, msg, uid))
-            if not remote.isConnected and msg not in self.healthMessages:
+            if not serialized:
+                msg = self._serializerFor(remote.publicKey,
+                                          remote).serialize(msg)
+            isHealth = msg[:2] in self.healthMessages
+            if not isHealth and self._batchesTo(remote):
+                self._queueOut(uid, msg)
+                return None
+            if self.signMessages:
+                msg = self.signedMsg(msg)
+            sent = self._sendToRemote(remote, msg, retry=not isHealth)
+            hotLogger.debug('{} transmitting message {} to {}',
+                            self, msg, uid)
+            if sent and not remote.isConnected and not isHealth:
                 logger.warning('Remote {} is not connected - '
                                'message will not be sent immediately.'
                                'If this problem does not resolve itself - '
                                'check your firewall settings'.format(uid))
-            return True
+            return sent
         except zmq.Again:
             logger.info('{} could not transmit message to {}'
                         .format(self, uid))
         return False
 
+    def _sendToRemote(self, remote: Remote, data, retry=True):
+        """
+        Send serialized `data` to `remote`. With `retry`, it is queued to be
+        sent later when the socket is full or messages queued for `remote`
+        before are still waiting, so messages are sent in order
+
+        :return: True if sent or queued, False if dropped
+        """
+        name = remote.name
+        if retry and name in self._txQueues:
+            return self._txQueues.push(name, data)
+        try:
+            remote.socket.send(data, flags=zmq.NOBLOCK)
+            self._onSent()
+            return True
+        except zmq.Again:
+            if not retry:
+                logger.info('{} could not transmit message to {}'
+                            .format(self, name))
+                return False
+            hotLogger.debug('{} queueing message to {} since its socket is '
+                            'full', self, name)
+            return self._txQueues.push(name, data)
+
+    def retryQueued(self) -> int:
+        """
+        Send messages queued since sockets were full, in order, as long as
+        sockets take them
+        :return: number of messages sent
+        """
+        sent = 0
+        if self._txQueues:
+            for name in self._txQueues.destinations:
+                remote = self.remotes.get(name)
+                if remote is None:
+                    self._txQueues.discard(name)
+                elif remote.socket:
+                    sent += self._txQueues.retry(
+                        name, partial(remote.socket.send, flags=zmq.NOBLOCK))
+                else:
+                    # Kept till the remote is connected again unless too old
+                    self._txQueues.expire(name)
+        if self._listenerTxQueues:
+            for ident in self._listenerTxQueues.destinations:
+                try:
+                    sent += self._listenerTxQueues.retry(
+                        ident, partial(self._sendThroughListener, ident))
+                except zmq.ZMQError as ex:
+                    if ex.errno != zmq.EHOSTUNREACH:
+                        raise
+                    # The peer disconnected
+                    self._listenerTxQueues.discard(ident)
+        if sent:
+            self._onSent()
+        return sent
+
+    def _queueOut(self, name, msg: bytes):
+        box = self._outBoxes.get(name)
+        if box is None:
+            box = self._outBoxes[name] = []
+            # Queued messages are sent when the stack is serviced, so an
+            # idle looper is woken up as for received messages
+            if self._onReadable:
+                self._onReadable()
+        box.append(msg)
+        size = self._outBoxSizes.get(name, 0) + len(msg)
+        self._outBoxSizes[name] = size
+        if size >= self.config.ZMQ_BATCH_MAX_BYTES:
+            self._sendBatch(name, self._outBoxes.pop(name))
+            self._outBoxSizes.pop(name)
+
+    def flushOutBoxes(self) -> int:
+        """
+        Send messages queued for remotes, one batch for each remote
+        :return: number of batches sent
+        """
+        if not self._outBoxes:
+            return 0
+        boxes = self._outBoxes
+        self._outBoxes = {}
+        self._outBoxSizes = {}
+        return sum(1 for name, msgs in boxes.items()
+                   if self._sendBatch(name, msgs))
+
+    def _sendBatch(self, name, msgs: List[bytes]) -> bool:
+        remote = self.remotes.get(name)
+        if remote is None or not remote.socket:
+            logger.info('{} dropping {} messages queued for {} since it has '
+                        'no socket'.format(self, len(msgs), name))
+            return False
+        data = msgs[0] if len(msgs) == 1 else packBatch(msgs)
+        if self.signMessages:
+            # One signature covers all messages of the batch
+            data = self.signedMsg(data)
+        if not self._sendToRemote(remote, data):
+            hotLogger.debug('{} dropped batch of {} messages to {}',
+                            self, len(msgs), name)
+            return False
+        hotLogger.trace('{} transmitted batch of {} messages to {}',
+                        self, len(msgs), name)
+        return True
+
     def transmitThroughListener(self, msg, ident):
         if isinstance(ident, str):
             ident = ident.encode()
         if ident not in self.peersWithoutRemotes:
-            logger.debug('{} not sending message {} to {}'.
-                         format(self, msg, ident))
-            logger.debug("This is a temporary workaround for not being able to "
-                         "disconnect a ROUTER's remote")
+            hotLogger.debug('{} not sending message {} to {}',
+                            self, msg, ident)
+            hotLogger.debug("This is a temporary workaround for not being "
+                            "able to disconnect a ROUTER's remote")
             return False
-        msg = self.serializeMsg(msg)
+        msg = self._serializerFor(ident).serialize(msg)
+        retry = msg[:2] not in self.healthMessages
+        if self.signMessages:
+            msg = self.signedMsg(msg)
+        queues = self._listenerTxQueues
+        if retry and ident in queues:
+            # Sent after the messages queued before it
+            return queues.push(ident, msg)
         try:
-            # noinspection PyUnresolvedReferences
-            # self.listener.send_multipart([ident, self.signedMsg(msg)],
-            #                              flags=zmq.NOBLOCK)
-            logger.trace('{} transmitting {} to {} through listener socket'.
-                         format(self, msg, ident))
-            self.listener.send_multipart([ident, msg], flags=zmq.NOBLOCK)
+            hotLogger.trace('{} transmitting {} to {} through listener socket',
+                            self, msg, ident)
+            self._sendThroughListener(ident, msg)
             return True
         except zmq.Again:
-            return False
+            if not retry:
+                return False
+            return queues.push(ident, msg)
         except Exception as e:
+            if isinstance(e, zmq.ZMQError) and e.errno == zmq.EHOSTUNREACH:
+                hotLogger.debug('{} not sending message to {} since it is not '
+                                'connected to the listener', self, ident)
+                return False
             logger.error('{} got error {} while sending through listener to {}'.
                          format(self, e, ident))
 
+    def _sendThroughListener(self, ident: bytes, data):
+        if not self.listenerShards:
+            self.listener.send_multipart([ident, data], flags=zmq.NOBLOCK)
+            self._onSent()
+            return
+        # Peers are replied to through the shard they connected to, looked
+        # for when the peer was forgotten or connected again to another one
+        listener = self._shardOf.get(ident)
+        if listener is not None:
+            try:
+                listener.send_multipart([ident, data], flags=zmq.NOBLOCK)
+                self._onSent()
+                return
+            except zmq.ZMQError as ex:
+                if ex.errno != zmq.EHOSTUNREACH:
+                    raise
+                del self._shardOf[ident]
+        for listener in self.listeners:
+            try:
+                listener.send_multipart([ident, data], flags=zmq.NOBLOCK)
+            except zmq.ZMQError as ex:
+                if ex.errno != zmq.EHOSTUNREACH:
+                    raise
+                continue
+            self._rememberShard(ident, listener)
+            self._onSent()
+            return
+        raise zmq.ZMQError(zmq.EHOSTUNREACH)
+
+    def _rememberShard(self, ident: bytes, listener):
+        shardOf = self._shardOf
+        shardOf[ident] = listener
+        shardOf.move_to_end(ident)
+        if len(shardOf) > self.config.ZMQ_LISTENER_SHARD_PEERS:
+            shardOf.popitem(last=False)
+
     @staticmethod
     def serializeMsg(msg):
         if isinstance(msg, Mapping):
@@ -901,24 +2083,21 @@ class ZStack(NetworkInterface):
         return msg
 
     def signedMsg(self, msg: bytes, signer: Signer=None):
-        sig = self.signer.signature(msg)
+        sig = (signer or self.signer).signature(msg)
         return msg + sig
 
     def verify(self, msg, by):
-        if self.isKeySharing:
-            return True
-        if by not in self.remotesByKeys:
-            return False
-        verKey = self.remotesByKeys[by].verKey
-        r = self.verifiers[verKey].verify(msg[-self.sigLen:], msg[:-self.sigLen])
-        return r
+        verifier = self._verifierOf(by)
+        if verifier is None:
+            return self.isKeySharing
+        return verifier.verify(msg[-self.sigLen:], msg[:-self.sigLen])
 
     @staticmethod
     def loadPubKeyFromDisk(directory, name):
         filePath = os.path.join(directory,
                                 "{}.key".format(name))
         try:
-            public, _ = zmq.auth.load_certificate(filePath)
+            public, _ = keyCache.load(filePath)
             return public
         except (ValueError, IOError) as ex:
             raise KeyError from ex
@@ -928,7 +2107,7 @@ class ZStack(NetworkInterface):
         filePath = os.path.join(directory,
                                 "{}.key_secret".format(name))
         try:
-            _, secret = zmq.auth.load_certificate(filePath)
+            _, secret = keyCache.load(filePath)
             return secret
         except (ValueError, IOError) as ex:
             raise KeyError from ex
@@ -947,7 +2126,7 @@ class ZStack(NetworkInterface):
 
     def getPublicKey(self, name):
         try:
-            return self.loadPubKeyFromDisk(self.publicKeysDir, name)
+            return self.keyStore.get(KeyStore.PUBLIC, name)[0]
         except KeyError:
             raise PublicKeyNotFoundOnDisk(self.name, name)
 
@@ -969,7 +2148,7 @@ class ZStack(NetworkInterface):
 
     def getVerKey(self, name):
         try:
-            return self.loadPubKeyFromDisk(self.verifKeyDir, name)
+            return self.keyStore.get(KeyStore.VERIF, name)[0]
         except KeyError:
             if self.isRestricted:
                 raise VerKeyNotFoundOnDisk(self.name, name)
@@ -977,7 +2156,7 @@ class ZStack(NetworkInterface):
 
     @property
     def sigKey(self):
-        return self.loadSecKeyFromDisk(self.sigKeyDir, self.name)
+        return self.keyStore.get(KeyStore.SIG, self.name)[1]
 
     # TODO: Change name to sighex after removing test
     @property
@@ -986,21 +2165,15 @@ class ZStack(NetworkInterface):
 
     @property
     def priKey(self):
-        return self.loadSecKeyFromDisk(self.secretKeysDir, self.name)
+        return self.keyStore.get(KeyStore.SECRET, self.name)[1]
 
     @property
     def prihex(self):
         return hexlify(z85.decode(self.priKey))
 
     def getAllVerKeys(self):
-        keys = []
-        for key_file in os.listdir(self.verifKeyDir):
-            if key_file.endswith(".key"):
-                serverVerifFile = os.path.join(self.verifKeyDir,
-                                               key_file)
-                serverPublic, _ = zmq.auth.load_certificate(serverVerifFile)
-                keys.append(serverPublic)
-        return keys
+        return [public for _, public, _ in
+                self.keyStore.items(KeyStore.VERIF)]
 
     def setRestricted(self, restricted: bool):
         if self.isRestricted != restricted:
@@ -1014,34 +2187,26 @@ class ZStack(NetworkInterface):
 
             self.start(restricted, reSetupAuth=True)
 
-    def _safeRemove(self, filePath):
-        try:
-            os.remove(filePath)
-        except Exception as ex:
-            logger.info('{} could delete file {} due to {}'.
-                        format(self, filePath, ex))
-
     def clearLocalRoleKeep(self):
-        for d in (self.secretKeysDir, self.sigKeyDir):
-            filePath = os.path.join(d, "{}.key_secret".format(self.name))
-            self._safeRemove(filePath)
-
-        for d in (self.publicKeysDir, self.verifKeyDir):
-            filePath = os.path.join(d, "{}.key".format(self.name))
-            self._safeRemove(filePath)
+        for kind in KeyStore.kinds:
+            self._safeRemoveKey(kind, self.name)
 
     def clearRemoteRoleKeeps(self):
-        for d in (self.secretKeysDir, self.sigKeyDir):
-            for key_file in os.listdir(d):
-                if key_file != '{}.key_secret'.format(self.name):
-                    self._safeRemove(os.path.join(d, key_file))
+        for kind in KeyStore.kinds:
+            for name in self.keyStore.names(kind):
+                if name != self.name:
+                    self._safeRemoveKey(kind, name)
 
-        for d in (self.publicKeysDir, self.verifKeyDir):
-            for key_file in os.listdir(d):
-                if key_file != '{}.key'.format(self.name):
-                    self._safeRemove(os.path.join(d, key_file))
+    def _safeRemoveKey(self, kind, name):
+        try:
+            self.keyStore.remove(kind, name)
+        except Exception as ex:
+            logger.info('{} could not remove {} key of {} due to {}'.
+                        format(self, kind, name, ex))
 
     def clearAllDir(self):
+        self.keyStore.close()
+        keyCache.invalidate(self.homeDir)
         shutil.rmtree(self.homeDir)
 
     # TODO: Members below are just for the time till RAET replacement is
@@ -1098,7 +2263,8 @@ class SimpleZStack(ZStack):
                  seed=None,
                  onlyListener=False,
                  sighex: str=None,
-                 config=None):
+                 config=None,
+                 batchHandler: Callable=None):
 
         # TODO: sighex is unused as of now, remove once test is removed or
         # maybe use sighex to generate all keys, DECISION DEFERRED
@@ -1121,7 +2287,8 @@ class SimpleZStack(ZStack):
                          restricted=restricted,
                          seed=seed,
                          onlyListener=onlyListener,
-                         config=config)
+                         config=config,
+                         batchHandler=batchHandler)
 
 
 class KITZStack(SimpleZStack, KITNetworkInterface):
@@ -1133,14 +2300,16 @@ class KITZStack(SimpleZStack, KITNetworkInterface):
                  registry: Dict[str, HA],
                  seed=None,
                  sighex: str = None,
-                 config=None):
+                 config=None,
+                 batchHandler: Callable = None):
 
         SimpleZStack.__init__(self,
                               stackParams,
                               msgHandler,
                               seed=seed,
                               sighex=sighex,
-                              config=config)
+                              config=config,
+                              batchHandler=batchHandler)
 
         KITNetworkInterface.__init__(self,
                                      registry=registry)
@@ -1184,6 +2353,8 @@ class KITZStack(SimpleZStack, KITNetworkInterface):
 
     def retryDisconnected(self, exclude=None):
         exclude = exclude or {}
+        # Connections lost since the last service are taken into account
+        self._pollRemoteEvents()
         for name, remote in self.remotes.items():
             if name in exclude or remote.isConnected:
                 continue